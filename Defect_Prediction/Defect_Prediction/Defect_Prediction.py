@@ -1,9 +1,39 @@
 import argparse
 import logging
-from data_io.test_data import DefectDataSetLoader, DataSet
-from prediction.tf_model import TensorFlowNet, TF_LAYER
+import os
+import sys
 import numpy as np
 
+# Only light weight modules are imported here. tensorflow (prediction.tf_model), sklearn and the benchmark
+# package are imported inside the subcommands that need them to keep the start up time of the cli low.
+from data_io.test_data import DefectDataSetLoader, DataSet, SAMPLING_MODES, SAMPLING_NONE
+from data_io.normalization import Normalizer, NORMALIZATION_METHODS
+from data_io.feature_store import FeatureStore, get_codecs, CODEC_NONE
+from data_io.vocabulary import FrozenVocabulary
+from data_io.code_image import CODE_IMAGE_ENCODINGS, DEFAULT_IMAGE_SIZE
+from prediction.baseline_models import MODEL_TYPES, MODEL_TENSORFLOW
+
+
+TRAINING_DIR = 'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/'
+
+DEFAULT_SOURCE_PATHS = [
+    #TRAINING_DIR + 'jakarta-ant-1.3-src/src/main',
+    #TRAINING_DIR + 'jakarta-ant-1.4-src/src/main',
+    #TRAINING_DIR + 'jakarta-ant-1.5-src/src/main',
+    TRAINING_DIR + 'apache-ant-1.6.0-src/src/main',
+    TRAINING_DIR + 'apache-ant-1.7.0-src/src/main']
+
+DEFAULT_BUG_DATA_PATHS = [
+    #TRAINING_DIR + 'ant-1.3.csv',
+    #TRAINING_DIR + 'ant-1.4.csv',
+    #TRAINING_DIR + 'ant-1.5.csv',
+    TRAINING_DIR + 'ant-1.6.csv',
+    TRAINING_DIR + 'ant-1.7.csv']
+
+FEATURE_FILE_NAME = 'feature_vector.pickle'
+NORMALIZER_FILE_NAME = 'normalizer.json'
+
+
 def create_loggers():
     # setup logging
     logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', filename='run.log', filemode='w', level=logging.DEBUG)
@@ -33,93 +63,321 @@ def create_loggers():
     logger_io.addHandler(ch_io)
     logger_prediction.addHandler(ch_pred)
 
-create_loggers()
-
-parser = argparse.ArgumentParser()
-parser.add_argument('-p', '--sourcepath', help='Root path for the source files.', required=False, default='C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/apache-ant-1.7.0-src/apache-ant-1.7.0/src/main')
-parser.add_argument('-b', '--bugdatapath', help='Path to the csv bug data sheet.', required=False, default='C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/ant-1.7.csv')
-parser.add_argument('-s', '--save', help='Path to the location to save the model data in.', required=False, default='C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/save/')
-parser.add_argument('-lt', '--loadtestdata', help='Path to pickeled feature vector.', required=False)
-parser.add_argument('-im', '--buginfomapping', help='Row index of the class info inside the bug info csv.', required=False, default=2)
-parser.add_argument('-bn', '--bugnumbermapping', help='Row index of the number_of_bugs inside the bug info csv.', required=False, default=23)
-parser.add_argument('-st', '--savetestdata', help='Save test data or not.', action='store_true')
-args = parser.parse_args()
-test_data_path = args.sourcepath
-bug_data_path = args.bugdatapath
-load_test_data = args.loadtestdata
-save_data_set = args.savetestdata
-save_data_set = True
-
-
-test_data_path = [
-    #'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/jakarta-ant-1.3-src/src/main',
-    #'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/jakarta-ant-1.4-src/src/main',
-    #'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/jakarta-ant-1.5-src/src/main',
-    'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/apache-ant-1.6.0-src/src/main', 
-    'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/apache-ant-1.7.0-src/src/main']
-
-bug_data_path = [
-    #'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/ant-1.3.csv',
-    #'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/ant-1.4.csv',
-    #'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/ant-1.5.csv',
-    'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/ant-1.6.csv', 
-    'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/ant-1.7.csv']
-
-
-load_test_data = 'C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/'
-
-
-data_set_loader = DefectDataSetLoader(test_data_path, bug_data_path, source_files_extension='.java', one_hot=False, binary_class_labels=True)
-
-if load_test_data is None:
-    data_set_loader.initialize(args.buginfomapping, args.bugnumbermapping) 
-else:
-    data_set_loader.load_features(load_test_data, name='feature_vector.pickle')
-
-if save_data_set:
-    data_set_loader.save_features('C:/Users/felix/OneDrive/Studium/Studium/2. Semester/Seminar/Project/Training/')
-
-#X_train, X_test, y_train, y_test = data_set_loader.get_test_train_split()
-# create test sets
-#train = DataSet(X_train, y_train, 'Train', one_hot=False)
-#test = DataSet(X_test, y_test, 'Test', one_hot=False)
-
-
-X, y = data_set_loader.get_project_split()
-
-# combine data from ant 1.4 to 1.6
-#X_train = np.concatenate((X[0], X[1], X[2]), axis=0)
-#y_train = np.concatenate((y[0], y[1], y[2]), axis=0)
-
-train = DataSet(X[-2], y[-2], 'Train', one_hot=True)
-test = DataSet(X[-1], y[-1], 'Test', one_hot=True)
-
-net = TensorFlowNet(
-    train_data_set=train,
-    test_data_set=test, 
-    num_classes=data_set_loader.num_classes, 
-    input_shape=[train.feature_shape[1]], # Feature Shape is (Num_Samples, Feature_dim) -> we only need Feature_dim
-    targets_shape=[-1, 2], # one hot
-    input_is_image=False,
-    batch_size=100, 
-    initial_learning_rate=1e-4, 
-    architecture_shape=[
-        (TF_LAYER.Dense, 'hidden1', 128),         
+
+def add_data_arguments(parser):
+    """ Arguments to index the source files and bug data sheets (or to load already extracted features). """
+    parser.add_argument('-p', '--sourcepath', help='Root path(s) of the source files of a project. Repeat for every project.', action='append', nargs='+', required=False)
+    parser.add_argument('-b', '--bugdatapath', help='Path to the csv bug data sheet of every project (same order as --sourcepath).', nargs='+', required=False)
+    parser.add_argument('-im', '--buginfomapping', help='Column name or index of the class info inside the bug info csv.', required=False, default='name')
+    parser.add_argument('-bn', '--bugnumbermapping', help='Column name or index of the number_of_bugs inside the bug info csv.', required=False, default='bug')
+    parser.add_argument('-fh', '--featurehashing', help='Hash method and class names into a fixed number of buckets instead of growing the vocabulary.', action='store_true')
+    parser.add_argument('-hb', '--hashbuckets', help='Number of buckets for feature hashing.', type=int, default=2 ** 14)
+    parser.add_argument('-nm', '--normalization', help='Feature normalization method.', choices=NORMALIZATION_METHODS, default=NORMALIZATION_METHODS[0])
+    parser.add_argument('-nz', '--normalizer', help='Json file with fitted normalizer statistics (e.g. of the training features) to scale the features with.', required=False)
+    parser.add_argument('-pr', '--profile', help='Path to save a json report with the timings of the data loading stages.', required=False)
+    parser.add_argument('-pp', '--profileparsing', help='Path to save cProfile stats of the parse stage.', required=False)
+
+def add_feature_arguments(parser):
+    """ Arguments to load features and select the feature representation. """
+    parser.add_argument('-lt', '--loadtestdata', help='Path to the dir with the pickeled feature vector. Default: index the sources (see index).', required=False)
+    parser.add_argument('-fs', '--featurestore', help='Dir of a feature store to load the features of all projects from.', required=False)
+    parser.add_argument('-bt', '--bagoftokens', help='Use sparse token count vectors instead of padded token vectors.', action='store_true')
+    parser.add_argument('-ti', '--tfidf', help='Weight the token counts with tf-idf (only with --bagoftokens).', action='store_true')
+    parser.add_argument('-ci', '--codeimage', help='Encode the token sequences as compact code images for the convolutional net instead of padded token vectors.', choices=CODE_IMAGE_ENCODINGS, required=False)
+    parser.add_argument('-is', '--imagesize', help='Width and height of the code images. The co-occurrence images need one row per token id.', type=int, default=DEFAULT_IMAGE_SIZE)
+    parser.add_argument('-ih', '--hashimagetokens', help='Hash the token ids into imagesize buckets if they do not fit into the co-occurrence images (most token ids collide).', action='store_true')
+
+def get_data_set_loader(args):
+    """ Creates the data set loader and either loads the features (--loadtestdata) or indexes the source files. """
+    source_paths = [paths if len(paths) > 1 else paths[0] for paths in args.sourcepath] if args.sourcepath else DEFAULT_SOURCE_PATHS
+    bug_data_paths = args.bugdatapath if args.bugdatapath else DEFAULT_BUG_DATA_PATHS
+
+    normalizer = Normalizer.load(args.normalizer) if args.normalizer is not None else None
+
+    data_set_loader = DefectDataSetLoader(source_paths, bug_data_paths, source_files_extension='.java', one_hot=False, binary_class_labels=True, feature_hashing=args.featurehashing, num_hash_buckets=args.hashbuckets, profile_parsing=args.profileparsing is not None, normalization=args.normalization, normalizer=normalizer)
+
+    load_test_data = getattr(args, 'loadtestdata', None)
+    feature_store = getattr(args, 'featurestore', None)
+    if load_test_data is not None:
+        data_set_loader.load_features(load_test_data, name=FEATURE_FILE_NAME)
+    elif feature_store is not None and args.command != 'index':
+        data_set_loader.load_from_store(feature_store)
+    else:
+        # new projects are appended to the store with the vocabulary of the stored projects
+        if feature_store is not None:
+            data_set_loader.use_store_vocabulary(feature_store)
+        data_set_loader.initialize(args.buginfomapping, args.bugnumbermapping)
+
+    if args.profile is not None:
+        data_set_loader.profiler.save_report(args.profile)
+    if args.profileparsing is not None and 'parse' in data_set_loader.profiler.stages:
+        data_set_loader.profiler.dump_profile('parse', args.profileparsing)
+    return data_set_loader
+
+def index(args):
+    """ Indexes the source files, extracts the AST features and saves them. """
+    data_set_loader = get_data_set_loader(args)
+    if args.featurestore is not None:
+        data_set_loader.save_to_store(args.featurestore, args.projectnames, codec=args.codec, compression_level=args.compressionlevel)
+    else:
+        data_set_loader.save_features(args.output, name=FEATURE_FILE_NAME)
+        data_set_loader.normalizer.save(os.path.join(args.output, NORMALIZER_FILE_NAME))
+
+def train(args):
+    """ Trains the net on the second to last project and tests it on the last one. """
+    data_set_loader = get_data_set_loader(args)
+    X, y = data_set_loader.get_project_split(bag_of_tokens=args.bagoftokens, tf_idf=args.tfidf, code_image=args.codeimage, image_size=args.imagesize, hash_image_tokens=args.hashimagetokens)
+
+    # combine data from ant 1.4 to 1.6
+    #X_train = np.concatenate((X[0], X[1], X[2]), axis=0)
+    #y_train = np.concatenate((y[0], y[1], y[2]), axis=0)
+
+    train = DataSet(X[-2], y[-2], 'Train', one_hot=True, sampling=args.sampling)
+    test = DataSet(X[-1], y[-1], 'Test', one_hot=True)
+
+    if args.model != MODEL_TENSORFLOW:
+        if args.codeimage is not None:
+            raise AttributeError('Code images are only supported by the {0} model.'.format(MODEL_TENSORFLOW))
+        from prediction.baseline_models import BaselineModel
+        model = BaselineModel(train, test, args.model, args.modelname)
+        model.run_training()
+        print_predictions(model, test, args.numpredictions)
+        return
+
+    from prediction.tf_model import TensorFlowNet, TF_LAYER
+
+    input_shape = [train.feature_shape[1]] # Feature Shape is (Num_Samples, Feature_dim) -> we only need Feature_dim
+    reshape_input_to = None
+    architecture_shape = [
+        (TF_LAYER.Dense, 'hidden1', 128),
         (TF_LAYER.Dense, 'hidden2', 128),
         (TF_LAYER.Dense, 'hidden3', 16),
-        (TF_LAYER.Dropout, 'dropout1', 0.4)],
-    max_epochs=500,
-    model_name='Demo',
-    calculate_f1_score=True,
-    num_epochs_per_decay=90
-    )
-net.run_training()
-num_prediction_tests = 10
-X, y = test.get_random_elements(num_prediction_tests)
+        (TF_LAYER.Dropout, 'dropout1', 0.4)]
+    if args.codeimage is not None:
+        # single channel images (Num_Samples, Height, Width) -> NHWC batches
+        input_shape = [args.imagesize, args.imagesize, 1]
+        reshape_input_to = [-1, args.imagesize, args.imagesize, 1]
+        architecture_shape = [
+            (TF_LAYER.Convolution2D, 'conv1', ([5, 5, 1, 32], [1, 1, 1, 1], None)),
+            (TF_LAYER.MaxPooling, 'pool1', ([1, 2, 2, 1], [1, 2, 2, 1], None)),
+            (TF_LAYER.Convolution2D, 'conv2', ([5, 5, 32, 64], [1, 1, 1, 1], None)),
+            (TF_LAYER.MaxPooling, 'pool2', ([1, 2, 2, 1], [1, 2, 2, 1], None)),
+            (TF_LAYER.Dense, 'hidden1', 128),
+            (TF_LAYER.Dropout, 'dropout1', 0.4)]
+
+    net = TensorFlowNet(
+        train_data_set=train,
+        test_data_set=test,
+        num_classes=data_set_loader.num_classes,
+        input_shape=input_shape,
+        targets_shape=[-1, 2], # one hot
+        input_is_image=args.codeimage is not None,
+        reshape_input_to=reshape_input_to,
+        batch_size=100,
+        initial_learning_rate=1e-4,
+        architecture_shape=architecture_shape,
+        max_epochs=args.epochs,
+        model_name=args.modelname,
+        calculate_f1_score=True,
+        num_epochs_per_decay=90,
+        trace_steps=args.tracesteps,
+        reuse_log_dir=args.resume,
+        validation_ratio=args.validationratio,
+        early_stopping_epochs=args.patience,
+        learning_rate_plateau_epochs=args.lrplateau
+        )
+    if args.workers > 1:
+        from prediction.parallel_training import DataParallelTrainer
+        DataParallelTrainer(net, num_workers=args.workers).run_training()
+    else:
+        net.run_training(resume=args.resume, warm_start_from=args.warmstart)
+    print_predictions(net, test, args.numpredictions)
+
+def score(args):
+    """ Restores a trained net from its model dir and predicts classes of a project. """
+    from prediction.tf_model import TensorFlowNet
+
+    # re-indexing the sources would build a new vocabulary (and normalizer): the token ids would not match the trained model
+    if args.loadtestdata is None and args.featurestore is None:
+        raise AttributeError('The features have to be extracted with the vocabulary of the training features (--loadtestdata or --featurestore). To score a new project, append it to the feature store of the training projects (index --featurestore) first.')
+
+    net = TensorFlowNet.restore(args.modeldir)
+    data_set_loader = get_data_set_loader(args)
+    X, y = data_set_loader.get_project_split(bag_of_tokens=args.bagoftokens, tf_idf=args.tfidf, code_image=args.codeimage, image_size=args.imagesize, hash_image_tokens=args.hashimagetokens)
+    data_set = DataSet(X[args.project], y[args.project], 'Score', one_hot=False)
+    if args.ranking is not None:
+        rank(net, data_set_loader, data_set, args.ranking, args.project, args.topk)
+    else:
+        print_predictions(net, data_set, args.numpredictions)
+
+def changes(args):
+    """ Scores only the classes that changed in a git revision range. The sources are read from git (no checkout, no indexing). """
+    from data_io.git_source import read_changed_sources
+    from prediction.tf_model import TensorFlowNet, load_model_config
+
+    data_set_loader = DefectDataSetLoader([args.repository], [None], one_hot=False)
+    # frozen vocabulary (including the feature hashing settings) and normalizer of the training features
+    vocabulary = None
+    if args.loadtestdata is not None:
+        data_set_loader.load_features(args.loadtestdata, name=FEATURE_FILE_NAME)
+    elif args.featurestore is not None:
+        vocabulary = FrozenVocabulary.from_feature_store(args.featurestore)
+        data_set_loader.normalizer = FeatureStore(args.featurestore).get_normalizer()
+    else:
+        raise AttributeError('The vocabulary of the training features is needed (--loadtestdata or --featurestore).')
+    if args.normalizer is not None:
+        data_set_loader.normalizer = Normalizer.load(args.normalizer)
+
+    revision, sources = read_changed_sources(args.repository, args.revisions)
+    if len(sources) == 0:
+        print('No changed .java files in {0}.'.format(args.revisions))
+        return
+
+    num_features = load_model_config(args.modeldir)['input_shape'][0]
+    data_set_loader.initialize_from_sources(sources, num_features=num_features, vocabulary=vocabulary)
+    X, y = data_set_loader.get_project_split(bag_of_tokens=args.bagoftokens)
+    # the OOV column was not part of the training token counts
+    data_set = DataSet(X[0][:, :num_features] if args.bagoftokens else X[0], y[0], 'Changes', one_hot=False)
+
+    net = TensorFlowNet.restore(args.modeldir)
+    if args.ranking is not None:
+        rank(net, data_set_loader, data_set, args.ranking, 0, labeled=False)
+        return
+    probabilities = net.predict_proba(data_set)[:, 1]
+    print('Changed classes of {0} (revision {1}):'.format(args.revisions, revision))
+    for i in np.argsort(-probabilities, kind='stable'):
+        print('{0:.4f}  {1}  ({2})'.format(probabilities[i], data_set_loader.test_data_class_names[i], data_set_loader.test_data_loc[i]))
+
+def cross_validate(args):
+    """ Repeated stratified k-fold cross validation on the projects of a feature store. """
+    from functools import partial
+    from prediction.cross_validation import CrossValidation, create_tensorflow_net
+    from prediction.baseline_models import create_baseline_model
+
+    create_model = partial(create_tensorflow_net, max_epochs=args.epochs) if args.model == MODEL_TENSORFLOW else partial(create_baseline_model, model_type=args.model)
+    cross_validation = CrossValidation(args.featurestore, args.projectnames, num_folds=args.folds, num_repeats=args.repeats, num_workers=args.jobs, seed=args.seed)
+    try:
+        aggregated = cross_validation.run(create_model, bag_of_tokens=args.bagoftokens, normalization=args.normalization, sampling=args.sampling)
+    finally:
+        cross_validation.close()
+    cross_validation.log_results(aggregated)
+    if args.output is not None:
+        cross_validation.save_results(args.output, aggregated)
+
+def rank(net, data_set_loader, data_set, ranking_file, project_index=-1, k_values=(10, 20, 50), labeled=True):
+    """ Scores all classes of the project in batches and writes them ordered by defect risk per line of code. """
+    from prediction.ranking import rank_by_risk, ranking_metrics, log_ranking_metrics, write_ranking_csv
+
+    class_names = data_set_loader.get_project_class_names(project_index)
+    if len(class_names) != data_set.num_examples:
+        raise AttributeError('Class names are missing. Index the project again to rank its classes.')
+    loc = data_set_loader.get_project_loc(project_index)
+    if loc is None:
+        logging.getLogger('prediction').warning('Lines of code are unknown (feature store or older feature file). Every class counts as one line.')
+        loc = [1] * data_set.num_examples
+
+    scores = net.predict_proba(data_set)[:, 1]
+    order = rank_by_risk(scores, loc)
+    write_ranking_csv(ranking_file, class_names, scores, loc, order, defects=data_set.targets if labeled else None)
+    if labeled:
+        log_ranking_metrics(ranking_metrics(data_set.targets, loc, order, k_values=k_values), name=ranking_file)
+
+def bench(args):
+    """ Runs the data pipeline (and training) benchmarks on a synthetic corpus. """
+    from benchmark import run_benchmarks
+    run_benchmarks.main(args)
+
+def print_predictions(net, data_set, num_predictions):
+    X, y = data_set.get_random_elements(num_predictions)
+    for i in range(len(y)):
+        y_hat, prob = net.predict(X[i])
+        print('Y: {0} - Y predicted: {1} ({2:.2f})'.format(y[i], y_hat, prob))
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description='Defect prediction on the abstract syntax trees of java source files.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    index_parser = subparsers.add_parser('index', help='Index the source files and save the extracted features.')
+    add_data_arguments(index_parser)
+    index_parser.add_argument('-o', '--output', help='Dir to save the pickeled feature vector in.', required=False, default=TRAINING_DIR)
+    index_parser.add_argument('-fs', '--featurestore', help='Append the projects to the feature store in this dir instead of saving a pickled feature vector.', required=False)
+    index_parser.add_argument('-pn', '--projectnames', help='Unique names of the projects inside the feature store (e.g. ant-1.7). Default: project0, project1, ...', nargs='+', required=False)
+    index_parser.add_argument('-cd', '--codec', help='Compression codec of the feature store chunks.', choices=get_codecs(), default=CODEC_NONE)
+    index_parser.add_argument('-cl', '--compressionlevel', help='Codec specific compression level. Default: codec default.', type=int, required=False)
+    index_parser.set_defaults(function=index)
+
+    train_parser = subparsers.add_parser('train', help='Train the net on the second to last project and test it on the last project.')
+    add_data_arguments(train_parser)
+    add_feature_arguments(train_parser)
+    train_parser.add_argument('-ml', '--model', help='Model type. The baselines (scikit-learn) train in seconds on the cpu.', choices=MODEL_TYPES, default=MODEL_TENSORFLOW)
+    train_parser.add_argument('-e', '--epochs', help='Maximal number of training epochs.', type=int, default=500)
+    train_parser.add_argument('-m', '--modelname', help='Name of the model (name of the log dir).', required=False, default='Demo')
+    train_parser.add_argument('-n', '--numpredictions', help='Number of random test classes to print predictions for.', type=int, default=10)
+    train_parser.add_argument('-r', '--resume', help='Resume the training of --modelname from its latest checkpoint.', action='store_true')
+    train_parser.add_argument('-ws', '--warmstart', help='Model dir or checkpoint to initialize the weights with (e.g. the model of the previous release).', required=False)
+    train_parser.add_argument('-sm', '--sampling', help='Class imbalance sampling of the training batches (index based, the features are not copied).', choices=SAMPLING_MODES, default=SAMPLING_NONE)
+    train_parser.add_argument('-vr', '--validationratio', help='Share of the train project held out (stratified) for early stopping and model selection. 0: monitor the test project.', type=float, default=0.1)
+    train_parser.add_argument('-pa', '--patience', help='Epochs without improvement of the validation loss before the training stops.', type=int, default=20)
+    train_parser.add_argument('-lp', '--lrplateau', help='Epochs without improvement of the validation loss before the learning rate is halved. Default: no reduction.', type=int, required=False)
+    train_parser.add_argument('-w', '--workers', help='Number of worker processes for data parallel training. 1: single process training.', type=int, default=1)
+    train_parser.add_argument('-ts', '--tracesteps', help='Global training steps to record a full tensorflow trace for.', type=int, nargs='*', default=[])
+    train_parser.set_defaults(function=train)
+
+    score_parser = subparsers.add_parser('score', help='Predict classes of a project with a trained model.')
+    add_data_arguments(score_parser)
+    add_feature_arguments(score_parser)
+    score_parser.add_argument('-md', '--modeldir', help='Log dir of the trained model (contains the model config and checkpoint).', required=True)
+    score_parser.add_argument('-pi', '--project', help='Index of the project to score.', type=int, default=-1)
+    score_parser.add_argument('-n', '--numpredictions', help='Number of classes to print predictions for. -1: all classes.', type=int, default=10)
+    score_parser.add_argument('-rk', '--ranking', help='Write all classes ranked by defect risk per line of code to this csv file (instead of printing predictions).', required=False)
+    score_parser.add_argument('-k', '--topk', help='Ranking cutoffs for the top-k precision and recall.', type=int, nargs='+', default=[10, 20, 50])
+    score_parser.set_defaults(function=score)
+
+    cv_parser = subparsers.add_parser('cv', help='Repeated stratified k-fold cross validation on the projects of a feature store.')
+    cv_parser.add_argument('-fs', '--featurestore', help='Dir of the feature store.', required=True)
+    cv_parser.add_argument('-pn', '--projectnames', help='Projects of the feature store to use. Default: all projects.', nargs='+', required=False)
+    cv_parser.add_argument('-k', '--folds', help='Number of folds.', type=int, default=10)
+    cv_parser.add_argument('-rp', '--repeats', help='Number of repetitions with different folds.', type=int, default=10)
+    cv_parser.add_argument('-j', '--jobs', help='Number of worker processes. Default: number of cpus.', type=int, required=False)
+    cv_parser.add_argument('-ml', '--model', help='Model type of the folds.', choices=MODEL_TYPES, default=MODEL_TENSORFLOW)
+    cv_parser.add_argument('-e', '--epochs', help='Maximal number of training epochs per fold.', type=int, default=100)
+    cv_parser.add_argument('-nm', '--normalization', help='Feature normalization method (fitted on the train folds).', choices=NORMALIZATION_METHODS, default=NORMALIZATION_METHODS[0])
+    cv_parser.add_argument('-bt', '--bagoftokens', help='Use sparse token count vectors instead of padded token vectors.', action='store_true')
+    cv_parser.add_argument('-sm', '--sampling', help='Class imbalance sampling of the train folds.', choices=SAMPLING_MODES, default=SAMPLING_NONE)
+    cv_parser.add_argument('-s', '--seed', help='Seed of the fold assignments.', type=int, default=42)
+    cv_parser.add_argument('-o', '--output', help='Json file for the fold results and the aggregated metrics.', required=False)
+    cv_parser.set_defaults(function=cross_validate)
+
+    changes_parser = subparsers.add_parser('changes', help='Score only the classes changed in a git revision range with a trained model.')
+    changes_parser.add_argument('-md', '--modeldir', help='Log dir of the trained model (contains the model config and checkpoint).', required=True)
+    changes_parser.add_argument('-g', '--repository', help='Path to the local git repository.', default='.')
+    changes_parser.add_argument('-rr', '--revisions', help='Revision range (base..target) or a single commit. The files are read from the target revision.', default='HEAD~1..HEAD')
+    changes_parser.add_argument('-lt', '--loadtestdata', help='Dir with the pickled training features (vocabulary and normalizer are taken from it).', required=False)
+    changes_parser.add_argument('-fs', '--featurestore', help='Feature store with the training features (vocabulary and normalizer are taken from it).', required=False)
+    changes_parser.add_argument('-nz', '--normalizer', help='Json file with fitted normalizer statistics. Default: normalizer of the training features.', required=False)
+    changes_parser.add_argument('-bt', '--bagoftokens', help='The model was trained on token count vectors.', action='store_true')
+    changes_parser.add_argument('-rk', '--ranking', help='Write the changed classes ranked by defect risk per line of code to this csv file.', required=False)
+    changes_parser.set_defaults(function=changes)
+
+    bench_parser = subparsers.add_parser('bench', help='Run the benchmarks on a synthetic java corpus.')
+    # benchmark arguments are defined in benchmark.run_benchmarks (argparse only, no heavy imports)
+    from benchmark.run_benchmarks import add_arguments
+    add_arguments(bench_parser)
+    bench_parser.set_defaults(function=bench)
+
+    return parser
 
-for i in range(num_prediction_tests):
-    y_hat, prob = net.predict(X[i])
-    print('Y: {0} - Y predicted: {1} ({2:.2f})'.format(y[i], y_hat, prob))
+def main(argv=None):
+    parser = get_argument_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 1
 
+    create_loggers()
+    args.function(args)
+    return 0
 
 
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from collections import OrderedDict
+
+from benchmark.synthetic_corpus import generate_corpus
+from data_io.test_data import DefectDataSetLoader, DataSet, find_files_recursively, load_bug_data
+from data_io.feature_store import FeatureStore, get_codecs
+
+
+logger = logging.getLogger('io')
+
+DEFAULT_HISTORY_FILE = 'benchmark_history.json'
+
+
+def summarize_times(times):
+    return OrderedDict([
+        ('min', min(times)),
+        ('mean', sum(times) / len(times)),
+        ('max', max(times)),
+        ('repeat', len(times))
+        ])
+
+def time_function(function, repeat=3):
+    """ Runs function repeat times and returns the min / mean / max wall time. """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+    return summarize_times(times)
+
+def get_revision():
+    """ Short git revision of the working tree (None if git is not available). """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark_data_pipeline(source_root, bug_data_path, work_dir, repeat=3, batch_size=100, batch_epochs=10):
+    """ Times the stages of the data pipeline on a corpus. Returns an OrderedDict: benchmark name -> timing. """
+    results = OrderedDict()
+
+    results['find_files_recursively'] = time_function(lambda: find_files_recursively(source_root + '/org/', 'org', source_file_dict={}), repeat)
+    results['load_bug_data'] = time_function(lambda: load_bug_data(bug_data_path, 'name', 'bug', True), repeat)
+
+    # __create_ast_vectors and __prepare_data are private. Their timings are taken from the loader profiler.
+    initialize_times, create_ast_vectors_times, prepare_data_times = [], [], []
+    for _ in range(repeat):
+        data_set_loader = DefectDataSetLoader([source_root], [bug_data_path], one_hot=False)
+        start_time = time.perf_counter()
+        data_set_loader.initialize()
+        initialize_times.append(time.perf_counter() - start_time)
+
+        stages = data_set_loader.profiler.stages
+        create_ast_vectors_times.append(sum(stages[stage]['wall_time'] for stage in ['read', 'parse', 'extract']))
+        prepare_data_times.append(stages['prepare_data']['wall_time'])
+    results['initialize'] = summarize_times(initialize_times)
+    results['create_ast_vectors'] = summarize_times(create_ast_vectors_times)
+    results['prepare_data'] = summarize_times(prepare_data_times)
+
+    results['save_features'] = time_function(lambda: data_set_loader.save_features(work_dir), repeat)
+    results['load_features'] = time_function(lambda: data_set_loader.load_features(work_dir), repeat)
+
+    data_set = DataSet(data_set_loader.test_data_X, data_set_loader.test_data_Y, 'Benchmark', one_hot=False)
+    batch_size = min(batch_size, data_set.num_examples)
+    num_batches = (data_set.num_examples // batch_size) * batch_epochs
+    def iterate_batches():
+        for _ in range(num_batches):
+            data_set.next_batch(batch_size)
+    results['next_batch'] = time_function(iterate_batches, repeat)
+    results['next_batch']['batches'] = num_batches
+
+    return results, data_set_loader
+
+def create_benchmark_net(data_set_loader, work_dir, epochs=3, batch_size=100, model_name='benchmark'):
+    """ Small dense net on a train/test split of the corpus. """
+    from prediction.tf_model import TensorFlowNet, TF_LAYER
+
+    X_train, X_test, y_train, y_test = data_set_loader.get_test_train_split()
+    train = DataSet(X_train, y_train, 'Train', one_hot=True)
+    test = DataSet(X_test, y_test, 'Test', one_hot=True)
+
+    return TensorFlowNet(
+        train_data_set=train,
+        test_data_set=test,
+        num_classes=data_set_loader.num_classes,
+        input_shape=[train.feature_shape[1]],
+        targets_shape=[-1, 2],
+        input_is_image=False,
+        batch_size=min(batch_size, train.num_examples),
+        initial_learning_rate=1e-4,
+        architecture_shape=[
+            (TF_LAYER.Dense, 'hidden1', 128),
+            (TF_LAYER.Dense, 'hidden2', 16)],
+        log_dir=os.path.join(work_dir, 'log'),
+        max_epochs=epochs,
+        model_name=model_name)
+
+def benchmark_training(data_set_loader, work_dir, epochs=3, batch_size=100):
+    """ Times a few epochs of TensorFlowNet.run_training on a train/test split of the corpus. """
+    # tensorflow is only imported if the training benchmark is requested
+    net = create_benchmark_net(data_set_loader, work_dir, epochs, batch_size)
+
+    result = time_function(net.run_training, repeat=1)
+    result['epochs'] = epochs
+    result['phases'] = OrderedDict((phase, record['wall_time']) for phase, record in net.profiler.report()['stages'].items())
+    return result
+
+def benchmark_parallel_training(data_set_loader, work_dir, worker_counts, epochs=3, batch_size=100):
+    """ Throughput and convergence of the data parallel training compared with single process training. """
+    from prediction.parallel_training import compare_with_single_process
+
+    comparison = compare_with_single_process(lambda: create_benchmark_net(data_set_loader, work_dir, epochs, batch_size, model_name='benchmark_parallel'), worker_counts)
+    results = OrderedDict()
+    for name, result in comparison.items():
+        # history entries need min / mean / max. The throughput is stored as seconds per example.
+        seconds_per_example = 1.0 / result['examples_per_second'] if result['examples_per_second'] > 0 else float('inf')
+        results['training_' + name] = dict(summarize_times([seconds_per_example]), **result)
+    return results
+
+def benchmark_codecs(data_set_loader, work_dir, codecs, repeat=3):
+    """ Times writing and reading a feature store with every codec. The stored size is added to the read result. """
+    results = OrderedDict()
+    for codec in codecs:
+        store_path = os.path.join(work_dir, 'store_' + codec)
+
+        def write_store():
+            shutil.rmtree(store_path, ignore_errors=True)
+            data_set_loader.save_to_store(store_path, codec=codec)
+        results['store_write_' + codec] = time_function(write_store, repeat)
+
+        # read the whole chunks (memory mapped chunks are only read on access)
+        store = FeatureStore(store_path)
+        results['store_read_' + codec] = time_function(lambda: store.read(), repeat)
+        results['store_read_' + codec]['raw_bytes'] = sum(chunk['raw_bytes'] for chunk in store.chunks)
+        results['store_read_' + codec]['stored_bytes'] = sum(chunk['stored_bytes'] for chunk in store.chunks)
+        shutil.rmtree(store_path, ignore_errors=True)
+
+    logger.info('Feature store codecs:')
+    for codec in codecs:
+        read_result = results['store_read_' + codec]
+        logger.info('\t{0:<6} {1:>10} -> {2:>10} bytes ({3:6.1%})  write: {4:8.4f}s  read: {5:8.4f}s'.format(codec, read_result['raw_bytes'], read_result['stored_bytes'], read_result['stored_bytes'] / read_result['raw_bytes'], results['store_write_' + codec]['mean'], read_result['mean']))
+    return results
+
+def load_history(history_file):
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file) as f:
+        return json.load(f)
+
+def compare_with_previous_run(history, run):
+    """ Logs the ratio of the mean times to the last run with the same parameters. """
+    previous_runs = [entry for entry in history if entry['parameters'] == run['parameters']]
+    if len(previous_runs) == 0:
+        logger.info('No previous benchmark run with the same parameters.')
+        return
+    previous = previous_runs[-1]
+    logger.info('Comparison with run from {0} (revision {1}):'.format(previous['created'], previous['revision']))
+    for name, result in run['results'].items():
+        if name not in previous['results']:
+            continue
+        ratio = result['mean'] / previous['results'][name]['mean'] if previous['results'][name]['mean'] > 0 else float('inf')
+        logger.info('\t{0:<24} {1:9.4f}s -> {2:9.4f}s ({3:+.1%})'.format(name, previous['results'][name]['mean'], result['mean'], ratio - 1))
+
+def run_benchmarks(parameters, history_file=DEFAULT_HISTORY_FILE, corpus_dir=None, repeat=3, training=False, epochs=3, codecs=(), workers=()):
+    """
+    Generates a synthetic corpus, runs all benchmarks and appends the results to the json history.
+
+    Keyword arguments:
+    parameters -- dict with the keyword arguments of benchmark.synthetic_corpus.generate_corpus
+    history_file -- json file with the results of all previous runs
+    corpus_dir -- directory for the corpus. Default: temporary directory (removed afterwards)
+    repeat -- number of repetitions per benchmark
+    training -- also benchmark TensorFlowNet.run_training (needs tensorflow)
+    epochs -- number of training epochs
+    codecs -- feature store codecs to benchmark (see data_io.feature_store.get_codecs)
+    workers -- worker counts to compare data parallel training with (only with training)
+    """
+    remove_corpus = corpus_dir is None
+    if corpus_dir is None:
+        corpus_dir = tempfile.mkdtemp(prefix='defect_prediction_benchmark_')
+
+    try:
+        source_root, bug_data_path = generate_corpus(corpus_dir, **parameters)
+        results, data_set_loader = benchmark_data_pipeline(source_root, bug_data_path, corpus_dir, repeat=repeat)
+        results.update(benchmark_codecs(data_set_loader, corpus_dir, codecs, repeat=repeat))
+        if training:
+            results['run_training'] = benchmark_training(data_set_loader, corpus_dir, epochs=epochs)
+            if len(workers) > 0:
+                results.update(benchmark_parallel_training(data_set_loader, corpus_dir, workers, epochs=epochs))
+    finally:
+        if remove_corpus:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    run = OrderedDict([
+        ('created', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('revision', get_revision()),
+        ('parameters', dict(parameters, repeat=repeat, training=training, epochs=epochs, codecs=list(codecs), workers=list(workers))),
+        ('num_examples', len(data_set_loader.test_data_Y)),
+        ('results', results)
+        ])
+
+    logger.info('Benchmark results ({0} classes):'.format(run['num_examples']))
+    for name, result in results.items():
+        logger.info('\t{0:<24} min: {1:9.4f}s  mean: {2:9.4f}s  max: {3:9.4f}s'.format(name, result['min'], result['mean'], result['max']))
+
+    history = load_history(history_file)
+    compare_with_previous_run(history, run)
+    history.append(run)
+    with open(history_file, 'w') as f:
+        json.dump(history, f, indent=2)
+    logger.info('Appended results to {0}.'.format(history_file))
+    return run
+
+def add_arguments(parser):
+    parser.add_argument('--history', help='Json file with the benchmark history.', default=DEFAULT_HISTORY_FILE)
+    parser.add_argument('--corpusdir', help='Directory for the synthetic corpus. Default: temporary directory.', required=False)
+    parser.add_argument('--packages', help='Number of packages of the synthetic corpus.', type=int, default=10)
+    parser.add_argument('--classes', help='Number of classes per package.', type=int, default=20)
+    parser.add_argument('--methods', help='Number of methods per class.', type=int, default=5)
+    parser.add_argument('--statements', help='Maximal number of statements per method.', type=int, default=10)
+    parser.add_argument('--seed', help='Random seed of the corpus generator.', type=int, default=42)
+    parser.add_argument('--repeat', help='Number of repetitions per benchmark.', type=int, default=3)
+    parser.add_argument('--training', help='Also benchmark a few epochs of TensorFlowNet.run_training.', action='store_true')
+    parser.add_argument('--epochs', help='Number of training epochs.', type=int, default=3)
+    parser.add_argument('--workers', help='Worker counts to compare data parallel training with single process training (needs --training).', type=int, nargs='*', default=[])
+    parser.add_argument('--codecs', help='Feature store codecs to benchmark.', nargs='*', choices=get_codecs(), default=get_codecs())
+
+def main(args):
+    parameters = {
+        'num_packages': args.packages,
+        'classes_per_package': args.classes,
+        'methods_per_class': args.methods,
+        'statements_per_method': args.statements,
+        'seed': args.seed
+        }
+    return run_benchmarks(parameters, history_file=args.history, corpus_dir=args.corpusdir, repeat=args.repeat, training=args.training, epochs=args.epochs, codecs=args.codecs, workers=args.workers)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Benchmarks for the data pipeline and the training loop on a synthetic java corpus.')
+    add_arguments(parser)
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+import os
+import random
+import logging
+
+
+logger = logging.getLogger('io')
+
+# header of the PROMISE bug data sheets (e.g. ant-1.7.csv). The class name is the second 'name' column, the number of bugs the last one.
+BUG_DATA_HEADER = ['name', 'version', 'name', 'wmc', 'dit', 'noc', 'cbo', 'rfc', 'lcom', 'ca', 'ce', 'npm', 'lcom3', 'loc', 'dam', 'moa', 'mfa', 'cam', 'ic', 'cbm', 'amc', 'max_cc', 'avg_cc', 'bug']
+
+STATEMENT_TEMPLATES = [
+    '{indent}{method}({var});',
+    '{indent}{type} {var}{index} = new {type}();',
+    '{indent}if ({var} > {index}) {{\n{indent}    return;\n{indent}}}',
+    '{indent}for (int i = 0; i < {index}; i++) {{\n{indent}    {method}(i);\n{indent}}}',
+    '{indent}while ({var} < {index}) {{\n{indent}    {var}++;\n{indent}}}',
+    '{indent}try {{\n{indent}    {method}({var});\n{indent}}} catch (Exception e) {{\n{indent}    throw new RuntimeException(e);\n{indent}}}'
+    ]
+
+
+def generate_class_source(package, class_name, num_methods, statements_per_method, vocabulary, rng):
+    """ Generates the source code of a syntactically valid java class. """
+    lines = ['package {0};'.format(package), '', 'public class {0} {{'.format(class_name), '    private int counter;', '']
+    for method_index in range(num_methods):
+        lines.append('    public void {0}(int value) {{'.format(rng.choice(vocabulary['methods'])))
+        for statement_index in range(rng.randint(1, statements_per_method)):
+            template = rng.choice(STATEMENT_TEMPLATES)
+            lines.append(template.format(
+                indent='        ',
+                method=rng.choice(vocabulary['methods']),
+                type=rng.choice(vocabulary['types']),
+                var='value',
+                index=statement_index))
+        lines.append('    }')
+        lines.append('')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+def generate_corpus(path, num_packages=10, classes_per_package=20, methods_per_class=5, statements_per_method=10, package_depth=3, num_method_names=500, num_type_names=100, bug_ratio=0.2, version='1.0', seed=42):
+    """
+    Generates a synthetic java project and a matching bug data sheet.
+
+    Keyword arguments:
+    path -- directory to create the corpus in (source files are written to path/src)
+    num_packages -- number of packages
+    classes_per_package -- number of classes per package
+    methods_per_class -- number of methods per class
+    statements_per_method -- maximal number of statements per method
+    package_depth -- number of package parts below the 'org' root
+    num_method_names / num_type_names -- size of the invocation / creator name vocabulary
+    bug_ratio -- share of classes with at least one bug
+    seed -- random seed (same parameters and seed produce the same corpus)
+
+    Returns:
+    (source root, path to bug data csv)
+    """
+    rng = random.Random(seed)
+    vocabulary = {
+        'methods': ['method{0}'.format(i) for i in range(num_method_names)],
+        'types': ['Type{0}'.format(i) for i in range(num_type_names)]
+        }
+
+    source_root = os.path.join(path, 'src')
+    rows = []
+    for package_index in range(num_packages):
+        package_parts = ['org'] + ['p{0}_{1}'.format(package_index, depth) for depth in range(package_depth)]
+        package = '.'.join(package_parts)
+        package_path = os.path.join(source_root, *package_parts)
+        os.makedirs(package_path, exist_ok=True)
+
+        for class_index in range(classes_per_package):
+            class_name = 'Class{0}'.format(class_index)
+            with open(os.path.join(package_path, class_name + '.java'), 'w') as f:
+                f.write(generate_class_source(package, class_name, methods_per_class, statements_per_method, vocabulary, rng))
+
+            number_of_bugs = rng.randint(1, 5) if rng.random() < bug_ratio else 0
+            metrics = [str(rng.randint(0, 100)) for _ in range(len(BUG_DATA_HEADER) - 4)]
+            rows.append(['synthetic', version, package + '.' + class_name] + metrics + [str(number_of_bugs)])
+
+    bug_data_path = os.path.join(path, 'bugs.csv')
+    with open(bug_data_path, 'w') as f:
+        f.write(','.join(BUG_DATA_HEADER) + '\n')
+        for row in rows:
+            f.write(','.join(row) + '\n')
+
+    logger.debug('Generated synthetic corpus with {0} classes in {1}.'.format(len(rows), path))
+    return source_root, bug_data_path
@@ -0,0 +1,41 @@
+import logging
+import numpy as np
+from scipy import sparse
+
+
+logger = logging.getLogger('io')
+
+
+def to_bag_of_tokens(token_sequences, num_tokens=None, tf_idf=False, dtype=np.float32):
+    """
+    Converts token id sequences into token count vectors (one row per class).
+
+    Keyword arguments:
+    token_sequences -- list of token id lists (e.g. the extracted AST tokens of each class)
+    num_tokens -- number of columns. Default: highest token id + 1
+    tf_idf -- apply tf-idf weighting to the counts
+    dtype -- dtype of the matrix values
+
+    Returns:
+    scipy.sparse CSR matrix of shape [num_sequences, num_tokens]
+    """
+    lengths = np.fromiter((len(sequence) for sequence in token_sequences), dtype=np.int64, count=len(token_sequences))
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+
+    indices = np.fromiter((token for sequence in token_sequences for token in sequence), dtype=np.int64, count=indptr[-1])
+    if num_tokens is None:
+        num_tokens = int(indices.max()) + 1 if len(indices) > 0 else 1
+    elif len(indices) > 0 and indices.max() >= num_tokens:
+        raise AttributeError('Token id {0} does not fit into {1} columns.'.format(indices.max(), num_tokens))
+
+    # every occurence counts once. Duplicate entries (same token in the same row) are summed up.
+    counts = sparse.csr_matrix((np.ones(len(indices), dtype=dtype), indices, indptr), shape=(len(lengths), num_tokens))
+    counts.sum_duplicates()
+
+    if tf_idf:
+        from sklearn.feature_extraction.text import TfidfTransformer
+        counts = TfidfTransformer().fit_transform(counts).astype(dtype)
+
+    logger.debug('Bag of tokens matrix: shape {0} - {1} non zero entries ({2} bytes).'.format(counts.shape, counts.nnz, counts.data.nbytes + counts.indices.nbytes + counts.indptr.nbytes))
+    return counts
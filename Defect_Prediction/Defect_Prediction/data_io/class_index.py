@@ -0,0 +1,88 @@
+import logging
+
+
+logger = logging.getLogger('io')
+
+MATCH_EXACT = 'exact'
+MATCH_INNER_CLASS = 'inner'
+MATCH_SUFFIX = 'suffix'
+
+
+class ClassFileIndex(object):
+    """
+    Index to match class names of the bug data sheets (e.g. org.apache.tools.ant.Main$Inner)
+    against the indexed source files (package info -> path).
+
+    Lookups are resolved in this order:
+        1. exact match of the (outer) class name
+        2. indexed class name ends with the class name (source files are located under a different root folder)
+        3. class name ends with an indexed class name (the bug data contains additional leading packages)
+    Every step is a dict lookup, so the costs per class only depend on the package depth.
+    """
+
+    def __init__(self, source_files, min_suffix_length=2):
+        """
+        Keyword arguments:
+        source_files -- dict: package info -> path to source file
+        min_suffix_length -- minimal number of package parts (including the class name) a suffix match needs
+        """
+        self.__source_files = source_files
+        self.__min_suffix_length = min_suffix_length
+
+        # suffix -> package info. None if the suffix is ambiguous.
+        self.__suffixes = {}
+        for class_info in source_files:
+            parts = class_info.split('.')
+            for i in range(1, len(parts) - min_suffix_length + 1):
+                suffix = '.'.join(parts[i:])
+                if suffix in self.__suffixes and self.__suffixes[suffix] != class_info:
+                    self.__suffixes[suffix] = None
+                else:
+                    self.__suffixes[suffix] = class_info
+
+    def __len__(self):
+        return len(self.__source_files)
+
+    def lookup(self, class_info):
+        """
+        Finds the indexed source file of a class.
+
+        Returns:
+        (package info, path, match type) or (None, None, None) if there is no (unambiguous) match.
+        """
+        # inner classes are defined in the file of their outer class
+        outer_class_info = class_info.split('$', 1)[0]
+        match_type = MATCH_EXACT if outer_class_info == class_info else MATCH_INNER_CLASS
+
+        if outer_class_info in self.__source_files:
+            return outer_class_info, self.__source_files[outer_class_info], match_type
+
+        key = self.__suffixes.get(outer_class_info)
+        if key is None:
+            parts = outer_class_info.split('.')
+            for i in range(1, len(parts) - self.__min_suffix_length + 1):
+                suffix = '.'.join(parts[i:])
+                if suffix in self.__source_files:
+                    key = suffix
+                    break
+
+        if key is None:
+            return None, None, None
+        return key, self.__source_files[key], MATCH_SUFFIX
+
+
+def match_statistics(num_classes, match_types):
+    """ Summarizes the match types of a mapping (list of MATCH_* values, None for no match). """
+    statistics = {
+        'classes': num_classes,
+        MATCH_EXACT: 0,
+        MATCH_INNER_CLASS: 0,
+        MATCH_SUFFIX: 0,
+        'unmatched': 0
+        }
+    for match_type in match_types:
+        statistics[match_type if match_type is not None else 'unmatched'] += 1
+
+    statistics['matched'] = num_classes - statistics['unmatched']
+    statistics['match_rate'] = statistics['matched'] / num_classes if num_classes > 0 else 0.0
+    return statistics
@@ -0,0 +1,131 @@
+import logging
+import numpy as np
+
+from data_io.vocabulary import HashedVocabulary
+
+
+logger = logging.getLogger('io')
+
+CODE_IMAGE_GRID = 'grid'                    # the token sequence row by row (truncated / zero padded to height * width tokens)
+CODE_IMAGE_COOCCURRENCE = 'cooccurrence'    # counts of the token pairs (token, token window positions later). One row / column per token id
+CODE_IMAGE_ENCODINGS = [CODE_IMAGE_GRID, CODE_IMAGE_COOCCURRENCE]
+CODE_IMAGE_DTYPES = (np.uint8, np.uint16)
+DEFAULT_IMAGE_SIZE = 32
+
+# classes per chunk of the co-occurrence counting (bounds the size of the temporary count array)
+COOCCURRENCE_CHUNK_SIZE = 1000
+
+
+def get_image_dtype(num_values):
+    """ Smallest unsigned dtype for num_values distinct pixel values. """
+    for dtype in CODE_IMAGE_DTYPES:
+        if num_values <= np.iinfo(dtype).max + 1:
+            return dtype
+    raise AttributeError('{0} distinct values do not fit into a code image. Maximum: {1}'.format(num_values, np.iinfo(CODE_IMAGE_DTYPES[-1]).max + 1))
+
+def expand_code_images(images, dtype=np.float32):
+    """
+    Expands a batch of code images to [0.0, 1.0] (the full range of the storage dtype). Only done batch wise.
+    The dtype alone does not mark a code image (token matrices of a feature store are unsigned too), so the caller
+    has to know that the features are code images (see TensorFlowNet input_is_image).
+    """
+    if images.dtype not in CODE_IMAGE_DTYPES:
+        raise AttributeError('Code images have to be one of {0}. Got {1}.'.format(CODE_IMAGE_DTYPES, images.dtype))
+    return images.astype(dtype) / np.iinfo(images.dtype).max
+
+def __flatten_sequences(token_sequences, max_length=None):
+    """ Concatenated token ids, sequence index and position of every token (sequences truncated to max_length). """
+    lengths = np.fromiter((len(sequence) if max_length is None else min(len(sequence), max_length) for sequence in token_sequences), dtype=np.int64, count=len(token_sequences))
+    starts = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    tokens = np.fromiter((token for sequence in token_sequences for token in sequence[:max_length]), dtype=np.int64, count=lengths.sum())
+    sequence_indices = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.arange(len(tokens)) - np.repeat(starts, lengths)
+    return tokens, sequence_indices, positions
+
+def to_token_grids(token_sequences, num_tokens, height=DEFAULT_IMAGE_SIZE, width=DEFAULT_IMAGE_SIZE):
+    """
+    Lays out the token sequence of every class row by row in a height x width grid.
+    The token ids are spread over the range of the dtype (uint8 up to 256 token ids, uint16 otherwise). 0 (no token) stays 0.
+
+    Keyword arguments:
+    token_sequences -- list of token id lists (e.g. the extracted AST tokens of each class)
+    num_tokens -- number of token ids (highest token id + 1)
+
+    Returns:
+    uint8 / uint16 array [num_sequences, height, width]
+    """
+    dtype = get_image_dtype(num_tokens)
+    tokens, sequence_indices, positions = __flatten_sequences(token_sequences, height * width)
+    if len(tokens) > 0 and tokens.max() >= num_tokens:
+        raise AttributeError('Token id {0} does not fit into {1} token ids.'.format(tokens.max(), num_tokens))
+
+    grids = np.zeros((len(token_sequences), height * width), dtype=dtype)
+    scale = np.iinfo(dtype).max / max(num_tokens - 1, 1)
+    grids[sequence_indices, positions] = np.round(tokens * scale).astype(dtype)
+
+    num_truncated = sum(1 for sequence in token_sequences if len(sequence) > height * width)
+    logger.debug('Token grids: shape {0} {1} ({2} bytes) - {3} sequences truncated.'.format(grids.shape, grids.dtype, grids.nbytes, num_truncated))
+    return grids.reshape((len(token_sequences), height, width))
+
+def to_cooccurrence_matrices(token_sequences, num_tokens, size=DEFAULT_IMAGE_SIZE, window=1, dtype=np.uint8, hash_tokens=False):
+    """
+    Counts how often token a is followed by token b (window positions later) in every class.
+    Every token id has its own row and column, so size has to be at least num_tokens.
+    With hash_tokens more token ids are hashed into size buckets (see data_io.vocabulary.HashedVocabulary). The buckets
+    are only usable for small vocabularies: the expected share of colliding ids is 1 - (1 - 1 / size) ** (num_tokens - 2),
+    e.g. about 86% for 64 token ids in 32 buckets and close to 100% for a few hundred. The actual rate is logged.
+    The counts are log scaled per class to the range of the dtype, so the most frequent pair of every class has the maximal value.
+
+    Keyword arguments:
+    token_sequences -- list of token id lists
+    num_tokens -- number of token ids (highest token id + 1)
+    size -- number of rows and columns
+    window -- distance of the token pairs
+    hash_tokens -- hash the token ids into size buckets if num_tokens is larger than size
+
+    Returns:
+    uint8 / uint16 array [num_sequences, size, size]
+    """
+    if dtype not in CODE_IMAGE_DTYPES:
+        raise AttributeError('Unsupported dtype {0}. Use one of {1}.'.format(dtype, CODE_IMAGE_DTYPES))
+    if window < 1:
+        raise AttributeError('window has to be positive. Got {0}.'.format(window))
+
+    # bucket of every token id
+    token_buckets = None
+    if num_tokens > size:
+        if not hash_tokens:
+            raise AttributeError('{0} token ids do not fit into a {1}x{1} co-occurrence matrix. Use an image size of at least {0} or hash the token ids into buckets (hash_tokens, --hashimagetokens).'.format(num_tokens, size))
+        hasher = HashedVocabulary(size, first_token_id=0)
+        token_buckets = np.array([hasher.token_id(str(token_id)) for token_id in range(num_tokens)], dtype=np.int64)
+        statistics = hasher.collision_statistics(str(token_id) for token_id in range(1, num_tokens))
+        logger.info('Hashed {0} token ids into {1} co-occurrence buckets: {2:.1%} of the token ids collide.'.format(statistics['num_names'], size, statistics['collision_rate']))
+
+    matrices = np.zeros((len(token_sequences), size * size), dtype=dtype)
+    maximum = np.iinfo(dtype).max
+    for chunk_start in range(0, len(token_sequences), COOCCURRENCE_CHUNK_SIZE):
+        chunk = token_sequences[chunk_start:chunk_start + COOCCURRENCE_CHUNK_SIZE]
+        tokens, sequence_indices, _ = __flatten_sequences(chunk)
+        if len(tokens) > 0 and tokens.max() >= num_tokens:
+            raise AttributeError('Token id {0} does not fit into {1} token ids.'.format(tokens.max(), num_tokens))
+        buckets = tokens if token_buckets is None else token_buckets[tokens]
+
+        # pairs of the concatenated sequences that belong to the same class
+        same_sequence = sequence_indices[:-window] == sequence_indices[window:] if len(tokens) > window else np.zeros(0, dtype=bool)
+        cells = sequence_indices[:-window] * size * size + buckets[:-window] * size + buckets[window:] if len(tokens) > window else np.zeros(0, dtype=np.int64)
+        counts = np.bincount(cells[same_sequence], minlength=len(chunk) * size * size).reshape((len(chunk), size * size))
+
+        scaled = np.log1p(counts) * (maximum / np.maximum(np.log1p(counts.max(axis=1, keepdims=True)), 1e-12))
+        matrices[chunk_start:chunk_start + len(chunk)] = np.round(np.minimum(scaled, maximum)).astype(dtype)
+
+    logger.debug('Token co-occurrence matrices: shape {0} {1} ({2} bytes).'.format(matrices.shape, matrices.dtype, matrices.nbytes))
+    return matrices.reshape((len(token_sequences), size, size))
+
+def to_code_images(token_sequences, num_tokens, encoding=CODE_IMAGE_GRID, image_size=DEFAULT_IMAGE_SIZE, hash_tokens=False):
+    """ Encodes the token sequences as square code images (see CODE_IMAGE_ENCODINGS). hash_tokens is only used by the co-occurrence matrices. """
+    if encoding == CODE_IMAGE_GRID:
+        return to_token_grids(token_sequences, num_tokens, image_size, image_size)
+    if encoding == CODE_IMAGE_COOCCURRENCE:
+        return to_cooccurrence_matrices(token_sequences, num_tokens, image_size, hash_tokens=hash_tokens)
+    raise AttributeError('Unknown code image encoding {0}. Available encodings: {1}'.format(encoding, CODE_IMAGE_ENCODINGS))
@@ -1,4 +1,5 @@
 import csv
+from operator import itemgetter
 
 def get_csv_row_generator(path, delimiter=';', skip_first_row=True):
     with open(path) as f:
@@ -8,6 +9,51 @@ def get_csv_row_generator(path, delimiter=';', skip_first_row=True):
                 skip_first_row = False
                 continue
             yield row
-        
 
+def get_column_index(header, column):
+    """
+    Resolves a column (header name or index) to its index.
+    If a header name occurs multiple times the last occurrence is used
+    (the PROMISE bug sheets contain 'name' for the project and again for the class).
 
+    Keyword arguments:
+    header -- first row of the csv file
+    column -- header name, int index or index as string (e.g. from the command line)
+    """
+    if isinstance(column, int) or (isinstance(column, str) and column.isdigit()):
+        index = int(column)
+        if index >= len(header):
+            raise AttributeError('Column index {0} is out of range. The csv file has {1} columns.'.format(index, len(header)))
+        return index
+
+    stripped_header = [title.strip() for title in header]
+    if column not in stripped_header:
+        raise AttributeError('Column {0} does not exist. Available columns: {1}'.format(column, stripped_header))
+    return len(stripped_header) - 1 - stripped_header[::-1].index(column)
+
+def read_csv_columns(path, columns, delimiter=','):
+    """
+    Reads the selected columns of a csv file with a header row in a single pass.
+
+    Keyword arguments:
+    path -- path to the csv file
+    columns -- list of header names or indices
+    delimiter -- csv delimiter
+
+    Returns:
+    list with one tuple of (string) values per selected column
+    """
+    with open(path, newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, [])
+        column_indices = [get_column_index(header, column) for column in columns]
+
+        # select the columns of every row and transpose the result. Both steps run in C.
+        select_columns = itemgetter(*column_indices)
+        rows = [select_columns(row) for row in reader if len(row) > 0]
+
+    if len(rows) == 0:
+        return [() for _ in column_indices]
+    if len(column_indices) == 1:
+        return [tuple(rows)]
+    return list(zip(*rows))
@@ -0,0 +1,316 @@
+import io
+import os
+import bz2
+import json
+import lzma
+import time
+import zlib
+import logging
+import numpy as np
+from data_io.normalization import Normalizer
+
+
+logger = logging.getLogger('io')
+
+MANIFEST_FILE_NAME = 'manifest.json'
+VOCABULARY_FILE_NAME = 'vocabulary.json'
+FEATURE_STORE_VERSION = 2
+
+CODEC_NONE = 'none'
+
+# codec name -> (compress(bytes, level), decompress(bytes)). Additional codecs (e.g. zstd, lz4) can be added with register_codec.
+CODECS = {
+    'zlib': (lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress),
+    'lzma': (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+    'bz2': (lambda data, level: bz2.compress(data, 9 if level is None else level), bz2.decompress)
+    }
+
+
+def register_codec(name, compress, decompress):
+    """
+    Registers a compression codec for the feature store.
+
+    Keyword arguments:
+    name -- codec name (stored in the manifest, the codec has to be registered for reading as well)
+    compress -- function(data, level) -> compressed bytes. level is None for the default level
+    decompress -- function(compressed data) -> bytes
+    """
+    if name == CODEC_NONE:
+        raise AttributeError('Codec name {0} is reserved.'.format(CODEC_NONE))
+    CODECS[name] = (compress, decompress)
+
+def get_codecs():
+    return [CODEC_NONE] + sorted(CODECS.keys())
+
+def get_smallest_uint_dtype(max_value):
+    """ Smallest unsigned integer dtype that can hold max_value. """
+    for dtype in [np.uint8, np.uint16, np.uint32]:
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def pad_token_sequences(token_sequences, width=None, dtype=np.int32):
+    """ Converts token id lists into a zero padded matrix (one row per sequence). The matrix is allocated once. """
+    max_length = max([len(tokens) for tokens in token_sequences] + [0])
+    if width is None:
+        width = max_length
+    elif width < max_length:
+        raise AttributeError('Token sequence with length {0} does not fit into {1} columns.'.format(max_length, width))
+
+    X = np.zeros((len(token_sequences), width), dtype=dtype)
+    for row, tokens in enumerate(token_sequences):
+        X[row, :len(tokens)] = tokens
+    return X
+
+def write_json(file_name, data):
+    """ Writes json to a temporary file first and replaces the target. Readers never see half written files. """
+    temp_file_name = file_name + '.tmp'
+    with open(temp_file_name, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_file_name, file_name)
+
+
+class FeatureStore(object):
+    """
+    Append-only on-disk store for extracted features. Every project is written once as a chunk:
+
+        <path>/manifest.json        chunk list, project indices, vocabulary version
+        <path>/vocabulary.json      token_mapping_names (or the number of hash buckets) + version
+        <path>/<chunk>_X.npy        padded token id matrix (smallest sufficient uint dtype, memory mappable)
+        <path>/<chunk>_y.npy        labels
+        <path>/<chunk>_classes.json class names (same row order)
+
+    Appending a project only writes its chunk and rewrites the (small) manifest / vocabulary.
+    The token ids of existing chunks stay valid because the vocabulary only grows.
+
+    With a codec the .npy files of new chunks are compressed as a whole (<chunk>_X.npy.<codec>).
+    Compressed chunks can not be memory mapped. The codec is stored per chunk, so a store can contain mixed chunks.
+    """
+
+    def __init__(self, path, codec=CODEC_NONE, compression_level=None):
+        """
+        Keyword arguments:
+        path -- dir of the store (created if necessary)
+        codec -- compression codec for new chunks (see get_codecs)
+        compression_level -- codec specific level. Default: codec default
+        """
+        if codec != CODEC_NONE and codec not in CODECS:
+            raise AttributeError('Unknown codec {0}. Available codecs: {1}'.format(codec, get_codecs()))
+        self.codec = codec
+        self.compression_level = compression_level
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        manifest_path = os.path.join(path, MANIFEST_FILE_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest['format_version'] > FEATURE_STORE_VERSION:
+                raise AttributeError('Feature store {0} was written by a newer version ({1}).'.format(path, self.manifest['format_version']))
+        else:
+            self.manifest = {
+                'format_version': FEATURE_STORE_VERSION,
+                'vocabulary_version': 0,
+                'num_examples': 0,
+                'test_data_project_indices': [],
+                'chunks': []
+                }
+
+    @property
+    def chunks(self):
+        return self.manifest['chunks']
+
+    @property
+    def project_names(self):
+        return [chunk['project'] for chunk in self.chunks]
+
+    @property
+    def vocabulary_version(self):
+        return self.manifest['vocabulary_version']
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __contains__(self, project):
+        return project in self.project_names
+
+    def __get_chunk(self, project):
+        if isinstance(project, int):
+            return self.chunks[project]
+        for chunk in self.chunks:
+            if chunk['project'] == project:
+                return chunk
+        raise AttributeError('Project {0} is not in the feature store. Projects: {1}'.format(project, self.project_names))
+
+    def __file(self, name):
+        return os.path.join(self.path, name)
+
+    def __save_array(self, name, array, codec):
+        """ Saves an array as .npy (optionally compressed). Returns the number of bytes written. """
+        if codec == CODEC_NONE:
+            np.save(self.__file(name), array)
+            return os.path.getsize(self.__file(name))
+
+        buffer = io.BytesIO()
+        np.save(buffer, array)
+        compress, _ = CODECS[codec]
+        data = compress(buffer.getvalue(), self.compression_level)
+        with open(self.__file('{0}.{1}'.format(name, codec)), 'wb') as f:
+            f.write(data)
+        return len(data)
+
+    def __load_array(self, name, codec, mmap):
+        if codec == CODEC_NONE:
+            return np.load(self.__file(name), mmap_mode='r' if mmap else None)
+
+        if codec not in CODECS:
+            raise AttributeError('Chunk file {0} is compressed with codec {1} which is not registered.'.format(name, codec))
+        _, decompress = CODECS[codec]
+        with open(self.__file('{0}.{1}'.format(name, codec)), 'rb') as f:
+            return np.load(io.BytesIO(decompress(f.read())))
+
+    def load_vocabulary(self):
+        """ Returns the stored vocabulary: {'version', 'token_mapping_names', 'current_mapping_index', 'num_hash_buckets', 'filtered_tokens'} or None. """
+        if not os.path.exists(self.__file(VOCABULARY_FILE_NAME)):
+            return None
+        with open(self.__file(VOCABULARY_FILE_NAME)) as f:
+            return json.load(f)
+
+    def save_vocabulary(self, token_mapping_names, current_mapping_index, num_hash_buckets=None, filtered_tokens=()):
+        """
+        Saves the vocabulary and the manifest. The version is incremented if the vocabulary changed. Returns the version.
+        filtered_tokens are the rare token ids that were removed from the new chunks. Only ids that are missing
+        in every chunk stay filtered (the ids are removed from the features of new source files, see FrozenVocabulary).
+        """
+        filtered_tokens = set(int(token_id) for token_id in filtered_tokens)
+        vocabulary = self.load_vocabulary()
+        if vocabulary is not None:
+            if vocabulary['num_hash_buckets'] != num_hash_buckets:
+                raise AttributeError('Feature hashing settings do not match the feature store ({0} - {1} buckets).'.format(vocabulary['num_hash_buckets'], num_hash_buckets))
+            # existing token ids must not change. Otherwise the stored chunks would be invalid.
+            for name, token_id in vocabulary['token_mapping_names'].items():
+                if token_mapping_names.get(name) != token_id:
+                    raise AttributeError('Vocabulary is not an extension of the stored vocabulary (token {0}: {1} - {2}).'.format(name, token_id, token_mapping_names.get(name)))
+            # older stores do not record the filtered tokens
+            filtered_tokens &= set(vocabulary.get('filtered_tokens', filtered_tokens))
+            if len(vocabulary['token_mapping_names']) == len(token_mapping_names) and set(vocabulary.get('filtered_tokens', [])) == filtered_tokens:
+                return vocabulary['version']
+
+        # stores written before the manifest was saved with the vocabulary may have a newer vocabulary file
+        version = max(self.vocabulary_version, vocabulary['version'] if vocabulary is not None else 0) + 1
+        write_json(self.__file(VOCABULARY_FILE_NAME), {
+            'version': version,
+            'token_mapping_names': token_mapping_names,
+            'current_mapping_index': current_mapping_index,
+            'num_hash_buckets': num_hash_buckets,
+            'filtered_tokens': sorted(filtered_tokens)
+            })
+        self.manifest['vocabulary_version'] = version
+        write_json(self.__file(MANIFEST_FILE_NAME), self.manifest)
+        logger.debug('Saved vocabulary version {0} with {1} names.'.format(version, len(token_mapping_names)))
+        return version
+
+    def append_project(self, project, token_sequences, y, class_names, normalizer=None):
+        """
+        Writes a project as new chunk and updates the manifest.
+
+        Keyword arguments:
+        project -- unique project name (e.g. ant-1.7)
+        token_sequences -- list of (unpadded) token id lists
+        y -- labels (number of bugs or binary labels)
+        class_names -- class name of every row
+        normalizer -- normalizer that is fitted on the chunk (statistics are stored in the manifest). Default: min-max
+        """
+        if project in self:
+            raise AttributeError('Project {0} is already in the feature store. Chunks are append-only.'.format(project))
+        if not (len(token_sequences) == len(y) == len(class_names)):
+            raise AttributeError('Number of token sequences ({0}), labels ({1}) and class names ({2}) differ.'.format(len(token_sequences), len(y), len(class_names)))
+
+        chunk_name = 'chunk{0:04d}'.format(len(self.chunks))
+        max_token_id = max([max(tokens) for tokens in token_sequences if len(tokens) > 0] + [0])
+        X = pad_token_sequences(token_sequences, dtype=get_smallest_uint_dtype(max_token_id))
+        y = np.asarray(y)
+        y = y.astype(get_smallest_uint_dtype(y.max())) if len(y) > 0 and y.min() >= 0 else y.astype(np.int32)
+
+        if normalizer is None:
+            normalizer = Normalizer()
+        normalizer.fit(X)
+
+        num_bytes = self.__save_array(chunk_name + '_X.npy', X, self.codec)
+        num_bytes += self.__save_array(chunk_name + '_y.npy', y, self.codec)
+        write_json(self.__file(chunk_name + '_classes.json'), list(class_names))
+
+        start_index = self.manifest['num_examples']
+        self.chunks.append({
+            'name': chunk_name,
+            'project': project,
+            'num_examples': len(y),
+            'num_features': X.shape[1],
+            'dtype': str(X.dtype),
+            'codec': self.codec,
+            'raw_bytes': X.nbytes + y.nbytes,
+            'stored_bytes': num_bytes,
+            'vocabulary_version': self.vocabulary_version,
+            'normalizer': normalizer.get_state(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+            })
+        self.manifest['num_examples'] += len(y)
+        # same convention as DefectDataSetLoader.test_data_project_indices (start index, end index)
+        self.manifest['test_data_project_indices'].append((start_index, start_index + len(y) - 1))
+
+        # the manifest is written last. A chunk is only visible after its files are complete.
+        write_json(self.__file(MANIFEST_FILE_NAME), self.manifest)
+        logger.debug('Appended project {0} ({1} classes, {2} features, {3}, codec: {4}, {5} -> {6} bytes) as {7}.'.format(project, len(y), X.shape[1], X.dtype, self.codec, X.nbytes + y.nbytes, num_bytes, chunk_name))
+
+    def read_chunk(self, project, mmap=True):
+        """ Returns (X, y, class_names) of a project. Uncompressed X and y are memory mapped (read only) if mmap is set. """
+        chunk = self.__get_chunk(project)
+        # chunks of format version 1 have no codec entry
+        codec = chunk.get('codec', CODEC_NONE)
+        X = self.__load_array(chunk['name'] + '_X.npy', codec, mmap)
+        y = self.__load_array(chunk['name'] + '_y.npy', codec, mmap)
+        with open(self.__file(chunk['name'] + '_classes.json')) as f:
+            class_names = json.load(f)
+        return X, y, class_names
+
+    def get_normalizer(self, projects=None):
+        """ Merges the normalizer statistics of the chunks of the given projects (default: all). """
+        projects = self.project_names if projects is None else projects
+        normalizer = None
+        for project in projects:
+            chunk_normalizer = Normalizer.from_state(self.__get_chunk(project)['normalizer'])
+            normalizer = chunk_normalizer if normalizer is None else normalizer.merge(chunk_normalizer)
+        return normalizer
+
+    def read(self, projects=None, width=None, dtype=np.float32):
+        """
+        Reads the chunks of the given projects (default: all) into a single zero padded matrix.
+
+        Returns:
+        (X, y, class_names, project_indices)
+        """
+        projects = self.project_names if projects is None else projects
+        chunks = [self.__get_chunk(project) for project in projects]
+        if width is None:
+            width = max([chunk['num_features'] for chunk in chunks] + [0])
+
+        num_examples = sum(chunk['num_examples'] for chunk in chunks)
+        X = np.zeros((num_examples, width), dtype=dtype)
+        y = np.zeros(num_examples, dtype=np.int32)
+        class_names = []
+        project_indices = []
+
+        start = 0
+        for chunk in chunks:
+            if chunk['num_features'] > width:
+                raise AttributeError('Project {0} has {1} features. Width is {2}.'.format(chunk['project'], chunk['num_features'], width))
+            chunk_X, chunk_y, chunk_class_names = self.read_chunk(chunk['project'])
+            end = start + chunk['num_examples']
+            X[start:end, :chunk_X.shape[1]] = chunk_X
+            y[start:end] = chunk_y
+            class_names.extend(chunk_class_names)
+            project_indices.append((start, end - 1))
+            start = end
+        return X, y, class_names, project_indices
@@ -0,0 +1,88 @@
+import logging
+import subprocess
+
+
+logger = logging.getLogger('io')
+
+# only added, modified and renamed files have a blob in the target revision
+CHANGED_FILES_DIFF_FILTER = 'AMR'
+
+
+def run_git(repository, arguments, input=None):
+    """ Runs a git command in the repository and returns its stdout (bytes). """
+    try:
+        result = subprocess.run(['git', '-C', repository] + arguments, input=input, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        raise AttributeError('Could not run git. Is git installed and on the PATH?')
+    if result.returncode != 0:
+        raise AttributeError('git {0} failed in {1}: {2}'.format(' '.join(arguments), repository, result.stderr.decode('utf-8', 'replace').strip()))
+    return result.stdout
+
+def get_changed_files(repository, revision_range, file_extension='.java'):
+    """
+    Lists the files that were added, modified or renamed in a revision range.
+
+    Keyword arguments:
+    repository -- path to the local git repository (any dir inside the working tree)
+    revision_range -- 'base..target' (e.g. origin/master..HEAD) or a single revision (changes of this commit, merges: against the first parent)
+    file_extension -- only files with this extension are returned
+
+    Returns:
+    (target revision, list of paths relative to the repository root)
+    """
+    if '..' in revision_range:
+        # 'a...b' compares b against the merge base, 'a..b' against a. The blobs are read from b in both cases.
+        target = revision_range.split('..')[-1].lstrip('.') or 'HEAD'
+        arguments = ['diff', '--name-only', '-z', '--diff-filter=' + CHANGED_FILES_DIFF_FILTER, revision_range, '--']
+    else:
+        target = revision_range
+        # a commit is compared against its first parent (rev^), so merge commits list the changes of the merged branch.
+        # The root commit has no parent and is compared against the empty tree.
+        parents = run_git(repository, ['rev-list', '--parents', '-n', '1', revision_range, '--']).split()[1:]
+        if len(parents) > 0:
+            arguments = ['diff', '--name-only', '-z', '--diff-filter=' + CHANGED_FILES_DIFF_FILTER, revision_range + '^', revision_range, '--']
+        else:
+            arguments = ['diff-tree', '-r', '--root', '--no-commit-id', '--name-only', '-z', '--diff-filter=' + CHANGED_FILES_DIFF_FILTER, revision_range, '--']
+
+    paths = [path for path in run_git(repository, arguments).decode('utf-8').split('\0') if path.endswith(file_extension)]
+    logger.debug('{0} changed {1} files in {2}.'.format(len(paths), file_extension, revision_range))
+    return target, paths
+
+def read_blobs(repository, revision, paths):
+    """
+    Reads the content of files at a revision with a single git cat-file --batch call (no checkout needed).
+
+    Returns:
+    list with the content (bytes) of every path. None if the path does not exist at the revision.
+    """
+    if len(paths) == 0:
+        return []
+    requests = ''.join('{0}:{1}\n'.format(revision, path) for path in paths).encode('utf-8')
+    output = run_git(repository, ['cat-file', '--batch'], input=requests)
+
+    # every object: '<sha> <type> <size>\n<content>\n' - missing objects: '<request> missing\n'
+    blobs = []
+    position = 0
+    for path in paths:
+        header_end = output.index(b'\n', position)
+        header = output[position:header_end].split()
+        position = header_end + 1
+        if header[-1] == b'missing':
+            logger.warning('{0} does not exist at revision {1}.'.format(path, revision))
+            blobs.append(None)
+            continue
+        size = int(header[2])
+        blobs.append(output[position:position + size] if header[1] == b'blob' else None)
+        position += size + 1
+    return blobs
+
+def read_changed_sources(repository, revision_range, file_extension='.java'):
+    """
+    Reads the changed source files of a revision range straight from the git object database.
+
+    Returns:
+    (target revision, [(path, source code bytes)])
+    """
+    target, paths = get_changed_files(repository, revision_range, file_extension)
+    blobs = read_blobs(repository, target, paths)
+    return target, [(path, blob) for path, blob in zip(paths, blobs) if blob is not None]
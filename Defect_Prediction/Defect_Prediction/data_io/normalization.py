@@ -0,0 +1,168 @@
+import json
+import logging
+import numpy as np
+
+
+logger = logging.getLogger('io')
+
+NORMALIZATION_MIN_MAX = 'min_max'
+NORMALIZATION_STANDARD = 'standard'
+NORMALIZATION_METHODS = [NORMALIZATION_MIN_MAX, NORMALIZATION_STANDARD]
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def iterate_chunks(X, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Yields (start, end) row indices of consecutive chunks of X. """
+    for start in range(0, X.shape[0], chunk_size):
+        yield start, min(start + chunk_size, X.shape[0])
+
+
+class Normalizer(object):
+    """
+    Streaming feature normalization. The statistics are collected chunk by chunk (partial_fit) so the
+    full matrix never has to be in memory at once. Statistics of different chunks / projects can be merged
+    (e.g. the per project statistics of a feature store) and saved to apply the same scaling at scoring time.
+
+    min_max:  x' = (x - min) / (max - min)
+    standard: x' = (x - mean) / std
+
+    By default one global statistic is used for all features (token ids share the same scale).
+    With per_feature each column gets its own statistic. In that case all chunks need the same number of columns.
+    """
+
+    def __init__(self, method=NORMALIZATION_MIN_MAX, per_feature=False):
+        if method not in NORMALIZATION_METHODS:
+            raise AttributeError('Unknown normalization method {0}. Available methods: {1}'.format(method, NORMALIZATION_METHODS))
+        self.method = method
+        self.per_feature = per_feature
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.mean = None
+        # sum of squared differences from the mean (M2 of Welford / Chan et al.)
+        self.m2 = None
+
+    @property
+    def is_fitted(self):
+        return self.count > 0
+
+    def __chunk_statistics(self, X):
+        axis = 0 if self.per_feature else None
+        X = np.asarray(X, dtype=np.float64)
+        count = X.shape[0] if self.per_feature else X.size
+        mean = X.mean(axis=axis)
+        return count, X.min(axis=axis), X.max(axis=axis), mean, ((X - mean) ** 2).sum(axis=axis)
+
+    def __merge_statistics(self, count, minimum, maximum, mean, m2):
+        if count == 0:
+            return
+        if self.count == 0:
+            self.count, self.min, self.max, self.mean, self.m2 = count, minimum, maximum, mean, m2
+            return
+
+        # parallel variance algorithm (Chan et al.)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.min = np.minimum(self.min, minimum)
+        self.max = np.maximum(self.max, maximum)
+        self.count = total
+
+    def partial_fit(self, X):
+        """ Adds the statistics of a chunk of rows. """
+        if X.shape[0] > 0:
+            self.__merge_statistics(*self.__chunk_statistics(X))
+        return self
+
+    def fit(self, X, chunk_size=DEFAULT_CHUNK_SIZE):
+        """ Computes the statistics of X in a single pass over chunks of chunk_size rows. """
+        self.reset()
+        for start, end in iterate_chunks(X, chunk_size):
+            self.partial_fit(X[start:end])
+        return self
+
+    def merge(self, other):
+        """ Merges the statistics of another normalizer (e.g. fitted on another project) into this one. """
+        if other.method != self.method or other.per_feature != self.per_feature:
+            raise AttributeError('Can not merge normalizers with different settings: ({0}, {1}) - ({2}, {3})'.format(self.method, self.per_feature, other.method, other.per_feature))
+        self.__merge_statistics(other.count, other.min, other.max, other.mean, other.m2)
+        return self
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.is_fitted else None
+
+    def get_scaling(self):
+        """ Returns (offset, scale) with x' = (x - offset) / scale. A scale of 0 (constant feature) is replaced by 1. """
+        if not self.is_fitted:
+            raise AttributeError('Normalizer is not fitted.')
+        if self.method == NORMALIZATION_MIN_MAX:
+            offset, scale = self.min, self.max - self.min
+        else:
+            offset, scale = self.mean, self.std
+        scale = np.where(scale == 0, 1.0, scale)
+        return offset, scale
+
+    def transform(self, X, chunk_size=DEFAULT_CHUNK_SIZE, copy=False):
+        """
+        Normalizes X chunk by chunk. Float matrices are transformed in place unless copy is set.
+        Other dtypes are converted to float32.
+        """
+        if copy or not np.issubdtype(X.dtype, np.floating):
+            X = np.array(X, dtype=X.dtype if np.issubdtype(X.dtype, np.floating) else np.float32)
+
+        offset, scale = self.get_scaling()
+        offset = np.asarray(offset, dtype=X.dtype)
+        scale = np.asarray(scale, dtype=X.dtype)
+        for start, end in iterate_chunks(X, chunk_size):
+            X[start:end] -= offset
+            X[start:end] /= scale
+        return X
+
+    def fit_transform(self, X, chunk_size=DEFAULT_CHUNK_SIZE, copy=False):
+        return self.fit(X, chunk_size).transform(X, chunk_size, copy)
+
+    def get_state(self):
+        """ Json serializable statistics (see from_state). """
+        def to_list(value):
+            return value.tolist() if isinstance(value, np.ndarray) else (float(value) if value is not None else None)
+
+        return {
+            'method': self.method,
+            'per_feature': self.per_feature,
+            'count': int(self.count),
+            'min': to_list(self.min),
+            'max': to_list(self.max),
+            'mean': to_list(self.mean),
+            'm2': to_list(self.m2)
+            }
+
+    @classmethod
+    def from_state(cls, state):
+        normalizer = cls(state['method'], state['per_feature'])
+        normalizer.count = state['count']
+        for name in ['min', 'max', 'mean', 'm2']:
+            value = state[name]
+            setattr(normalizer, name, np.array(value, dtype=np.float64) if isinstance(value, list) else value)
+        return normalizer
+
+    def save(self, file_name):
+        with open(file_name, 'w') as f:
+            json.dump(self.get_state(), f, indent=2)
+        logger.debug('Saved normalizer statistics to {0}.'.format(file_name))
+
+    @classmethod
+    def load(cls, file_name):
+        with open(file_name) as f:
+            return cls.from_state(json.load(f))
+
+    def __repr__(self):
+        if not self.is_fitted:
+            return 'Normalizer({0}, not fitted)'.format(self.method)
+        offset, scale = self.get_scaling()
+        return 'Normalizer({0}, count: {1}, offset: {2}, scale: {3})'.format(self.method, self.count, offset, scale)
@@ -0,0 +1,93 @@
+import os
+import glob
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger('io')
+
+
+def expand_source_roots(source_roots):
+    """
+    Expands the source roots of a project into a list of existing directories.
+
+    Keyword arguments:
+    source_roots -- single path or list of paths. Paths may contain glob patterns (e.g. 'repo/*/src/main/java' or 'repo/**/generated').
+
+    Returns:
+    sorted list of normalized directories. Directories inside of another root are dropped (they would be indexed twice).
+    """
+    if isinstance(source_roots, str):
+        source_roots = [source_roots]
+
+    roots = set()
+    for source_root in source_roots:
+        if glob.has_magic(source_root):
+            matches = glob.glob(source_root, recursive=True)
+            if len(matches) == 0:
+                logger.warning('Source root pattern {0} did not match any directory.'.format(source_root))
+        else:
+            matches = [source_root]
+
+        for match in matches:
+            if os.path.isdir(match):
+                roots.add(os.path.normpath(os.path.abspath(match)))
+            else:
+                logger.warning('Source root {0} is not a directory.'.format(match))
+
+    expanded_roots = []
+    for root in sorted(roots):
+        if any(root.startswith(parent + os.sep) for parent in expanded_roots):
+            logger.debug('\tSkipping source root {0}. It is part of another source root.'.format(root))
+            continue
+        expanded_roots.append(root)
+    return expanded_roots
+
+def index_source_root(source_root, file_extension='.java'):
+    """
+    Indexes all source files below a root directory.
+    The package info of a file is its directory relative to the root (e.g. root/org/apache/Main.java -> org.apache.Main).
+
+    Returns:
+    dict: package info -> path to source file
+    """
+    source_file_dict = {}
+    for current_path, folders, files in os.walk(source_root, onerror=lambda e: logger.warning('\tCould not iterate through folder {0}.'.format(e.filename))):
+        # deterministic traversal order
+        folders.sort()
+        relative_path = os.path.relpath(current_path, source_root)
+        package_prefix = '' if relative_path == os.curdir else relative_path.replace(os.sep, '.') + '.'
+        for file in files:
+            if file.endswith(file_extension):
+                source_file_dict[package_prefix + file[:-len(file_extension)]] = os.path.join(current_path, file).replace(os.sep, '/')
+    return source_file_dict
+
+def index_source_roots(source_roots, file_extension='.java', max_workers=None):
+    """
+    Indexes multiple source roots concurrently and merges them into one dict (package info -> path).
+    If a package info exists in more than one root the first root (sorted by path) wins.
+    """
+    roots = expand_source_roots(source_roots)
+    if len(roots) == 0:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        indices = list(executor.map(lambda root: index_source_root(root, file_extension), roots))
+
+    source_file_dict = {}
+    for root, index in zip(roots, indices):
+        logger.debug('\tIndexed {0} source files in {1}.'.format(len(index), root))
+        duplicates = 0
+        for class_info, path in index.items():
+            if class_info in source_file_dict:
+                duplicates += 1
+                continue
+            source_file_dict[class_info] = path
+        if duplicates > 0:
+            logger.warning('\t{0} classes of source root {1} were already indexed in another root and are ignored.'.format(duplicates, root))
+    return source_file_dict
+
+def index_projects(project_source_roots, file_extension='.java', max_workers=None):
+    """ Indexes the source roots of multiple projects concurrently. Returns a list of dicts (package info -> path). """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda source_roots: index_source_roots(source_roots, file_extension, max_workers), project_source_roots))
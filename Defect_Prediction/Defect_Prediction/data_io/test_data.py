@@ -3,15 +3,28 @@ import os.path as osPath
 import pickle
 import logging
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelBinarizer
+from concurrent.futures import ThreadPoolExecutor
 import javalang
-from data_io.csv_data import get_csv_row_generator
+from data_io.csv_data import read_csv_columns
+from data_io.vocabulary import iterate_tree_tokens, HashedVocabulary, FrozenVocabulary, STRUCTURAL_TOKEN_MAPPING, DEFAULT_NUM_HASH_BUCKETS
+from data_io.bag_of_tokens import to_bag_of_tokens
+from data_io.code_image import to_code_images, DEFAULT_IMAGE_SIZE
+from data_io.class_index import ClassFileIndex, match_statistics
+from data_io.source_index import index_projects
+from data_io.normalization import Normalizer, NORMALIZATION_MIN_MAX
+from data_io.feature_store import FeatureStore, CODEC_NONE
 from misc import utils
+from misc.profiling import StageProfiler
 
 
 logger = logging.getLogger('io')
 
+# feature files (see DefectDataSetLoader.save_features) are pickled dicts with a format version
+FEATURE_FILE_VERSION = 2
+# field names of the positional tuples written before the format version was introduced (version 1).
+# Older files contain only the first entries.
+FEATURE_FILE_TUPLE_FIELDS = ['X', 'Y', 'token_mapping_names', 'class_vector', 'one_hot', 'project_indices', 'num_hash_buckets', 'tokens', 'normalizer', 'class_names', 'loc', 'filtered_tokens']
+
 
 def to_one_hot(y):
     """Transform multi-class labels to binary labels
@@ -29,6 +42,9 @@ def to_one_hot(y):
             Shape will be [n_samples, 1] for binary problems.
         classes_ : class vector extraceted from y.
         """
+    # sklearn is imported on first use (slow import)
+    from sklearn.preprocessing import LabelBinarizer
+
     lb = LabelBinarizer()
     lb.fit(y)
     Y = lb.transform(y)
@@ -67,45 +83,81 @@ def find_files_recursively(current_path, current_index, source_file_dict={}, fil
         return source_file_dict
 
 def load_bug_data(bug_data_path, class_info_mapping, number_of_bugs_mapping, binary_class_labels):
+    """
+    Loads the bug data sheet of a single project.
+
+    Keyword arguments:
+    bug_data_path -- path to the csv bug data sheet
+    class_info_mapping -- header name or index of the class name column (e.g. 'name')
+    number_of_bugs_mapping -- header name or index of the number of bugs column (e.g. 'bug')
+    binary_class_labels -- map the number of bugs to 0 (no bug) and 1 (bug)
+
+    Returns:
+    dict: class name -> label
+    """
     logger.debug('Initializing bug data set with parameters {0} - {1}'.format(class_info_mapping, number_of_bugs_mapping))
     if not bug_data_path.endswith('.csv'):
         raise AttributeError('Only .csv files are supported.')
         
-    # iterate over entries and add them to the __bug_data list
-    # skip the first row (contains only title)
-    bug_data_dict = {}
-    for entry in get_csv_row_generator(bug_data_path, delimiter=',', skip_first_row=True):
-        logger.debug('\tBugs: {1} \t-> Class: {0}'.format(entry[class_info_mapping], entry[number_of_bugs_mapping]))
-        
-        # precise mapping
-        if binary_class_labels:
-            bug_data_dict[entry[class_info_mapping]] = 1 if int(entry[number_of_bugs_mapping]) > 0 else 0 # Binary mapping. No Bug: 0 - Bug: 1
-        else:
-            bug_data_dict[entry[class_info_mapping]] = entry[number_of_bugs_mapping] # Class is number of bugs
+    # read both columns at once (the first row contains the column titles)
+    class_infos, number_of_bugs = read_csv_columns(bug_data_path, [class_info_mapping, number_of_bugs_mapping], delimiter=',')
+    labels = np.array(number_of_bugs).astype(np.int32)
 
-    return bug_data_dict
+    # precise mapping
+    if binary_class_labels:
+        labels = (labels > 0).astype(np.int32) # Binary mapping. No Bug: 0 - Bug: 1
+
+    # Class is number of bugs
+    return dict(zip(class_infos, labels.tolist()))
+
+def load_bug_data_list(bug_data_path_list, class_info_mapping, number_of_bugs_mapping, binary_class_labels, max_workers=None):
+    """ Loads multiple bug data sheets concurrently. Returns a list of dicts in the order of bug_data_path_list. """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda path: load_bug_data(path, class_info_mapping, number_of_bugs_mapping, binary_class_labels), bug_data_path_list))
         
-def map_bug_data(source_files, bug_data):
+def map_bug_data(source_files, bug_data, binary_class_labels=True):
+        """
+        Maps the classes of the bug data to their source files (see ClassFileIndex for the matching rules).
+        Classes that share a source file (inner classes) are merged into one entry named after the outer class,
+        otherwise the same features would appear several times (possibly in the train and the test split).
+        The bug numbers are summed (binary labels: maximum).
+
+        Returns:
+        (test_data, statistics) -- test_data: [(class_info, path_to_class_file, number_of_bugs)], statistics: see match_statistics
+        """
         logger.debug('Mapping bug data and source files together.')
-        test_data = []
+        class_file_index = ClassFileIndex(source_files)
+        merge = max if binary_class_labels else sum
+        # path -> [class_info, bug numbers] (dicts keep the order of the bug data)
+        file_bugs = {}
+        match_types = []
         for class_info, number_of_bugs in bug_data.items():
-            if not class_info in source_files:
-                logger.error('Could not find match for bug data file {0}.'.format(class_info))
+            _, path_to_class_file, match_type = class_file_index.lookup(class_info)
+            match_types.append(match_type)
+            if match_type is None:
+                logger.debug('Could not find match for bug data file {0}.'.format(class_info))
                 continue
-            test_data.append((class_info, source_files[class_info], number_of_bugs))
-        return test_data
+            if path_to_class_file not in file_bugs:
+                file_bugs[path_to_class_file] = [class_info.split('$', 1)[0], []]
+            file_bugs[path_to_class_file][1].append(number_of_bugs)
+
+        test_data = [(class_info, path_to_class_file, merge(bug_numbers)) for path_to_class_file, (class_info, bug_numbers) in file_bugs.items()]
+        statistics = match_statistics(len(bug_data), match_types)
+        statistics['merged'] = statistics['matched'] - len(test_data)
+        return test_data, statistics
 
 class DefectDataSetLoader(object):
     """description of class"""
 
-    def __init__(self, source_root_path_list=[], bug_data_path_list=[], source_files_extension=('.java'), one_hot=True, binary_class_labels=True):
+    def __init__(self, source_root_path_list=[], bug_data_path_list=[], source_files_extension=('.java'), one_hot=True, binary_class_labels=True, feature_hashing=False, num_hash_buckets=DEFAULT_NUM_HASH_BUCKETS, profile_parsing=False, normalization=NORMALIZATION_MIN_MAX, normalizer=None):
         
         if len(source_root_path_list) == 0 or len(bug_data_path_list) == 0 or len(source_root_path_list) != len(bug_data_path_list):
             raise AttributeError('Parameter source_root_path_list or bug_data_path_list are either empty or do not contain the same number of dirs.')
 
         self.num_projects = len(source_root_path_list)
 
-        # root path of the java project and location of the bug data sheet
+        # root path(s) of the java project and location of the bug data sheet.
+        # An entry is either a single path or a list of paths (source sets). Paths may contain glob patterns.
         self.__root_path_list = source_root_path_list
         self.__bug_data_path_list = bug_data_path_list
 
@@ -124,6 +176,9 @@ class DefectDataSetLoader(object):
         # class_info: (package info) (e.g. org.apache.tools.ant.taskdefs.rmic.RmicAdapterFactory) 
         self.test_data = [[] for _ in range(self.num_projects)]
 
+        # match statistics of the bug data / source file mapping for each project (see data_io.class_index.match_statistics)
+        self.match_statistics = [{} for _ in range(self.num_projects)]
+
         # list that stores the start and end indices for each project for the data set feature vectors.
         # for example: [(0, 500), ...] would mean that features from index 0 to 500 belong to project 0 and features from 501 to X belong to another project.
         # list of tuples. [(start_index, end_index)]
@@ -134,23 +189,24 @@ class DefectDataSetLoader(object):
 
         self.test_data_X = []
         self.test_data_Y = []
+
+        # class name (class info) of every feature vector
+        self.test_data_class_names = []
+
+        # lines of code of every class (counted while reading the source file). Effort for the effort-aware ranking (see prediction.ranking).
+        self.test_data_loc = []
+
+        # filtered token id sequences of every class (unpadded). Used for the bag of tokens representation.
+        self.test_data_tokens = []
+
+        # rare token ids that were removed from the token sequences (see __prepare_data).
+        # Stored with the features so that the features of new source files are filtered the same way.
+        self.filtered_tokens = set()
         self.one_hot = one_hot
         self.num_classes = -1
         self.class_vector = []
 
-        self.token_mapping = {
-            'MethodDeclaration': 1,
-            'ClassDeclaration': 2,
-            'FieldDeclaration': 3,
-            'EnumDeclaration': 4,
-            'WhileStatement': 5,
-            'ForStatement': 6,
-            'IfStatement': 7,
-            'ThrowStatement': 8,
-            'TryStatement': 9,
-            'CatchClause': 10,
-            'ReturnStatement': 11
-            }
+        self.token_mapping = dict(STRUCTURAL_TOKEN_MAPPING)
 
         self.token_mapping_names = {
             'main': 12
@@ -158,50 +214,55 @@ class DefectDataSetLoader(object):
         
         self.current_mapping_index = 13
 
+        # hashing trick for method and class names (fixed vocabulary size).
+        # If set, token_mapping_names is not used during feature extraction.
+        self.name_hasher = HashedVocabulary(num_hash_buckets) if feature_hashing else None
+        self.hash_collision_statistics = None
+
+        # read-only vocabulary of the last initialize_from_sources call (see freeze_vocabulary)
+        self.frozen_vocabulary = None
+
         self.source_files_extension = source_files_extension
 
+        # feature scaling. A fitted normalizer (e.g. loaded from the training features) is applied as is.
+        # Otherwise the statistics are computed on the loaded projects (see data_io.normalization).
+        self.normalizer = normalizer if normalizer is not None else Normalizer(normalization)
+
+        # timings of the loading stages (index, load_bug_data, match, read, parse, extract, prepare_data, ...).
+        # profile_parsing additionally records cProfile stats for the parse stage (see StageProfiler.dump_profile).
+        self.profiler = StageProfiler(profile_stages=['parse'] if profile_parsing else [])
+
         
-    def initialize(self, class_info_mapping, number_of_bugs_mapping):
+    def initialize(self, class_info_mapping='name', number_of_bugs_mapping='bug'):
 
         logger.debug('Initializing {0} source data set(s) with path(s) {1}.'.format(self.num_projects, self.__root_path_list))
 
+        # load all bug data sheets at once
+        with self.profiler.stage('load_bug_data'):
+            self.__bug_data = load_bug_data_list(self.__bug_data_path_list, class_info_mapping, number_of_bugs_mapping, self.binary_class_labels)
+        self.profiler.add('load_bug_data', items=sum(len(bug_data) for bug_data in self.__bug_data), num_bytes=sum(osPath.getsize(path) for path in self.__bug_data_path_list))
+
+        # index the source roots of all projects at once
+        with self.profiler.stage('index'):
+            self.__source_files = index_projects(self.__root_path_list, file_extension=self.source_files_extension)
+        self.profiler.add('index', items=sum(len(source_files) for source_files in self.__source_files))
+
         for i in range(self.num_projects):
             print('-- Project {0} --'.format(i))
             logger.debug('Initializing project {0}.'.format(i))
             project_source_path = self.__root_path_list[i]
             project_bug_path = self.__bug_data_path_list[i]
 
-            # append '/' at the end if it does not exist.
-            if not project_source_path.endswith('/'):
-                project_source_path += '/'
-
-            # iterate over root path and add all files to the source_files dict
-            folder_list = []
-            try:
-                folder_list = next(walk(project_source_path))[1]
-            except:
-                logger.exception('\tCould not iterate through root folder of dataset. - Path: {0}.'.format(project_source_path))
-
-            if len(folder_list) == 0:
-                logger.error('Could not locate project root on path {0}. There were no folders inside the directory.'.format(project_source_path))
-                return None
-            elif len(folder_list) > 1:
-                logger.error('Could not locate project root on path {0}. There were more than one folder in the directory.\n\t\tExpected something like this [org]\n\t\tGot {2}.'.format(project_source_path, folder_list))
-                return None
-        
-            logger.debug('\tFound project root {0}.'.format(folder_list[0]))
-
-            # go over source dir and index source files
-            self.__source_files[i] = find_files_recursively(project_source_path + folder_list[0] + '/', folder_list[0], source_file_dict={}, file_extension=self.source_files_extension)
+            if len(self.__source_files[i]) == 0:
+                logger.error('Could not find any source files for project {0} on path(s) {1}.'.format(i, project_source_path))
             logger.debug('Finished indexing of source folder for project {0} ({1}). Found {2} files.'.format(i, project_source_path, len(self.__source_files[i])))
 
-            # iterate over bug data
-            self.__bug_data[i] = load_bug_data(project_bug_path, class_info_mapping, number_of_bugs_mapping, self.binary_class_labels)
             logger.debug('Finished indexing of bug data for project {0} ({1}). Found data for {2} classes.'.format(i, project_bug_path, len(self.__bug_data[i])))
 
             # map bug data 
-            self.test_data[i] = map_bug_data(self.__source_files[i], self.__bug_data[i])
-            logger.debug('Finished mapping project {0}.'.format(i))
+            with self.profiler.stage('match', items=len(self.__bug_data[i])):
+                self.test_data[i], self.match_statistics[i] = map_bug_data(self.__source_files[i], self.__bug_data[i], self.binary_class_labels)
+            logger.info('Finished mapping project {0}. Matched {matched}/{classes} classes ({match_rate:.2%}) - exact: {exact} - inner classes: {inner} - suffix: {suffix} - unmatched: {unmatched} - merged into their source file: {merged}.'.format(i, **self.match_statistics[i]))
 
         # create abstract syntax trees for every file
         self.__create_ast_vectors()
@@ -210,13 +271,31 @@ class DefectDataSetLoader(object):
         self.__num_examples = len(self.test_data_X)
 
         # filter rare tokens and prepare data for use
-        self.__prepare_data()
+        with self.profiler.stage('prepare_data', items=self.__num_examples):
+            self.__prepare_data()
 
         self.num_classes = self.__get_num_classes()
 
         logger.debug('Finished data initialization.')
+        self.profiler.log_report()
 
         
+    @property
+    def vocabulary_size(self):
+        """Number of distinct method and class name tokens."""
+        if self.name_hasher is not None:
+            return len(self.name_hasher)
+        return len(self.token_mapping_names)
+
+    @property
+    def num_token_ids(self):
+        """Upper bound (exclusive) for the token ids inside the feature vectors."""
+        if self.frozen_vocabulary is not None:
+            return self.frozen_vocabulary.num_token_ids
+        if self.name_hasher is not None:
+            return self.name_hasher.first_token_id + self.name_hasher.num_buckets
+        return max(self.current_mapping_index, max(self.token_mapping_names.values()) + 1)
+
     def __get_num_classes(self):
         if self.one_hot:
             return self.test_data_Y.shape[1]
@@ -232,10 +311,27 @@ class DefectDataSetLoader(object):
         file_name = path + name 
         logger.debug('Saving test data to file {0}.'.format(file_name))
 
-        pickle_this = (self.test_data_X, self.test_data_Y, self.token_mapping_names, self.class_vector, self.one_hot, self.test_data_project_indices)
+        num_hash_buckets = self.name_hasher.num_buckets if self.name_hasher is not None else None
+        pickle_this = {
+            'format_version': FEATURE_FILE_VERSION,
+            'X': self.test_data_X,
+            'Y': self.test_data_Y,
+            'token_mapping_names': self.token_mapping_names,
+            'class_vector': self.class_vector,
+            'one_hot': self.one_hot,
+            'project_indices': self.test_data_project_indices,
+            'num_hash_buckets': num_hash_buckets,
+            'tokens': self.test_data_tokens,
+            'normalizer': self.normalizer.get_state(),
+            'class_names': self.test_data_class_names,
+            'loc': self.test_data_loc,
+            'filtered_tokens': sorted(self.filtered_tokens)
+            }
 
-        with open(file_name, 'wb') as f: 
-            pickle.dump(pickle_this, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.profiler.stage('save_features', items=len(self.test_data_Y)):
+            with open(file_name, 'wb') as f: 
+                pickle.dump(pickle_this, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.profiler.add('save_features', num_bytes=osPath.getsize(file_name))
 
     def load_features(self, path, name='feature_vector.pickle'):
         if not path.endswith('/'):
@@ -243,21 +339,181 @@ class DefectDataSetLoader(object):
         file_name = path + name
         logger.debug('Loading test data from file {0}.'.format(file_name))
 
-        with open(file_name, 'rb') as f:
-            unpickle_this = pickle.load(f)
-        self.test_data_X = unpickle_this[0]
-        self.test_data_Y = unpickle_this[1]
-        self.token_mapping_names = unpickle_this[2]
-        self.class_vector = unpickle_this[3]
-        self.one_hot = unpickle_this[4]
-        self.test_data_project_indices = unpickle_this[5]
-                
+        with self.profiler.stage('load_features', num_bytes=osPath.getsize(file_name)):
+            with open(file_name, 'rb') as f:
+                unpickle_this = pickle.load(f)
+        if isinstance(unpickle_this, tuple):
+            features = dict(zip(FEATURE_FILE_TUPLE_FIELDS, unpickle_this), format_version=1)
+        else:
+            features = unpickle_this
+            if features['format_version'] > FEATURE_FILE_VERSION:
+                raise AttributeError('Feature file {0} was written by a newer version ({1}).'.format(file_name, features['format_version']))
+
+        self.profiler.add('load_features', items=len(features['Y']))
+        self.test_data_X = features['X']
+        self.test_data_Y = features['Y']
+        self.token_mapping_names = features['token_mapping_names']
+        self.class_vector = features['class_vector']
+        self.one_hot = features['one_hot']
+        self.test_data_project_indices = features['project_indices']
+
+        # feature vectors saved before feature hashing was introduced have no hash buckets
+        if features.get('num_hash_buckets') is not None:
+            self.name_hasher = HashedVocabulary(features['num_hash_buckets'])
+        else:
+            self.name_hasher = None
+
+        self.test_data_tokens = features.get('tokens', [])
+
+        # older feature vectors were scaled by (max - min) of the whole matrix. The statistics are unknown.
+        self.normalizer = Normalizer.from_state(features['normalizer']) if 'normalizer' in features else Normalizer()
+
+        self.test_data_class_names = features.get('class_names', [])
+        self.test_data_loc = features.get('loc', [])
+        self.filtered_tokens = set(features.get('filtered_tokens', []))
+
+        self.num_classes = self.__get_num_classes()
+
+        logger.debug('Loaded test data. test_X shape: {0} - test_Y shape: {1} - Number of custom tokens: {2}'.format(self.test_data_X.shape, self.test_data_Y.shape, self.vocabulary_size))
+
+
+    def use_store_vocabulary(self, path):
+        """
+        Continues the vocabulary of a feature store. Call before initialize to append new projects
+        to the store (see save_to_store) without re-indexing the projects that are already stored.
+        """
+        vocabulary = FeatureStore(path).load_vocabulary()
+        if vocabulary is None:
+            logger.debug('Feature store {0} does not contain a vocabulary yet.'.format(path))
+            return
+
+        num_hash_buckets = self.name_hasher.num_buckets if self.name_hasher is not None else None
+        if vocabulary['num_hash_buckets'] != num_hash_buckets:
+            raise AttributeError('Feature hashing settings do not match the feature store ({0} - {1} buckets).'.format(vocabulary['num_hash_buckets'], num_hash_buckets))
+        self.token_mapping_names = vocabulary['token_mapping_names']
+        self.current_mapping_index = vocabulary['current_mapping_index']
+        logger.debug('Using vocabulary version {0} of feature store {1} ({2} names).'.format(vocabulary['version'], path, len(self.token_mapping_names)))
+
+    def save_to_store(self, path, project_names=None, codec=CODEC_NONE, compression_level=None):
+        """
+        Appends every project as chunk to the feature store at path. Projects that are already stored are skipped.
+
+        Keyword arguments:
+        path -- dir of the feature store (created if necessary)
+        project_names -- unique name of every project (e.g. ['ant-1.6', 'ant-1.7']). Default: project0, project1, ...
+        codec -- compression codec of the new chunks (see data_io.feature_store.get_codecs)
+        compression_level -- codec specific compression level
+        """
+        if len(self.test_data_class_names) != len(self.test_data_tokens):
+            raise AttributeError('Token sequences and class names are missing. Only initialized data sets can be saved to a feature store.')
+        if project_names is None:
+            project_names = ['project{0}'.format(i) for i in range(len(self.test_data_project_indices))]
+        if len(project_names) != len(self.test_data_project_indices):
+            raise AttributeError('Got {0} project names for {1} projects.'.format(len(project_names), len(self.test_data_project_indices)))
+
+        # store the raw labels (not one hot)
+        y = self.test_data_Y if self.test_data_Y.ndim == 1 else np.asarray(self.class_vector)[np.argmax(self.test_data_Y, axis=1)]
+
+        store = FeatureStore(path, codec, compression_level)
+        num_hash_buckets = self.name_hasher.num_buckets if self.name_hasher is not None else None
+        store.save_vocabulary(self.token_mapping_names, self.current_mapping_index, num_hash_buckets, self.filtered_tokens)
+        with self.profiler.stage('save_to_store', items=len(y)):
+            for project_name, (start, end) in zip(project_names, self.test_data_project_indices):
+                if project_name in store:
+                    logger.info('Project {0} is already in the feature store. Skipping.'.format(project_name))
+                    continue
+                store.append_project(project_name, self.test_data_tokens[start:end + 1], y[start:end + 1], self.test_data_class_names[start:end + 1], Normalizer(self.normalizer.method, self.normalizer.per_feature))
+        return store
+
+    def load_from_store(self, path, projects=None):
+        """
+        Loads the features of some (default: all) projects of a feature store.
+        Features are normalized with the merged statistics of the loaded chunks unless the normalizer is already fitted.
+        """
+        store = FeatureStore(path)
+        vocabulary = store.load_vocabulary()
+        if vocabulary is None:
+            raise AttributeError('Feature store {0} is empty.'.format(path))
+
+        with self.profiler.stage('load_from_store'):
+            X, y, class_names, project_indices = store.read(projects)
+        self.profiler.add('load_from_store', items=len(y), num_bytes=X.nbytes)
+
+        self.token_mapping_names = vocabulary['token_mapping_names']
+        self.current_mapping_index = vocabulary['current_mapping_index']
+        self.name_hasher = HashedVocabulary(vocabulary['num_hash_buckets']) if vocabulary['num_hash_buckets'] is not None else None
+        self.filtered_tokens = set(vocabulary.get('filtered_tokens', []))
+
+        # padding zeros are not part of the token sequences (token ids start at 1)
+        self.test_data_tokens = [row[row != 0].astype(np.int64).tolist() for row in X]
+        self.test_data_class_names = class_names
+        self.test_data_project_indices = project_indices
+
+        if not self.normalizer.is_fitted:
+            self.normalizer = store.get_normalizer(projects)
+        self.test_data_X = self.normalizer.transform(X)
+        self.test_data_Y = y
+        if self.one_hot:
+            self.test_data_Y, self.class_vector = to_one_hot(self.test_data_Y)
         self.num_classes = self.__get_num_classes()
+        logger.debug('Loaded {0} classes of {1} project(s) from feature store {2} (vocabulary version {3}).'.format(len(y), len(project_indices), path, vocabulary['version']))
 
-        logger.debug('Loaded test data. test_X shape: {0} - test_Y shape: {1} - Number of custom tokens: {2}'.format(self.test_data_X.shape, self.test_data_Y.shape, len(self.token_mapping_names)))
+    def freeze_vocabulary(self):
+        """ Returns a read-only copy of the current vocabulary (see data_io.vocabulary.FrozenVocabulary). """
+        num_hash_buckets = self.name_hasher.num_buckets if self.name_hasher is not None else None
+        return FrozenVocabulary(self.token_mapping_names, self.token_mapping, num_hash_buckets, self.current_mapping_index, self.filtered_tokens)
 
+    def initialize_from_sources(self, sources, num_features=None, vocabulary=None):
+        """
+        Extracts the features of single source files (e.g. the changed files of a commit, see data_io.git_source) as one project.
+        The vocabulary is frozen (unknown names are mapped to its OOV id), the rare tokens of the training features are removed
+        and the fitted normalizer is applied as is. Labels are unknown (0).
+
+        Keyword arguments:
+        sources -- list of (path, source code bytes)
+        num_features -- width of the feature vectors (input width of the model). Longer vectors are truncated. Default: longest vector
+        vocabulary -- FrozenVocabulary (e.g. FrozenVocabulary.from_feature_store). Default: freeze the current vocabulary
+        """
+        if not self.normalizer.is_fitted:
+            raise AttributeError('The normalizer has to be fitted (e.g. with the statistics of the training features).')
+        self.frozen_vocabulary = vocabulary if vocabulary is not None else self.freeze_vocabulary()
+
+        self.test_data_tokens = []
+        self.test_data_class_names = []
+        self.test_data_loc = []
+        for path, source_code in sources:
+            try:
+                with self.profiler.stage('parse', items=1, num_bytes=len(source_code)):
+                    tree = javalang.parse.parse(source_code)
+            except:
+                logger.exception('Could not parse sourcefile {0}. (Syntax errors)'.format(path))
+                continue
+
+            with self.profiler.stage('extract', items=1):
+                tokens = self.frozen_vocabulary.extract(tree)
+            class_name = osPath.splitext(osPath.basename(path))[0]
+            self.test_data_tokens.append(tokens)
+            self.test_data_class_names.append(tree.package.name + '.' + class_name if tree.package is not None else class_name)
+            self.test_data_loc.append(source_code.count(b'\n') + 1)
+
+        if num_features is None:
+            num_features = max([len(tokens) for tokens in self.test_data_tokens] + [0])
+        X = np.zeros((len(self.test_data_tokens), num_features), dtype=np.float32)
+        for row, tokens in enumerate(self.test_data_tokens):
+            tokens = tokens[:num_features]
+            X[row, :len(tokens)] = tokens
+        self.test_data_X = self.normalizer.transform(X)
+
+        self.test_data_Y = np.zeros(len(self.test_data_tokens), dtype=np.int32)
+        self.test_data_project_indices = [(0, len(self.test_data_tokens) - 1)]
+        self.num_classes = 2
+        num_oov = sum(tokens.count(self.frozen_vocabulary.oov_token_id) for tokens in self.test_data_tokens) if self.frozen_vocabulary.oov_token_id is not None else 0
+        logger.debug('Extracted features of {0}/{1} source files. {2} unknown names.'.format(len(self.test_data_tokens), len(sources), num_oov))
+        self.profiler.log_report()
 
     def get_test_train_split(self, test_ratio=0.2, random_seed=42, stratify=True):
+        from sklearn.model_selection import train_test_split
+
         logger.debug('Generating train/test split with test_size {0} and random_state {1}'.format(test_ratio, random_seed))
 
         if stratify:
@@ -270,20 +526,72 @@ class DefectDataSetLoader(object):
         logger.debug('\tTest Shape: {0} - {1}'.format(X_test.shape, y_test.shape))
         return X_train, X_test, y_train, y_test
 
-    def get_project_split(self):
+    def get_bag_of_tokens(self, tf_idf=False):
+        """
+        Returns the token counts of every class as a sparse CSR matrix (same row order as test_data_X).
+
+        Keyword arguments:
+        tf_idf -- weight the token counts with tf-idf
+        """
+        if len(self.test_data_tokens) == 0:
+            raise AttributeError('No token sequences available. Initialize the data set (or load features saved with token sequences) first.')
+        return to_bag_of_tokens(self.test_data_tokens, num_tokens=self.num_token_ids, tf_idf=tf_idf)
+
+    def get_code_images(self, encoding, image_size=DEFAULT_IMAGE_SIZE, hash_tokens=False):
+        """
+        Returns the token sequence of every class encoded as compact uint8 / uint16 image (same row order as test_data_X).
+        The images are expanded to float batch wise (see data_io.code_image).
+
+        Keyword arguments:
+        encoding -- see data_io.code_image.CODE_IMAGE_ENCODINGS
+        image_size -- width and height of the images
+        hash_tokens -- hash the token ids into image_size buckets if they do not fit into the co-occurrence matrices
+        """
+        if len(self.test_data_tokens) == 0:
+            raise AttributeError('No token sequences available. Initialize the data set (or load features saved with token sequences) first.')
+        return to_code_images(self.test_data_tokens, self.num_token_ids, encoding, image_size, hash_tokens)
+
+    def get_project_split(self, bag_of_tokens=False, tf_idf=False, code_image=None, image_size=DEFAULT_IMAGE_SIZE, hash_image_tokens=False):
+        """
+        Splits the features into projects.
+
+        Keyword arguments:
+        bag_of_tokens -- return sparse token count vectors instead of the padded token vectors
+        tf_idf -- weight the token counts with tf-idf (only used with bag_of_tokens)
+        code_image -- return code images with this encoding instead of the padded token vectors (see get_code_images)
+        image_size -- width and height of the code images
+        hash_image_tokens -- hash the token ids of the co-occurrence images into buckets (see get_code_images)
+        """
         logger.debug('Splitting data set vector into projects.')
         X = []
         y = []
 
+        if code_image is not None:
+            features = self.get_code_images(code_image, image_size, hash_image_tokens)
+        else:
+            features = self.get_bag_of_tokens(tf_idf) if bag_of_tokens else self.test_data_X
         for project_index in range(len(self.test_data_project_indices)):
             start = self.test_data_project_indices[project_index][0]
             end = self.test_data_project_indices[project_index][1]
-            X.append(self.test_data_X[start:end])
-            y.append(self.test_data_Y[start:end])
+            # end index is inclusive
+            X.append(features[start:end + 1])
+            y.append(self.test_data_Y[start:end + 1])
             logger.debug('\tProject {0} Shape: X: {1} - y: {2}'.format(project_index, X[project_index].shape, y[project_index].shape))
 
         return X, y
 
+    def get_project_class_names(self, project_index):
+        """ Class names of a project (same order as the rows of get_project_split). """
+        start, end = self.test_data_project_indices[project_index]
+        return self.test_data_class_names[start:end + 1]
+
+    def get_project_loc(self, project_index):
+        """ Lines of code of every class of a project or None if they are unknown (features loaded from a feature store or an older feature file). """
+        if len(self.test_data_loc) != len(self.test_data_class_names) or len(self.test_data_loc) == 0:
+            return None
+        start, end = self.test_data_project_indices[project_index]
+        return np.asarray(self.test_data_loc[start:end + 1], dtype=np.int64)
+
                      
     def __create_ast_vectors(self):
         """
@@ -293,6 +601,9 @@ class DefectDataSetLoader(object):
         # get the total number of classes for all projects
         number_of_classes = sum([len(self.test_data[i]) for i in range(self.num_projects)])
         current_data_set_index = 0
+
+        # distinct names seen during extraction. Only needed for the collision statistics of the feature hashing.
+        hashed_names = set()
         for project_index in range(self.num_projects):
             project_test_data = self.test_data[project_index]
 
@@ -306,26 +617,32 @@ class DefectDataSetLoader(object):
             for (class_info, path_to_class_file, number_of_bugs) in project_test_data:
                 # open file and read it
                 source_code = ''
-                with open(path_to_class_file, 'rb') as f:
-                    source_code = f.read()
+                with self.profiler.stage('read', items=1) as read_stage:
+                    with open(path_to_class_file, 'rb') as f:
+                        source_code = f.read()
+                    read_stage['bytes'] += len(source_code)
 
                 try:
-                    tree = javalang.parse.parse(source_code)
+                    with self.profiler.stage('parse', items=1, num_bytes=len(source_code)):
+                        tree = javalang.parse.parse(source_code)
                 except:
                     logger.exception('Could not parse sourcefile {0} (Path: {1}) (Project {2}). (Syntax errors)'.format(class_info, path_to_class_file, project_index))
                     continue           
 
                 # try to generate feature vector
-                tree_feature_vector = self.__convert_tree_to_feature_vector_unstructured(tree)
+                with self.profiler.stage('extract', items=1):
+                    tree_feature_vector = self.__convert_tree_to_feature_vector_unstructured(tree, hashed_names if self.name_hasher is not None else None)
                 self.test_data_X.append(tree_feature_vector)
                 self.test_data_Y.append(number_of_bugs)
+                self.test_data_class_names.append(class_info)
+                self.test_data_loc.append(source_code.count(b'\n') + 1)
 
                 # replace existing test_data entry tuples with additional info
                 self.test_data[project_index][project_test_data_index] = (class_info, path_to_class_file, number_of_bugs, tree, tree_feature_vector)           
 
                 project_test_data_index += 1
                 current_data_set_index += 1
-                utils.show_progress(True, current_data_set_index, number_of_classes, 'AST creation for {0} classes.\tToken mappings: {1}:', number_of_classes, len(self.token_mapping_names))
+                utils.show_progress(True, current_data_set_index, number_of_classes, 'AST creation for {0} classes.\tToken mappings: {1}:', number_of_classes, self.vocabulary_size)
             print('\n')
             logger.debug('AST creation for project {0} done. Progress: {1:.2f}%'.format(project_index, ((current_data_set_index / number_of_classes) * 100)))
 
@@ -335,36 +652,41 @@ class DefectDataSetLoader(object):
             print('')
         print('\n**')
 
+        if self.name_hasher is not None:
+            self.hash_collision_statistics = self.name_hasher.collision_statistics(hashed_names)
+            logger.info('Feature hashing: {num_names} names in {used_buckets}/{num_buckets} buckets. {colliding_names} names share a bucket ({collision_rate:.2%}).'.format(**self.hash_collision_statistics))
+
+
+    def __convert_tree_to_feature_vector_unstructured(self, tree, hashed_names=None):
+        """
+        Converts an AST into a flat list of token ids.
 
-    def __convert_tree_to_feature_vector_unstructured(self, tree):
+        Keyword arguments:
+        tree -- javalang compilation unit
+        hashed_names -- optional set. If feature hashing is used every name is added to it (for collision statistics).
+        """
         feature_vector = []
 
         # iterate over tree vector
-        for _, node in tree:
+        for is_name, token in iterate_tree_tokens(tree):
             # if node is either a method invocation or a class instance creation, check if name already exists in token mapping
-            if str(node) == 'MethodInvocation' or str(node) == 'ClassCreator':
-                name = ''
-                if str(node) == 'MethodInvocation':
-                    name = node.member
-                else:
-                    # search for 'ReferenceType' in class creators children
-                    for childNode in node.children:
-                        if str(childNode) == 'ReferenceType':
-                            name = childNode.name
-                            break
-
-                if name in self.token_mapping_names:
-                    feature_vector.append(self.token_mapping_names[name])
+            if is_name:
+                if self.name_hasher is not None:
+                    feature_vector.append(self.name_hasher.token_id(token))
+                    if hashed_names is not None:
+                        hashed_names.add(token)
+                elif token in self.token_mapping_names:
+                    feature_vector.append(self.token_mapping_names[token])
                 else:
                     # add new method invocation mapping
-                    self.token_mapping_names[name] = self.current_mapping_index
+                    self.token_mapping_names[token] = self.current_mapping_index
                     feature_vector.append(self.current_mapping_index)
                     self.current_mapping_index += 1 
                 continue
 
             # if it is not either type search for standard mappings
-            if str(node) in self.token_mapping:
-                feature_vector.append(self.token_mapping[str(node)])
+            if token in self.token_mapping:
+                feature_vector.append(self.token_mapping[token])
         return feature_vector
 
 
@@ -373,7 +695,7 @@ class DefectDataSetLoader(object):
         1. Convert to numpy array
         2. Filter every token if occurence is less than 3
         3. TODO: Apply CLNI (if needed)
-        4. Normalize X and y
+        4. Normalize X and y (see self.normalizer)
         """
         
         logger.debug('Prepare test data for classification.')
@@ -385,12 +707,12 @@ class DefectDataSetLoader(object):
         flattened_feature_vector = [item for sublist in self.test_data_X for item in sublist]
         tokens, token_counter = np.unique(flattened_feature_vector, return_counts=True)
         token_dict = dict(zip(tokens, token_counter))
-        filter = []
+        filter = set()
         # iterate over the test data and filter out. 
         # Note: this could also be done in a list comprehension but this is much easier to read.
         for i in range(len(tokens)):
             if not i in token_dict or token_dict[i] < rare_token_number:
-                filter.append(i)
+                filter.add(i)
 
         logger.debug('Tokens before filtering: {0}'.format(len(tokens)))
         logger.debug('Filtered tokens: {0} -> Number of tokens after filtering: {1}'.format(len(filter), len(tokens) - len(filter)))
@@ -403,20 +725,22 @@ class DefectDataSetLoader(object):
             max_feature_length = max(max_feature_length, len(filtered_vector))
             filtered_test_data_X.append(filtered_vector)
 
+        self.test_data_tokens = filtered_test_data_X
+        self.filtered_tokens = set(int(token) for token in filter)
         logger.debug('Max feature vector length: {0}'.format(max_feature_length))
         logger.debug('Size of test_data_X before data prep: {0}'.format(self.test_data_X.nbytes))
 
-        # append zeros so that each feature has the same length (max_feature_length)
-        filtered_padded_test_data_X = []
-        for feature_vector in filtered_test_data_X:
-            padding = max_feature_length - len(feature_vector)
-            filtered_padded_test_data_X.append(feature_vector + [0] * padding)
-
-        self.test_data_X = np.array(filtered_padded_test_data_X, dtype=np.float32)
-
-
-        # min-max normalization to range [0, 1]
-        self.test_data_X /= (np.max(self.test_data_X) - np.min(self.test_data_X))
+        # append zeros so that each feature has the same length (max_feature_length).
+        # The padded matrix is allocated once and filled row by row.
+        self.test_data_X = np.zeros((len(filtered_test_data_X), max_feature_length), dtype=np.float32)
+        for row, feature_vector in enumerate(filtered_test_data_X):
+            self.test_data_X[row, :len(feature_vector)] = feature_vector
+
+        # normalization (default: min-max to range [0, 1]). Statistics and scaling are computed chunk wise in place.
+        if not self.normalizer.is_fitted:
+            self.normalizer.fit(self.test_data_X)
+        self.normalizer.transform(self.test_data_X)
+        logger.debug('Normalization: {0}'.format(self.normalizer))
         logger.debug('Size of test_data_X after data prep: {0}'.format(self.test_data_X.nbytes))
 
         if self.one_hot:
@@ -424,7 +748,15 @@ class DefectDataSetLoader(object):
             logger.debug('Converted Y data to one hot matrix. Classes: {0}'.format(self.class_vector))
 
 
-from sklearn.utils import shuffle
+from scipy.sparse import issparse
+
+# sampling modes of DataSet.next_batch. Every mode only changes the stream of indices, the features are never copied.
+SAMPLING_NONE = 'none'                  # every example once per epoch
+SAMPLING_OVERSAMPLE = 'oversample'      # examples of the smaller classes are repeated until every class has as many examples as the largest class
+SAMPLING_UNDERSAMPLE = 'undersample'    # every epoch uses a new random subset of every class with the size of the smallest class
+SAMPLING_BALANCED = 'balanced'          # every batch contains (nearly) the same number of examples of every class
+SAMPLING_WEIGHTED = 'weighted'          # examples are drawn with replacement. Probability proportional to the weight of their class
+SAMPLING_MODES = [SAMPLING_NONE, SAMPLING_OVERSAMPLE, SAMPLING_UNDERSAMPLE, SAMPLING_BALANCED, SAMPLING_WEIGHTED]
 
 class DataSet(object):
 
@@ -432,10 +764,26 @@ class DataSet(object):
                  features,
                  targets,
                  name,
-                 one_hot):
+                 one_hot,
+                 seed=None,
+                 sampling=SAMPLING_NONE,
+                 class_weights=None):
+        """
+        Keyword arguments:
+        features -- feature matrix (numpy array or scipy.sparse matrix)
+        targets -- labels (converted to one hot targets if one_hot is set)
+        name -- name used for logging
+        one_hot -- convert the labels to one hot targets
+        seed -- seed of the shuffling and sampling
+        sampling -- class imbalance sampling mode of next_batch (see SAMPLING_MODES)
+        class_weights -- weight of every class for SAMPLING_WEIGHTED. Default: inverse class frequency
+        """
+        if sampling not in SAMPLING_MODES:
+            raise AttributeError('Unknown sampling mode {0}. Available modes: {1}'.format(sampling, SAMPLING_MODES))
 
         self.__X = features
         self.__y = targets
+        self.name = name
 
         self.__epochs_completed = 0
         self.__index_in_epoch = 0
@@ -443,9 +791,32 @@ class DataSet(object):
         # will be set in initialize 
         self.__num_examples = targets.shape[0]
 
+        # the examples are never reordered. Batches are taken from a permutation of the indices that is reshuffled every epoch.
+        # Permutation, position and random state can be saved and restored (see get_state) to resume training.
+        self.__permutation = np.arange(self.__num_examples)
+        self.__random_state = np.random.RandomState(seed)
+
         if one_hot:
             self.__y = to_one_hot(self.__y)[0]
-        
+
+        # example indices of every class for the sampling modes
+        self.sampling = sampling
+        labels = self.labels
+        self.__class_indices = [np.flatnonzero(labels == label) for label in range(labels.max() + 1 if len(labels) > 0 else 0)]
+        self.__class_indices = [indices for indices in self.__class_indices if len(indices) > 0]
+        self.__class_weights = None
+        if sampling == SAMPLING_WEIGHTED:
+            class_sizes = np.bincount(labels)
+            if class_weights is None:
+                class_weights = np.where(class_sizes > 0, 1.0 / np.maximum(class_sizes, 1), 0.0)
+            class_weights = np.asarray(class_weights, dtype=np.float64)
+            if len(class_weights) < len(class_sizes):
+                raise AttributeError('Got {0} class weights for {1} classes.'.format(len(class_weights), len(class_sizes)))
+            example_weights = class_weights[labels]
+            self.__class_weights = example_weights / example_weights.sum()
+        if sampling != SAMPLING_NONE:
+            self.__permutation = self.__sample_epoch()
+
 
     @property
     def features(self):
@@ -455,6 +826,11 @@ class DataSet(object):
     def feature_shape(self):
         return self.__X.shape
 
+    @property
+    def is_sparse(self):
+        """True if the features are stored as a scipy.sparse matrix. Batches are sparse as well."""
+        return issparse(self.__X)
+
     @property
     def targets(self):
         return self.__y
@@ -463,9 +839,19 @@ class DataSet(object):
     def num_examples(self):
         return self.__num_examples
 
+    @property
+    def labels(self):
+        """Class label of every example (also for one hot targets)."""
+        return np.argmax(self.__y, axis=1) if self.__y.ndim == 2 else self.__y
+
     @property
     def num_classes(self):
-        return np.max(self.__y) + 1
+        return np.max(self.labels) + 1
+
+    @property
+    def epoch_size(self):
+        """Number of examples next_batch returns per epoch (differs from num_examples for over- and undersampling)."""
+        return len(self.__permutation)
 
     @property
     def epochs_completed(self):
@@ -473,7 +859,7 @@ class DataSet(object):
 
     @property
     def most_frequent_class(self):
-        counts = np.bincount(self.__y)
+        counts = np.bincount(self.labels)
         return np.argmax(counts), np.max(counts)
 
     @property
@@ -504,16 +890,104 @@ class DataSet(object):
         self.__index_in_epoch += batch_size
 
         # Current epoch is finished (used all examples)
-        if self.__index_in_epoch > self.__num_examples:
+        if self.__index_in_epoch > len(self.__permutation):
             self.__epochs_completed += 1
 
-            # reshuffle data for next epoch
+            # reshuffle (and resample) data for next epoch
             if shuffle_data:
-                self.__X, self.__y = shuffle(self.__X, self.__y)
+                self.__permutation = self.__sample_epoch()
             start = 0
             self.__index_in_epoch = batch_size
 
             # make sure batch size is smaller than the actual number of examples
-            assert batch_size <= self.__num_examples
+            assert batch_size <= len(self.__permutation)
         end = self.__index_in_epoch
-        return self.__X[start:end], self.__y[start:end]
+        indices = self.__permutation[start:end]
+        return self.__X[indices], self.__y[indices]
+
+    def split(self, ratio=0.1, seed=42, stratify=True):
+        """
+        Splits off a held-out part (e.g. a validation set for early stopping).
+
+        Keyword arguments:
+        ratio -- share of the examples in the held-out data set
+        seed -- seed of the split
+        stratify -- keep the class distribution in both parts
+
+        Returns:
+        (remaining DataSet with the sampling mode of this data set, held-out DataSet)
+        """
+        if not 0 < ratio < 1:
+            raise AttributeError('ratio has to be in (0, 1). Got {0}.'.format(ratio))
+        random_state = np.random.RandomState(seed)
+        groups = self.__class_indices if stratify else [np.arange(self.__num_examples)]
+        held_out = np.sort(np.concatenate([random_state.choice(indices, int(round(len(indices) * ratio)), replace=False) for indices in groups]))
+        remaining = np.setdiff1d(np.arange(self.__num_examples), held_out, assume_unique=True)
+        if len(held_out) == 0 or len(remaining) == 0:
+            raise AttributeError('Split of {0} examples with ratio {1} leaves an empty data set.'.format(self.__num_examples, ratio))
+
+        # targets are already converted (one hot)
+        return (DataSet(self.__X[remaining], self.__y[remaining], self.name, one_hot=False, seed=seed, sampling=self.sampling),
+                DataSet(self.__X[held_out], self.__y[held_out], 'Validation', one_hot=False))
+
+    def __sample_epoch(self):
+        """ Index stream of the next epoch. """
+        random_state = self.__random_state
+        if self.sampling == SAMPLING_NONE:
+            return random_state.permutation(self.__num_examples)
+
+        if self.sampling == SAMPLING_WEIGHTED:
+            return random_state.choice(self.__num_examples, size=self.__num_examples, replace=True, p=self.__class_weights)
+
+        class_sizes = [len(indices) for indices in self.__class_indices]
+        if self.sampling == SAMPLING_OVERSAMPLE:
+            # all examples once + random repetitions of the smaller classes
+            largest_class = max(class_sizes)
+            stream = np.concatenate([indices if len(indices) == largest_class else np.concatenate((indices, random_state.choice(indices, largest_class - len(indices), replace=True))) for indices in self.__class_indices])
+            return random_state.permutation(stream)
+
+        if self.sampling == SAMPLING_UNDERSAMPLE:
+            smallest_class = min(class_sizes)
+            stream = np.concatenate([random_state.choice(indices, smallest_class, replace=False) for indices in self.__class_indices])
+            return random_state.permutation(stream)
+
+        # balanced: the classes take turns (in a random order every round). Every window of the stream is balanced.
+        # Each class contributes num_examples / num_classes indices from its shuffled examples (repeated if the class is smaller).
+        num_classes = len(self.__class_indices)
+        num_rounds = int(np.ceil(self.__num_examples / num_classes))
+        per_class = np.empty((num_rounds, num_classes), dtype=np.int64)
+        for column, indices in enumerate(self.__class_indices):
+            repetitions = int(np.ceil(num_rounds / len(indices)))
+            per_class[:, column] = np.concatenate([random_state.permutation(indices) for _ in range(repetitions)])[:num_rounds]
+        # shuffle the class order inside every round
+        class_order = np.argsort(random_state.rand(num_rounds, num_classes), axis=1)
+        return per_class[np.arange(num_rounds)[:, np.newaxis], class_order].ravel()[:self.__num_examples]
+
+    def iterate_batches(self, batch_size):
+        """ Yields all examples in fixed size batches (stored order, the last batch contains the remainder). Does not change the epoch position. """
+        for start in range(0, self.__num_examples, batch_size):
+            end = min(start + batch_size, self.__num_examples)
+            yield self.__X[start:end], self.__y[start:end]
+
+    def get_state(self):
+        """ Position inside the current epoch, permutation and random state (picklable). """
+        return {
+            'name': self.name,
+            'num_examples': self.__num_examples,
+            'sampling': self.sampling,
+            'epochs_completed': self.__epochs_completed,
+            'index_in_epoch': self.__index_in_epoch,
+            'permutation': self.__permutation.copy(),
+            'random_state': self.__random_state.get_state()
+            }
+
+    def set_state(self, state):
+        """ Restores a state of get_state. The data set has to contain the same examples. """
+        if state['num_examples'] != self.__num_examples:
+            raise AttributeError('Data set state of {0} contains {1} examples. Data set {2} contains {3} examples.'.format(state['name'], state['num_examples'], self.name, self.__num_examples))
+        if state.get('sampling', SAMPLING_NONE) != self.sampling:
+            raise AttributeError('Data set state of {0} uses sampling {1}. Data set {2} uses {3}.'.format(state['name'], state.get('sampling', SAMPLING_NONE), self.name, self.sampling))
+        self.__epochs_completed = state['epochs_completed']
+        self.__index_in_epoch = state['index_in_epoch']
+        self.__permutation = np.asarray(state['permutation'])
+        self.__random_state.set_state(state['random_state'])
@@ -0,0 +1,174 @@
+import zlib
+import logging
+
+
+logger = logging.getLogger('io')
+
+# token ids of the AST node types that are part of the features (0 is the padding id)
+STRUCTURAL_TOKEN_MAPPING = {
+    'MethodDeclaration': 1,
+    'ClassDeclaration': 2,
+    'FieldDeclaration': 3,
+    'EnumDeclaration': 4,
+    'WhileStatement': 5,
+    'ForStatement': 6,
+    'IfStatement': 7,
+    'ThrowStatement': 8,
+    'TryStatement': 9,
+    'CatchClause': 10,
+    'ReturnStatement': 11
+    }
+
+# first token id that is used for method invocation and class creator names.
+# ids below are reserved for the structural tokens (see STRUCTURAL_TOKEN_MAPPING)
+NAME_TOKEN_OFFSET = 12
+
+DEFAULT_NUM_HASH_BUCKETS = 2 ** 14
+
+
+def iterate_tree_tokens(tree):
+    """
+    Iterates over a javalang AST and yields its tokens in traversal order.
+    Method invocations and class instance creations yield their name, every other node yields its node type.
+
+    Keyword arguments:
+    tree -- javalang compilation unit
+
+    Yields:
+    (is_name, token) -- is_name is True if token is a method or class name
+    """
+    for _, node in tree:
+        # node type name (str(node) only returns the type name for older javalang versions)
+        node_type = type(node).__name__
+        if node_type == 'MethodInvocation':
+            yield True, node.member
+        elif node_type == 'ClassCreator':
+            # search for 'ReferenceType' in class creators children
+            name = ''
+            for child_node in node.children:
+                if type(child_node).__name__ == 'ReferenceType':
+                    name = child_node.name
+                    break
+            yield True, name
+        else:
+            yield False, node_type
+
+
+class HashedVocabulary(object):
+    """
+    Maps method and class names into a fixed number of buckets (hashing trick).
+    The mapping does not depend on previously seen names so it can be shared between projects and processes.
+    """
+
+    def __init__(self, num_buckets=DEFAULT_NUM_HASH_BUCKETS, first_token_id=NAME_TOKEN_OFFSET):
+        if num_buckets < 1:
+            raise AttributeError('num_buckets has to be a positive number. Got {0}.'.format(num_buckets))
+        self.num_buckets = num_buckets
+        self.first_token_id = first_token_id
+
+    def __getitem__(self, name):
+        return self.token_id(name)
+
+    def __len__(self):
+        return self.num_buckets
+
+    def token_id(self, name):
+        # crc32 is stable across interpreter runs (unlike hash() with hash randomization)
+        return self.first_token_id + zlib.crc32(name.encode('utf-8')) % self.num_buckets
+
+    def collision_statistics(self, names):
+        """
+        Computes how many distinct names share a bucket.
+
+        Keyword arguments:
+        names -- iterable of distinct names that were hashed
+
+        Returns:
+        dict with the number of names, used buckets, colliding buckets and the share of names that collide.
+        """
+        bucket_sizes = {}
+        for name in names:
+            bucket = self.token_id(name)
+            bucket_sizes[bucket] = bucket_sizes.get(bucket, 0) + 1
+
+        num_names = sum(bucket_sizes.values())
+        colliding_buckets = [size for size in bucket_sizes.values() if size > 1]
+        num_colliding_names = sum(colliding_buckets)
+        return {
+            'num_names': num_names,
+            'num_buckets': self.num_buckets,
+            'used_buckets': len(bucket_sizes),
+            'colliding_buckets': len(colliding_buckets),
+            'colliding_names': num_colliding_names,
+            'collision_rate': num_colliding_names / num_names if num_names > 0 else 0.0
+            }
+
+
+class FrozenVocabulary(object):
+    """
+    Read-only vocabulary for feature extraction at inference time.
+
+    Names that are not in the vocabulary are mapped to a single out-of-vocabulary id (oov_token_id, the first unused id).
+    The mappings are never modified after construction, so one instance can be used by many threads at once
+    and can be pickled to worker processes. With feature hashing every name has a bucket and there is no OOV id.
+    Token ids that were filtered from the training features (rare tokens) are dropped.
+    """
+
+    def __init__(self, token_mapping_names, token_mapping=STRUCTURAL_TOKEN_MAPPING, num_hash_buckets=None, current_mapping_index=None, filtered_tokens=()):
+        """
+        Keyword arguments:
+        token_mapping_names -- dict: name -> token id (see DefectDataSetLoader.token_mapping_names)
+        token_mapping -- dict: AST node type -> token id
+        num_hash_buckets -- number of buckets if the names were hashed (token_mapping_names is ignored)
+        current_mapping_index -- next free name id of the vocabulary. Default: highest name id + 1
+        filtered_tokens -- token ids that were removed from the training features (see DefectDataSetLoader.filtered_tokens)
+        """
+        self.__token_mapping = dict(token_mapping)
+        self.__name_hasher = HashedVocabulary(num_hash_buckets) if num_hash_buckets is not None else None
+        self.__token_mapping_names = dict(token_mapping_names) if self.__name_hasher is None else {}
+        self.__filtered_tokens = frozenset(filtered_tokens)
+
+        # the OOV id must not collide with a known id (older feature files do not store current_mapping_index)
+        next_free_id = max([NAME_TOKEN_OFFSET] + [token_id + 1 for token_id in self.__token_mapping_names.values()] + [token_id + 1 for token_id in self.__token_mapping.values()])
+        self.oov_token_id = None if self.__name_hasher is not None else max(next_free_id, current_mapping_index or 0)
+
+    @classmethod
+    def from_feature_store(cls, path):
+        """ Loads the vocabulary of a feature store (see data_io.feature_store.FeatureStore.save_vocabulary). """
+        from data_io.feature_store import FeatureStore
+        vocabulary = FeatureStore(path).load_vocabulary()
+        if vocabulary is None:
+            raise AttributeError('Feature store {0} does not contain a vocabulary.'.format(path))
+        logger.debug('Loaded frozen vocabulary version {0} of feature store {1} ({2} names).'.format(vocabulary['version'], path, len(vocabulary['token_mapping_names'])))
+        return cls(vocabulary['token_mapping_names'], num_hash_buckets=vocabulary['num_hash_buckets'], current_mapping_index=vocabulary['current_mapping_index'], filtered_tokens=vocabulary.get('filtered_tokens', []))
+
+    def __len__(self):
+        return len(self.__name_hasher) if self.__name_hasher is not None else len(self.__token_mapping_names)
+
+    def __contains__(self, name):
+        return self.__name_hasher is not None or name in self.__token_mapping_names
+
+    @property
+    def num_token_ids(self):
+        """ Upper bound (exclusive) for the token ids returned by extract (including the OOV id). """
+        if self.__name_hasher is not None:
+            return self.__name_hasher.first_token_id + self.__name_hasher.num_buckets
+        return self.oov_token_id + 1
+
+    def name_id(self, name):
+        if self.__name_hasher is not None:
+            return self.__name_hasher.token_id(name)
+        return self.__token_mapping_names.get(name, self.oov_token_id)
+
+    def extract(self, tree):
+        """ Converts an AST into a flat list of token ids (same tokens as the training features). """
+        token_mapping = self.__token_mapping
+        feature_vector = []
+        for is_name, token in iterate_tree_tokens(tree):
+            if is_name:
+                feature_vector.append(self.name_id(token))
+            elif token in token_mapping:
+                feature_vector.append(token_mapping[token])
+        if self.__filtered_tokens:
+            feature_vector = [token_id for token_id in feature_vector if token_id not in self.__filtered_tokens]
+        return feature_vector
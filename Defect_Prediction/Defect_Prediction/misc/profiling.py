@@ -0,0 +1,125 @@
+import sys
+import time
+import json
+import logging
+import cProfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+
+logger = logging.getLogger('io')
+
+
+def get_peak_rss():
+    """ Peak resident set size of the current process in bytes. None if the platform does not support it. """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # linux reports kilobytes, macOS bytes
+    if sys.platform == 'darwin':
+        return peak_rss
+    return peak_rss * 1024
+
+
+class StageProfiler(object):
+    """
+    Records wall time, cpu time, processed items, bytes read and the peak RSS for named stages.
+    A stage can be entered multiple times (e.g. once per file). The values are accumulated.
+
+    Usage:
+        with profiler.stage('parse', items=1, num_bytes=len(source_code)):
+            ...
+    """
+
+    def __init__(self, profile_stages=()):
+        """
+        Keyword arguments:
+        profile_stages -- names of the stages that are additionally profiled with cProfile
+        """
+        self.stages = OrderedDict()
+        self.profile_stages = set(profile_stages)
+        self.__profiles = {}
+
+    def __get_record(self, name):
+        if name not in self.stages:
+            self.stages[name] = {
+                'calls': 0,
+                'wall_time': 0.0,
+                'cpu_time': 0.0,
+                'items': 0,
+                'bytes': 0,
+                'peak_rss': None
+                }
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name, items=0, num_bytes=0):
+        record = self.__get_record(name)
+        profile = None
+        if name in self.profile_stages:
+            profile = self.__profiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_time'] += time.perf_counter() - start_wall_time
+            record['cpu_time'] += time.process_time() - start_cpu_time
+            if profile is not None:
+                profile.disable()
+            record['calls'] += 1
+            record['items'] += items
+            record['bytes'] += num_bytes
+            record['peak_rss'] = get_peak_rss()
+
+    def add(self, name, items=0, num_bytes=0):
+        """ Adds items / bytes to a stage (e.g. if the number is only known after the stage finished). """
+        record = self.__get_record(name)
+        record['items'] += items
+        record['bytes'] += num_bytes
+
+    def reset(self):
+        self.stages = OrderedDict()
+        self.__profiles = {}
+
+    def report(self):
+        """ Returns the recorded values of all stages including throughput (items and bytes per second). """
+        stages = OrderedDict()
+        for name, record in self.stages.items():
+            stage_report = dict(record)
+            wall_time = record['wall_time']
+            stage_report['items_per_second'] = record['items'] / wall_time if wall_time > 0 else None
+            stage_report['bytes_per_second'] = record['bytes'] / wall_time if wall_time > 0 else None
+            stages[name] = stage_report
+
+        return OrderedDict([
+            ('created', time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ('peak_rss', get_peak_rss()),
+            ('stages', stages)
+            ])
+
+    def log_report(self):
+        for name, record in self.report()['stages'].items():
+            logger.info('\t{0:<16} wall: {1:8.3f}s  cpu: {2:8.3f}s  items: {3:>8}  bytes: {4:>12}'.format(name, record['wall_time'], record['cpu_time'], record['items'], record['bytes']))
+
+    def save_report(self, file_name):
+        """ Writes the report as json file. """
+        with open(file_name, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        logger.debug('Saved profiling report to {0}.'.format(file_name))
+
+    def dump_profile(self, name, file_name):
+        """ Writes the cProfile stats of a stage (can be read with pstats or snakeviz). """
+        if name not in self.__profiles:
+            raise AttributeError('Stage {0} was not profiled. Profiled stages: {1}'.format(name, list(self.__profiles.keys())))
+        self.__profiles[name].dump_stats(file_name)
+        logger.debug('Saved cProfile stats of stage {0} to {1}.'.format(name, file_name))
@@ -1,19 +1,28 @@
-﻿import matplotlib
-# Force matplotlib to not use any Xwindows backend.
-matplotlib.use('Agg')
-import getpass
+﻿import getpass
 import os
 import errno
 import numpy as np
 import math
-from matplotlib import pyplot as plt
 from math import ceil, sqrt
 import datetime
 import sys
 import random
 import uuid
 import logging
-import cv2 as cv
+
+
+def get_cv():
+    """ Imports OpenCV on first use. The import is slow and only the image functions need it. """
+    import cv2
+    return cv2
+
+def get_pyplot():
+    """ Imports matplotlib (without X backend) on first use. """
+    import matplotlib
+    # Force matplotlib to not use any Xwindows backend.
+    matplotlib.use('Agg')
+    from matplotlib import pyplot
+    return pyplot
 
 
 def create_dir_if_necessary(path):
@@ -99,6 +108,7 @@ def dilate_image(img, kernelSize=(4,4), iterations=2):
     kernelSize -- Size of the kernel to dilate the image. -- Default: (4,4)
     iterations -- Dilation iterations. -- Default: 2
     """
+    cv = get_cv()
 
     kernel = np.ones(kernelSize, np.uint8)
     return cv.dilate(img,kernel, iterations=iterations) 
@@ -110,6 +120,7 @@ def opening_image(img, kernelSize=(4,4)):
     Keyword arguments:
     kernelSize -- Size of the kernel to open the image. -- Default: (4,4)
     """
+    cv = get_cv()
 
     kernel = np.ones(kernelSize, np.uint8)
     return cv.morphologyEx(img, cv.MORPH_OPEN, kernel)
@@ -152,17 +163,11 @@ def crop_image_to_shape(image, x, y, shape):
     return crop_image(image, x, y, shape[0], shape[1])
 
 def reduce_color(image):
-    """ Reduces colors of an image."""
+    """ Reduces colors of an 8-bit image (in place) to 0, 64, 128, 192 and 255 per channel."""
 
     # http://stackoverflow.com/questions/5906693/how-to-reduce-the-number-of-colors-in-an-image-with-opencv-in-python
-    w, h, _ = image.shape
-    for row in xrange(h-1):
-        for col in xrange(w-1):
-            #pi = row * w * 3 + col * 3
-            pixel = image[col][row]
-            pixel[0] = __reduceColorValue(pixel[0])
-            pixel[1] = __reduceColorValue(pixel[1])
-            pixel[2] = __reduceColorValue(pixel[2])
+    # a lookup table maps all pixels at once
+    image[...] = REDUCE_COLOR_TABLE[image]
     return image
 
 def __reduceColorValue(value):
@@ -176,6 +181,8 @@ def __reduceColorValue(value):
        return int(value / 64.0  + 0.5) * 64
     return 255
 
+REDUCE_COLOR_TABLE = np.array([__reduceColorValue(value) for value in range(256)], dtype=np.uint8)
+
 def get_data_path():
     """ Returns the path to the current data directory."""
     return os.getcwd() + "/data/"
@@ -202,20 +209,44 @@ def get_modified_median_cut_palette(image, colorCount=10, quality=1):
     quality -- quality of sampling. -- Default: 1
     """
 
-    w, h, _ = image.shape
-    colors = []
-    for row in xrange(0, h):
-        for col in xrange(0, w, quality):
-            pixel = image[col][row]
-            b = pixel[0]
-            g = pixel[1]
-            r = pixel[2]
-            if r < 250 and g < 250 and b < 250:
-                colors.append((r, g, b)) 
+    # BGR pixels (every quality-th row) -> RGB colors without the (almost) white pixels
+    pixels = image[::quality].reshape((-1, 3))
+    colors = pixels[np.all(pixels < 250, axis=1)][:, ::-1]
     if len(colors) == 0:
         return [(255,255,255)]
-    c_map = mmcq.mmcq(colors, colorCount) 
-    return c_map.palette
+    return median_cut(colors, colorCount)
+
+def median_cut(colors, colorCount=10):
+    """
+    Quantizes colors with the modified median cut: the box with the most colors is split at the median of its widest channel
+    until there are colorCount boxes.
+
+    Keyword arguments:
+    colors -- array of colors [num_colors, 3]
+    colorCount -- Number of colors of the palette. -- Default: 10
+
+    Returns:
+    palette as list of color tuples (average color of each box), most frequent color first
+    """
+    colors = np.asarray(colors)
+    boxes = [colors]
+    while len(boxes) < colorCount:
+        # split the most populated box that still contains different colors
+        candidates = [i for i in np.argsort([-len(box) for box in boxes], kind='stable') if np.any(boxes[i].min(axis=0) != boxes[i].max(axis=0))]
+        if len(candidates) == 0:
+            break
+        box = boxes.pop(candidates[0])
+        channel = np.argmax(box.max(axis=0).astype(np.int32) - box.min(axis=0))
+        box = box[np.argsort(box[:, channel], kind='stable')]
+        # equal colors stay in the same box: cut before the median value (after it if the median is the smallest value)
+        values = box[:, channel]
+        cut = np.searchsorted(values, values[len(box) // 2], side='left')
+        if cut == 0:
+            cut = np.searchsorted(values, values[len(box) // 2], side='right')
+        boxes += [box[:cut], box[cut:]]
+
+    boxes.sort(key=len, reverse=True)
+    return [tuple(int(value) for value in np.round(box.mean(axis=0))) for box in boxes]
 
 def get_modified_median_cut_dominant_color(image, color_count=4, quality=1, palette=None):
     """ 
@@ -241,6 +272,7 @@ def get_improved_median_cut(img):
     
 def show_image(image, windowTitle="image"):
     """ Shows an image using openCV and waits for the ESC key to be pressed."""
+    cv = get_cv()
 
     cv.imshow(windowTitle, image)
     cv.waitKey(0)
@@ -255,20 +287,24 @@ def get_path_via_file_ui():
     root.withdraw()
     return filedialog.askopenfilename() 
 
-def display_images(images, imageConversion=cv.COLOR_BGR2RGB, titles=[], columns=4, rows=None, show=True):
+def display_images(images, imageConversion='BGR2RGB', titles=[], columns=4, rows=None, show=True):
     """
     Displays one or multiple images using matplotlib.
 
     Keyword arguments:
     images -- list of images
-    imageConversion -- optional image Conversion. Note: OpenCV is BGR and matplotlib uses RGB. Use None for no image conversion.
+    imageConversion -- optional image Conversion (cv.COLOR_* value or its name without prefix). Note: OpenCV is BGR and matplotlib uses RGB. Use None for no image conversion.
     titles -- list of titles for the images
     columns -- number of image columns
     rows -- number of rows. Default: compute necessary number of rows
     show -- show result
     """
+    cv = get_cv()
+    plt = get_pyplot()
     if not show:
         return
+    if isinstance(imageConversion, str):
+        imageConversion = getattr(cv, 'COLOR_' + imageConversion)
     if imageConversion is not None:
         images = [cv.cvtColor(img, imageConversion) for img in images]
 
@@ -320,6 +356,7 @@ def is_image_black(image, whitePixelThreshold=50, imageSum=None):
 
 def resize_image(image, resizeFactor):
     """ Resize image by a positive resizeFactor."""
+    cv = get_cv()
 
     return cv.resize(image, (0,0), fx=resizeFactor, fy=resizeFactor)
 
@@ -382,14 +419,17 @@ def clear_screen():
 
 def flip_image_horizontal(image):
     """ Flips an image horizontally."""
+    cv = get_cv()
     return cv.flip(image, 0)
 
 def flip_image_vertical(image):
     """ Flips an image vertically."""
+    cv = get_cv()
     return cv.flip(image, 1)
 
 def flip_image(image, direction):
     """ Flips an image in a specified direction."""
+    cv = get_cv()
     prevShape = image.shape
     image, reshaped = reshape_to_cv_format(image, False)
     image = cv.flip(image, direction)
@@ -399,6 +439,7 @@ def flip_image(image, direction):
 
 def equalize_image_channel(channel):
     """ Histogram equalization of a single image channel."""
+    cv = get_cv()
 
     if channel[0][0].shape == (3):
         raise AttributeError("More than one color channel.")
@@ -415,6 +456,7 @@ def ZCA_whitening(imageVector):
 
 def equalize_BGR_image(image):
     """ Histogram eq whole color image."""
+    cv = get_cv()
 
     b, g, r = cv.split(image)
     b = equalize_image_channel(b)
@@ -424,6 +466,7 @@ def equalize_BGR_image(image):
 
 def equalize_BGR_image_adaptive(image):
     """ Adaptive color image equalization (CLAHE)."""
+    cv = get_cv()
 
     b, g, r = cv.split(image)
     b = equalize_image_channel_adaptive(b)
@@ -433,15 +476,32 @@ def equalize_BGR_image_adaptive(image):
 
 def equalize_image_channel_adaptive(channel):
     """ Adaptive image channel equalization (CLAHE)."""
+    cv = get_cv()
     if channel[0][0].shape == (3):
         raise AttributeError("More than one color channel.")
     clahe = cv.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
     return clahe.apply(channel)
 
+HSV_CHANNELS = {"h": 0, "s": 1, "v": 2}
+
+def __get_hsv_channel_maximum(channel, dtype):
+    """ Largest value of a HSV channel in the OpenCV color conversion (8-bit: h in [0, 180), float32: h in [0, 360)). """
+    if channel == "h":
+        return 179 if dtype == np.uint8 else 360.0
+    return 255 if dtype == np.uint8 else 1.0
+
+def __scale_hsv_channel(hsv, channel, values):
+    """ Multiplies a channel of HSV images [..., 3] with saturation at the channel range (no overflow). """
+    channelIndex = HSV_CHANNELS[channel]
+    scaled = hsv[..., channelIndex] * np.asarray(values, dtype=np.float32)
+    hsv[..., channelIndex] = np.clip(scaled, 0, __get_hsv_channel_maximum(channel, hsv.dtype))
+    return hsv
+
 def change_light(image, value, channel="v"):
     """ Change the light intensity of an image."""
+    cv = get_cv()
 
-    channelDic = {"h": 0, "s":1, "v":2}
+    channelDic = HSV_CHANNELS
     # "translate" image channel to channel index
     if not channel in channelDic:
         raise AttributeError("invalid channel value. Valid values are h, s, or v")
@@ -462,19 +522,101 @@ def change_light(image, value, channel="v"):
     #print "dtype",image.dtype
     # convert to hsv
     hsv = cv.cvtColor(image, cv.COLOR_BGR2HSV)
-    # hsv[:,:,2] += value -  would be way faster but this does not prevent overflow (a high value gets even higher and becomes 0)
-    channels = cv.split(hsv)
-    for row in xrange(len(channels[channelDic[channel]])):
-        for col in xrange(len(channels[channelDic[channel]][0])):
-            channels[channelDic[channel]][row][col] = max(min(255, channels[channelDic[channel]][row][col]*value),0)
-
-    image = cv.cvtColor(cv.merge(channels), cv.COLOR_HSV2BGR)
+    # the channel is scaled in float and clipped to its range, so a high value can not overflow (and become 0)
+    hsv = __scale_hsv_channel(hsv, channel, value)
+    image = cv.cvtColor(hsv, cv.COLOR_HSV2BGR)
 
     # reshape back
     if reshape:        
         image = image.reshape(prevShape)
     return image
 
+def change_light_batch(images, values, channel="v"):
+    """
+    Change the light intensity of a whole batch of images at once.
+
+    Keyword arguments:
+    images -- NHWC batch. 8-bit [0, 255] or float32 [0.0, 1.0] (the convnet scale, no rescaling needed)
+    values -- factor for all images or one factor per image [N]
+    channel -- h, s or v. Grayscale batches (C = 1) only support v
+    """
+    cv = get_cv()
+
+    if not channel in HSV_CHANNELS:
+        raise AttributeError("invalid channel value. Valid values are h, s, or v")
+    images = np.asarray(images)
+    if images.ndim != 4:
+        raise AttributeError("Expected a NHWC batch. Got shape {0}.".format(images.shape))
+    n, h, w, c = images.shape
+    # one factor per image, broadcasted over the pixels
+    values = np.asarray(values, dtype=np.float32).reshape((-1, 1, 1))
+
+    if c == 1:
+        if channel != "v":
+            raise AttributeError("Grayscale images only have a v channel.")
+        maximum = 255 if images.dtype == np.uint8 else 1.0
+        return np.clip(images * values[..., np.newaxis], 0, maximum).astype(images.dtype)
+    if c != 3:
+        raise AttributeError("Expected 1 or 3 channels. Got {0}.".format(c))
+
+    if images.dtype != np.uint8:
+        images = images.astype(np.float32)
+    # cvtColor converts pixel by pixel: the batch is converted as a single (N * H, W, 3) image
+    hsv = cv.cvtColor(np.ascontiguousarray(images).reshape((n * h, w, 3)), cv.COLOR_BGR2HSV).reshape((n, h, w, 3))
+    hsv = __scale_hsv_channel(hsv, channel, values)
+    return cv.cvtColor(hsv.reshape((n * h, w, 3)), cv.COLOR_HSV2BGR).reshape((n, h, w, 3))
+
+def translate_batch(images, dx, dy):
+    """
+    Translates each image of a NHWC batch by whole pixels. Uncovered pixels become 0.
+
+    Keyword arguments:
+    images -- NHWC batch
+    dx -- horizontal translation per image [N] (positive: right)
+    dy -- vertical translation per image [N] (positive: down)
+    """
+    n, h, w = images.shape[:3]
+    dx = np.asarray(dx, dtype=np.int64).reshape((-1, 1))
+    dy = np.asarray(dy, dtype=np.int64).reshape((-1, 1))
+    # source row / column of every target pixel
+    rows = np.arange(h)[np.newaxis, :] - dy
+    cols = np.arange(w)[np.newaxis, :] - dx
+    valid = ((rows >= 0) & (rows < h))[:, :, np.newaxis] & ((cols >= 0) & (cols < w))[:, np.newaxis, :]
+    translated = images[np.arange(n)[:, np.newaxis, np.newaxis], np.clip(rows, 0, h - 1)[:, :, np.newaxis], np.clip(cols, 0, w - 1)[:, np.newaxis, :]]
+    translated[~valid] = 0
+    return translated
+
+def augment_batch(images, brightness=None, saturation=None, flip_horizontal=False, flip_vertical=False, max_translation=0, random_state=None):
+    """
+    Randomly augments a whole NHWC batch (vectorized, no per image loop). Returns a new batch.
+
+    Keyword arguments:
+    images -- NHWC batch. 8-bit [0, 255] or float32 [0.0, 1.0]
+    brightness -- (min, max) range of the brightness factor. -- Default: None (unchanged)
+    saturation -- (min, max) range of the saturation factor (color images). -- Default: None (unchanged)
+    flip_horizontal -- flip half of the images horizontally (left <-> right). -- Default: False
+    flip_vertical -- flip half of the images vertically (top <-> bottom). -- Default: False
+    max_translation -- maximal translation in pixels in both directions. -- Default: 0
+    random_state -- numpy RandomState. -- Default: None (global numpy random state)
+    """
+    random_state = np.random if random_state is None else random_state
+    images = np.array(images, copy=True)
+    n = images.shape[0]
+
+    if flip_horizontal:
+        flip = random_state.rand(n) < 0.5
+        images[flip] = images[flip, :, ::-1]
+    if flip_vertical:
+        flip = random_state.rand(n) < 0.5
+        images[flip] = images[flip, ::-1]
+    if max_translation > 0:
+        images = translate_batch(images, random_state.randint(-max_translation, max_translation + 1, n), random_state.randint(-max_translation, max_translation + 1, n))
+    if saturation is not None:
+        images = change_light_batch(images, random_state.uniform(saturation[0], saturation[1], n), "s")
+    if brightness is not None:
+        images = change_light_batch(images, random_state.uniform(brightness[0], brightness[1], n), "v")
+    return images
+
 def change_brightness(image, value):
     """ Change the brightness intensity."""
 
@@ -549,6 +691,7 @@ def rotate_image(image, angle, crop=True, keepSize=True):
     crop -- crop the resulting image?
     keepSize -- if True and the size has changed the image will be resized to fit the input size again
     """
+    cv = get_cv()
 
      # do we need to convert the image?
     prevShape = image.shape
@@ -648,6 +791,7 @@ def translate_image_horizontal(image, translationFactor):
 
 def translate_image(image, translationMatrix):
     """ Translates the image given a translation matrix."""
+    cv = get_cv()
 
     # which image shape? (ConvNet (3, w, h) vs. Normal (w, h, 3)
     reshape = False
@@ -784,6 +928,7 @@ def flatten_matrix(matrix):
 
 def visulize_matches(matches, k2, k1, img2, img1):
     """ Visualize SIFT keypoint matches."""
+    cv = get_cv()
 
     import scipy as sp
     img2 = cv.cvtColor(img2, cv.COLOR_GRAY2BGR)
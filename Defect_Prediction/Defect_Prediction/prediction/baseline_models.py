@@ -0,0 +1,159 @@
+import time
+import pickle
+import logging
+import numpy as np
+from scipy.sparse import issparse
+
+from data_io.test_data import SAMPLING_NONE
+from prediction.evaluation import StreamingEvaluator
+
+
+logger = logging.getLogger('prediction')
+
+MODEL_TENSORFLOW = 'tensorflow'
+MODEL_LOGISTIC_REGRESSION = 'logistic_regression'
+MODEL_NAIVE_BAYES = 'naive_bayes'
+MODEL_GRADIENT_BOOSTING = 'gradient_boosting'
+BASELINE_MODELS = [MODEL_LOGISTIC_REGRESSION, MODEL_NAIVE_BAYES, MODEL_GRADIENT_BOOSTING]
+MODEL_TYPES = [MODEL_TENSORFLOW] + BASELINE_MODELS
+
+
+def create_estimator(model_type, sparse_features, random_seed=42, **model_parameters):
+    """
+    Creates the scikit-learn estimator of a baseline model.
+
+    logistic_regression -- LogisticRegression (liblinear for sparse token counts, lbfgs otherwise)
+    naive_bayes -- MultinomialNB for sparse token counts, GaussianNB for dense (normalized) features
+    gradient_boosting -- HistGradientBoostingClassifier for dense features (if available), GradientBoostingClassifier otherwise
+    """
+    if model_type == MODEL_LOGISTIC_REGRESSION:
+        from sklearn.linear_model import LogisticRegression
+        parameters = dict(solver='liblinear' if sparse_features else 'lbfgs', max_iter=1000, random_state=random_seed)
+        parameters.update(model_parameters)
+        return LogisticRegression(**parameters)
+
+    if model_type == MODEL_NAIVE_BAYES:
+        if sparse_features:
+            from sklearn.naive_bayes import MultinomialNB
+            return MultinomialNB(**model_parameters)
+        from sklearn.naive_bayes import GaussianNB
+        return GaussianNB(**model_parameters)
+
+    if model_type == MODEL_GRADIENT_BOOSTING:
+        try:
+            if sparse_features:
+                raise ImportError('HistGradientBoostingClassifier needs dense features.')
+            from sklearn.ensemble import HistGradientBoostingClassifier
+            return HistGradientBoostingClassifier(**dict(dict(random_state=random_seed), **model_parameters))
+        except ImportError:
+            from sklearn.ensemble import GradientBoostingClassifier
+            return GradientBoostingClassifier(**dict(dict(random_state=random_seed), **model_parameters))
+
+    raise AttributeError('Unknown baseline model {0}. Available models: {1}'.format(model_type, BASELINE_MODELS))
+
+
+class BaselineModel(object):
+    """
+    Fast CPU baseline with the training, prediction and evaluation api of TensorFlowNet
+    (run_training, predict, predict_proba, evaluate_data_set), so both can be used by the same scripts
+    (e.g. the cross validation, see prediction.cross_validation).
+    The estimators train on the complete train DataSet at once. Prediction and evaluation are batched.
+    """
+
+    def __init__(self, train_data_set, test_data_set, model_type=MODEL_LOGISTIC_REGRESSION, model_name=None, batch_size=1000, random_seed=42, **model_parameters):
+        """
+        Keyword arguments:
+        train_data_set -- DataSet (labels or one hot targets). None for restored models
+        test_data_set -- DataSet for the evaluation after training (optional)
+        model_type -- see BASELINE_MODELS
+        model_name -- name for logging. Default: model_type
+        batch_size -- examples per batch for prediction and evaluation
+        model_parameters -- parameters of the scikit-learn estimator (e.g. class_weight='balanced', C=0.1)
+        """
+        if model_type not in BASELINE_MODELS:
+            raise AttributeError('Unknown baseline model {0}. Available models: {1}'.format(model_type, BASELINE_MODELS))
+        self.train = train_data_set
+        self.test = test_data_set
+        self.model_type = model_type
+        self.model_name = model_name if model_name is not None else model_type
+        self.batch_size = batch_size
+        self.random_seed = random_seed
+        self.model_parameters = model_parameters
+        self.num_classes = 2
+        self.estimator = None
+        self.training_time = None
+
+        # metrics of the model on the complete test set (see evaluate_data_set)
+        self.test_evaluation = None
+
+    def run_training(self):
+        if self.train is None:
+            raise AttributeError('Model {0} has no train data set.'.format(self.model_name))
+        labels = self.train.labels
+        self.num_classes = int(max(labels.max() + 1, 2))
+        self.estimator = create_estimator(self.model_type, self.train.is_sparse, self.random_seed, **self.model_parameters)
+
+        logger.info('Training baseline {0} ({1}) on {2} examples - features: {3}.'.format(self.model_name, type(self.estimator).__name__, self.train.num_examples, self.train.feature_shape))
+        start_time = time.time()
+        # the sampling modes of the DataSet are index based. A sampled epoch is used as training set.
+        if getattr(self.train, 'sampling', SAMPLING_NONE) != SAMPLING_NONE:
+            X, y = self.train.next_batch(self.train.epoch_size)
+            self.estimator.fit(X, np.argmax(y, axis=1) if y.ndim == 2 else y)
+        else:
+            self.estimator.fit(self.train.features, labels)
+        self.training_time = time.time() - start_time
+        logger.info('Training of {0} took {1:.2f}s.'.format(self.model_name, self.training_time))
+
+        if self.test is not None:
+            self.test_evaluation = self.evaluate_data_set(self.test)
+        return self.test_evaluation
+
+    def __probabilities(self, X):
+        # estimators only know the classes of the train set. Missing classes get probability 0.
+        probabilities = np.zeros((X.shape[0], self.num_classes), dtype=np.float32)
+        probabilities[:, self.estimator.classes_] = self.estimator.predict_proba(X)
+        return probabilities
+
+    def predict(self, X):
+        """ Predicts a single example. Returns (label, probability of the label) like TensorFlowNet.predict. """
+        if not issparse(X):
+            X = np.asarray(X).reshape((1, -1))
+        y = self.__probabilities(X)
+        label = np.argmax(y)
+        return label, y[0][label]
+
+    def predict_proba(self, data_set, batch_size=None):
+        """ Class probabilities of all examples of a data set [num_examples, num_classes]. """
+        batch_size = self.batch_size if batch_size is None else batch_size
+        probabilities = [self.__probabilities(X) for X, _ in data_set.iterate_batches(batch_size)]
+        return np.concatenate(probabilities, axis=0) if len(probabilities) > 0 else np.zeros((0, self.num_classes), dtype=np.float32)
+
+    def evaluate_data_set(self, data_set, batch_size=None, effort=None, name=None):
+        """ Evaluates the model on all examples of a data set (see TensorFlowNet.evaluate_data_set). """
+        batch_size = self.batch_size if batch_size is None else batch_size
+        evaluator = StreamingEvaluator(num_classes=self.num_classes)
+        start = 0
+        for X, y in data_set.iterate_batches(batch_size):
+            evaluator.update(y, self.__probabilities(X), None if effort is None else effort[start:start + len(y)])
+            start += len(y)
+        return evaluator.log_result(name if name is not None else '{0} {1}'.format(self.model_name, getattr(data_set, 'name', '')))
+
+    def save(self, file_name):
+        with open(file_name, 'wb') as f:
+            pickle.dump((self.model_type, self.model_name, self.num_classes, self.model_parameters, self.estimator), f, protocol=pickle.HIGHEST_PROTOCOL)
+        logger.debug('Saved baseline {0} to {1}.'.format(self.model_name, file_name))
+
+    @classmethod
+    def load(cls, file_name):
+        """ Restores a model of save for prediction. """
+        with open(file_name, 'rb') as f:
+            model_type, model_name, num_classes, model_parameters, estimator = pickle.load(f)
+        model = cls(None, None, model_type, model_name, **model_parameters)
+        model.num_classes = num_classes
+        model.estimator = estimator
+        return model
+
+
+def create_baseline_model(train, test, name, model_type=MODEL_LOGISTIC_REGRESSION, **model_parameters):
+    """ Model factory of the cross validation (see prediction.cross_validation.CrossValidation.run). """
+    return BaselineModel(train, test, model_type, '{0}_{1}'.format(model_type, name), **model_parameters)
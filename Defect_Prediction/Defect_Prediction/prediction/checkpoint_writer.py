@@ -0,0 +1,161 @@
+import os
+import glob
+import json
+import time
+import queue
+import logging
+import threading
+import numpy as np
+
+
+logger = logging.getLogger('prediction')
+
+SNAPSHOT_FILE_PATTERN = '{0}-{1:08d}.npz'
+METADATA_KEY = '__metadata__'
+
+
+def snapshot_variables(sess, variables):
+    """ Copies the values of tensorflow variables into memory. Returns an dict: variable name -> numpy array. """
+    values = sess.run(variables)
+    return dict((variable.op.name, value) for variable, value in zip(variables, values))
+
+def restore_variables(sess, variables, snapshot):
+    """ Loads the values of a snapshot (see snapshot_variables) into the variables. """
+    for variable in variables:
+        variable.load(snapshot[variable.op.name], sess)
+
+def load_snapshot(file_name):
+    """ Returns (values, metadata) of a snapshot file written by AsyncCheckpointWriter. """
+    with np.load(file_name) as data:
+        values = dict((name, data[name]) for name in data.files if name != METADATA_KEY)
+        metadata = json.loads(str(data[METADATA_KEY])) if METADATA_KEY in data.files else {}
+    return values, metadata
+
+
+class AsyncCheckpointWriter(object):
+    """
+    Writes variable snapshots in a background thread so the training loop does not block on disk writes.
+
+    Snapshots are taken in memory (snapshot_variables) and submitted. At most one snapshot is written every min_interval seconds.
+    A snapshot that is submitted within the interval replaces the pending one (only the newest pending snapshot is written).
+    Only the last keep_last snapshot files are kept. The last submitted snapshot is always kept in memory (best_snapshot)
+    and is written by close(), so the best model can be restored even if its write was rate limited.
+    """
+
+    def __init__(self, directory, prefix='best', min_interval=30.0, keep_last=3):
+        """
+        Keyword arguments:
+        directory -- dir of the snapshot files
+        prefix -- file prefix (files: <prefix>-<step>.npz)
+        min_interval -- minimum number of seconds between two writes
+        keep_last -- number of snapshot files to keep (older files are removed, including the snapshots of earlier runs in the directory)
+        """
+        if keep_last < 1:
+            raise AttributeError('keep_last has to be at least 1.')
+        self.directory = directory
+        self.prefix = prefix
+        self.min_interval = min_interval
+        self.keep_last = keep_last
+
+        self.best_snapshot = None
+        self.best_metadata = None
+        # snapshots left by earlier runs (e.g. before a crash) count towards the retention
+        self.written_files = AsyncCheckpointWriter.list_snapshots(directory, prefix)
+        self.num_submitted = 0
+        self.num_written = 0
+
+        self.__pending = None
+        self.__last_write_time = None
+        self.__error = None
+        self.__lock = threading.Lock()
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(target=self.__run, name='AsyncCheckpointWriter', daemon=True)
+        self.__thread.start()
+
+    def submit(self, step, snapshot, metadata=None):
+        """ Submits an in-memory snapshot (see snapshot_variables). Returns immediately. """
+        self.__raise_error()
+        metadata = dict(metadata or {}, step=step)
+        with self.__lock:
+            self.best_snapshot = snapshot
+            self.best_metadata = metadata
+            self.num_submitted += 1
+            now = time.time()
+            if self.__last_write_time is not None and now - self.__last_write_time < self.min_interval:
+                # rate limited: written later (next submit after the interval or close)
+                self.__pending = (step, snapshot, metadata)
+                return
+            self.__pending = None
+            self.__last_write_time = now
+        self.__queue.put((step, snapshot, metadata))
+
+    def flush(self):
+        """ Writes the pending snapshot (if any) and waits until all submitted writes are done. """
+        with self.__lock:
+            pending, self.__pending = self.__pending, None
+            if pending is not None:
+                self.__last_write_time = time.time()
+        if pending is not None:
+            self.__queue.put(pending)
+        self.__queue.join()
+        self.__raise_error()
+
+    def close(self):
+        """ Flushes and stops the writer thread. Returns (best_snapshot, best_metadata). """
+        try:
+            self.flush()
+        finally:
+            self.__queue.put(None)
+            self.__thread.join()
+        logger.debug('Checkpoint writer closed. Submitted: {0} - Written: {1}.'.format(self.num_submitted, self.num_written))
+        return self.best_snapshot, self.best_metadata
+
+    @property
+    def latest_file(self):
+        """ File of the last written snapshot (None if nothing was written yet). """
+        return self.written_files[-1] if len(self.written_files) > 0 else None
+
+    def __raise_error(self):
+        if self.__error is not None:
+            error, self.__error = self.__error, None
+            raise error
+
+    def __run(self):
+        while True:
+            item = self.__queue.get()
+            try:
+                if item is None:
+                    return
+                self.__write(*item)
+            except Exception as e:
+                logger.exception('Could not write checkpoint.')
+                self.__error = e
+            finally:
+                self.__queue.task_done()
+
+    def __write(self, step, snapshot, metadata):
+        file_name = os.path.join(self.directory, SNAPSHOT_FILE_PATTERN.format(self.prefix, step))
+        temp_file_name = file_name + '.tmp.npz'
+        arrays = dict(snapshot)
+        arrays[METADATA_KEY] = np.array(json.dumps(metadata))
+        np.savez(temp_file_name, **arrays)
+        os.replace(temp_file_name, file_name)
+
+        self.num_written += 1
+        if file_name in self.written_files:
+            self.written_files.remove(file_name)
+        self.written_files.append(file_name)
+        logger.debug('Wrote checkpoint {0}.'.format(file_name))
+
+        # keep-last-K retention
+        while len(self.written_files) > self.keep_last:
+            old_file = self.written_files.pop(0)
+            try:
+                os.remove(old_file)
+            except OSError:
+                logger.warning('Could not remove old checkpoint {0}.'.format(old_file))
+
+    @staticmethod
+    def list_snapshots(directory, prefix='best'):
+        """ Snapshot files of a directory sorted by step. """
+        return sorted(file_name for file_name in glob.glob(os.path.join(directory, '{0}-*.npz'.format(prefix))) if not file_name.endswith('.tmp.npz'))
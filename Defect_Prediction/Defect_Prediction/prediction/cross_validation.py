@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+import multiprocessing
+import numpy as np
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from data_io.feature_store import FeatureStore, get_smallest_uint_dtype
+from data_io.vocabulary import NAME_TOKEN_OFFSET
+from data_io.normalization import Normalizer, NORMALIZATION_MIN_MAX
+from data_io.bag_of_tokens import to_bag_of_tokens
+from data_io.test_data import DataSet, SAMPLING_NONE
+
+
+logger = logging.getLogger('prediction')
+
+FEATURES_FILE_NAME = 'features.npy'
+LABELS_FILE_NAME = 'labels.npy'
+FOLDS_FILE_NAME = 'folds.npy'
+
+DEFAULT_CONFIDENCE = 0.95
+# metrics of prediction.evaluation.StreamingEvaluator.result that are aggregated
+AGGREGATED_METRICS = ['accuracy', 'precision', 'recall', 'f1', 'auc', 'cost_effectiveness']
+
+
+def stratified_fold_assignments(labels, num_folds=10, num_repeats=1, seed=42):
+    """
+    Assigns every example to a test fold, once per repetition. Every class is spread evenly over the folds.
+
+    Returns:
+    int8 array [num_repeats, num_examples] with the test fold of every example
+    """
+    labels = np.asarray(labels)
+    if num_folds < 2:
+        raise AttributeError('At least 2 folds are needed. Got {0}.'.format(num_folds))
+    class_sizes = np.bincount(labels)
+    if class_sizes[class_sizes > 0].min() < num_folds:
+        logger.warning('The smallest class has only {0} examples. Some test folds do not contain every class.'.format(class_sizes[class_sizes > 0].min()))
+
+    random_state = np.random.RandomState(seed)
+    folds = np.empty((num_repeats, len(labels)), dtype=np.int8)
+    for repeat in range(num_repeats):
+        # shuffle, then deal the examples of every class round robin (random start fold per class)
+        order = random_state.permutation(len(labels))
+        order = order[np.argsort(labels[order], kind='stable')]
+        position_in_class = np.arange(len(labels)) - np.repeat(np.cumsum(class_sizes) - class_sizes, class_sizes)
+        offsets = random_state.randint(num_folds, size=len(class_sizes))
+        folds[repeat, order] = (position_in_class + np.repeat(offsets, class_sizes)) % num_folds
+    return folds
+
+def confidence_interval(values, confidence=DEFAULT_CONFIDENCE, test_train_ratio=None):
+    """
+    Mean and confidence interval (student t) of the fold results.
+
+    Keyword arguments:
+    values -- metric value of every fold
+    confidence -- confidence level
+    test_train_ratio -- n_test / n_train of the folds. If set, the variance is corrected for the overlapping
+                        training sets of the folds (corrected resampled t-test, Nadeau and Bengio)
+
+    Returns:
+    (mean, std, lower bound, upper bound)
+    """
+    from scipy import stats
+
+    values = np.asarray([value for value in values if value is not None], dtype=np.float64)
+    if len(values) == 0:
+        return None, None, None, None
+    mean = values.mean()
+    if len(values) == 1:
+        return float(mean), 0.0, float(mean), float(mean)
+
+    std = values.std(ddof=1)
+    variance_factor = 1.0 / len(values) + (test_train_ratio if test_train_ratio is not None else 0.0)
+    half_width = stats.t.ppf((1 + confidence) / 2, len(values) - 1) * std * np.sqrt(variance_factor)
+    return float(mean), float(std), float(mean - half_width), float(mean + half_width)
+
+def create_tensorflow_net(train, test, name, max_epochs=100, batch_size=100, initial_learning_rate=1e-4, validation_ratio=0.1):
+    """ Model factory of the cross validation: the net of the train command (see Defect_Prediction.train). Early stopping monitors a split of the train fold, not the test fold. """
+    from prediction.tf_model import TensorFlowNet, TF_LAYER
+    return TensorFlowNet(
+        train_data_set=train,
+        test_data_set=test,
+        num_classes=2,
+        input_shape=[train.feature_shape[1]],
+        targets_shape=[-1, 2],
+        input_is_image=False,
+        batch_size=batch_size,
+        initial_learning_rate=initial_learning_rate,
+        architecture_shape=[
+            (TF_LAYER.Dense, 'hidden1', 128),
+            (TF_LAYER.Dense, 'hidden2', 128),
+            (TF_LAYER.Dense, 'hidden3', 16),
+            (TF_LAYER.Dropout, 'dropout1', 0.4)],
+        max_epochs=max_epochs,
+        model_name=name,
+        calculate_f1_score=True,
+        num_epochs_per_decay=90,
+        validation_ratio=validation_ratio
+        )
+
+def run_fold(data_dir, repeat, fold, create_model, bag_of_tokens=False, num_token_ids=None, normalization=NORMALIZATION_MIN_MAX, sampling=SAMPLING_NONE, seed=42):
+    """
+    Trains and evaluates one fold. Runs in a worker process.
+    The features are memory mapped, so all workers share the same pages. Only the rows of the fold are copied.
+
+    Returns:
+    OrderedDict with repeat, fold, duration and the metrics of the test fold (see prediction.evaluation.StreamingEvaluator)
+    """
+    start_time = time.time()
+    X = np.load(os.path.join(data_dir, FEATURES_FILE_NAME), mmap_mode='r')
+    y = np.load(os.path.join(data_dir, LABELS_FILE_NAME), mmap_mode='r')
+    folds = np.load(os.path.join(data_dir, FOLDS_FILE_NAME), mmap_mode='r')[repeat]
+    test_indices = np.flatnonzero(folds == fold)
+    train_indices = np.flatnonzero(folds != fold)
+
+    if bag_of_tokens:
+        # padding zeros are not part of the token sequences
+        X_train = to_bag_of_tokens([row[row != 0] for row in X[train_indices]], num_tokens=num_token_ids)
+        X_test = to_bag_of_tokens([row[row != 0] for row in X[test_indices]], num_tokens=num_token_ids)
+    else:
+        # the statistics are computed on the train folds only
+        X_train = np.asarray(X[train_indices], dtype=np.float32)
+        X_test = np.asarray(X[test_indices], dtype=np.float32)
+        normalizer = Normalizer(normalization).fit(X_train)
+        normalizer.transform(X_train)
+        normalizer.transform(X_test)
+
+    train = DataSet(X_train, np.asarray(y[train_indices]), 'Train', one_hot=True, seed=seed + repeat, sampling=sampling)
+    test = DataSet(X_test, np.asarray(y[test_indices]), 'Test', one_hot=True)
+    model = create_model(train, test, 'cv_r{0:02d}_f{1:02d}'.format(repeat, fold))
+    model.run_training()
+
+    result = OrderedDict([('repeat', repeat), ('fold', fold), ('num_train', len(train_indices)), ('num_test', len(test_indices))])
+    result.update(model.evaluate_data_set(test))
+    result['duration'] = time.time() - start_time
+    return result
+
+
+class CrossValidation(object):
+    """
+    Repeated stratified k-fold cross validation on the projects of a feature store.
+
+    The padded token matrix is read once from the store and written to a .npy file together with the labels and the
+    fold assignments of all repetitions. The folds are trained in worker processes (spawn, tensorflow sessions are not
+    fork safe) that memory map these files, so the data is neither copied per fold nor pickled to the workers.
+    The normalizer of every fold is fitted on its train folds only.
+    """
+
+    def __init__(self, feature_store_path, projects=None, num_folds=10, num_repeats=10, num_workers=None, seed=42, work_dir=None):
+        """
+        Keyword arguments:
+        feature_store_path -- dir of the feature store
+        projects -- projects of the store to use (default: all)
+        num_folds -- folds per repetition
+        num_repeats -- number of repetitions with different fold assignments
+        num_workers -- number of worker processes. Default: number of cpus
+        seed -- seed of the fold assignments and the sampling
+        work_dir -- dir for the shared feature files. Default: temporary dir (removed by close)
+        """
+        self.feature_store_path = feature_store_path
+        self.projects = projects
+        self.num_folds = num_folds
+        self.num_repeats = num_repeats
+        self.num_workers = num_workers if num_workers is not None else multiprocessing.cpu_count()
+        self.seed = seed
+        self.__remove_work_dir = work_dir is None
+        self.work_dir = work_dir if work_dir is not None else tempfile.mkdtemp(prefix='cross_validation_')
+        self.num_token_ids = None
+        self.results = []
+
+    def prepare(self):
+        """ Writes the shared feature, label and fold files. """
+        if not os.path.isdir(self.work_dir):
+            os.makedirs(self.work_dir)
+        store = FeatureStore(self.feature_store_path)
+        vocabulary = store.load_vocabulary()
+        if vocabulary is None:
+            raise AttributeError('Feature store {0} is empty.'.format(self.feature_store_path))
+
+        # same bound as DefectDataSetLoader.num_token_ids
+        if vocabulary['num_hash_buckets'] is not None:
+            self.num_token_ids = NAME_TOKEN_OFFSET + vocabulary['num_hash_buckets']
+        else:
+            self.num_token_ids = max([vocabulary['current_mapping_index']] + [token_id + 1 for token_id in vocabulary['token_mapping_names'].values()])
+
+        # raw token ids with the smallest dtype. The workers convert (and normalize) only the rows of their fold.
+        X, y, _, _ = store.read(self.projects, dtype=get_smallest_uint_dtype(self.num_token_ids))
+
+        y = (y > 0).astype(np.int32)
+        np.save(os.path.join(self.work_dir, FEATURES_FILE_NAME), X)
+        np.save(os.path.join(self.work_dir, LABELS_FILE_NAME), y)
+        np.save(os.path.join(self.work_dir, FOLDS_FILE_NAME), stratified_fold_assignments(y, self.num_folds, self.num_repeats, self.seed))
+        logger.info('Cross validation data: {0} classes, {1} features ({2} bytes) - {3}x{4} folds.'.format(X.shape[0], X.shape[1], X.nbytes, self.num_repeats, self.num_folds))
+
+    def run(self, create_model=create_tensorflow_net, bag_of_tokens=False, normalization=NORMALIZATION_MIN_MAX, sampling=SAMPLING_NONE):
+        """
+        Trains and evaluates all folds.
+
+        Keyword arguments:
+        create_model -- picklable function (train, test, name) -> model with run_training() and evaluate_data_set(data_set)
+                        (e.g. functools.partial(create_tensorflow_net, max_epochs=50))
+        bag_of_tokens -- use token count vectors instead of the padded token vectors
+        normalization -- normalization method of the padded token vectors (fitted per fold)
+        sampling -- class imbalance sampling of the train folds (see data_io.test_data.SAMPLING_MODES)
+
+        Returns:
+        aggregated results (see aggregate)
+        """
+        if not os.path.exists(os.path.join(self.work_dir, FOLDS_FILE_NAME)):
+            self.prepare()
+
+        run = partial(run_fold, self.work_dir, create_model=create_model, bag_of_tokens=bag_of_tokens, num_token_ids=self.num_token_ids, normalization=normalization, sampling=sampling, seed=self.seed)
+        tasks = [(repeat, fold) for repeat in range(self.num_repeats) for fold in range(self.num_folds)]
+        start_time = time.time()
+        with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(run, repeat, fold) for repeat, fold in tasks]
+            self.results = []
+            for i, future in enumerate(futures):
+                self.results.append(future.result())
+                logger.info('Fold {0}/{1} done (repeat {repeat} - fold {fold}): f1 {f1:.4f} - {duration:.1f}s.'.format(i + 1, len(tasks), **self.results[-1]))
+        logger.info('Cross validation took {0:.1f}s with {1} workers.'.format(time.time() - start_time, self.num_workers))
+        return self.aggregate()
+
+    def aggregate(self, confidence=DEFAULT_CONFIDENCE):
+        """
+        Mean, std and confidence interval of every metric over all folds.
+        The interval uses the corrected resampled t-test variance (the train sets of the folds overlap).
+        """
+        aggregated = OrderedDict([('num_folds', self.num_folds), ('num_repeats', self.num_repeats), ('confidence', confidence)])
+        test_train_ratio = 1.0 / (self.num_folds - 1)
+        for metric in AGGREGATED_METRICS:
+            mean, std, lower, upper = confidence_interval([result[metric] for result in self.results], confidence, test_train_ratio)
+            aggregated[metric] = OrderedDict([('mean', mean), ('std', std), ('lower', lower), ('upper', upper)])
+        return aggregated
+
+    def log_results(self, aggregated):
+        logger.info('Cross validation {0}x{1} folds ({2:.0%} confidence intervals):'.format(aggregated['num_repeats'], aggregated['num_folds'], aggregated['confidence']))
+        for metric in AGGREGATED_METRICS:
+            values = aggregated[metric]
+            if values['mean'] is None:
+                logger.info('\t{0:<20} -'.format(metric))
+                continue
+            logger.info('\t{0:<20} {1:.4f} +- {2:.4f}  [{3:.4f}, {4:.4f}]'.format(metric, values['mean'], values['std'], values['lower'], values['upper']))
+
+    def save_results(self, file_name, aggregated):
+        with open(file_name, 'w') as f:
+            json.dump({'aggregated': aggregated, 'folds': self.results}, f, indent=2)
+
+    def close(self):
+        """ Removes the temporary work dir. """
+        if self.__remove_work_dir and os.path.isdir(self.work_dir):
+            shutil.rmtree(self.work_dir, ignore_errors=True)
@@ -0,0 +1,97 @@
+import logging
+import numpy as np
+
+
+logger = logging.getLogger('prediction')
+
+MODE_MIN = 'min'
+MODE_MAX = 'max'
+
+
+class EarlyStopping(object):
+    """
+    Tracks a monitored value (e.g. the validation loss) once per evaluated epoch.
+
+    The value improves if it is better than the best value by more than min_delta. Training should stop
+    when the value did not improve for more than patience epochs. If plateau_patience is set, the learning rate
+    should be reduced (by plateau_factor) every time the value did not improve for plateau_patience epochs.
+
+    Usage:
+        improved = early_stopping.update(epoch, validation_loss)
+        if early_stopping.reduce_learning_rate(epoch): learning_rate *= early_stopping.plateau_factor
+        if early_stopping.should_stop(epoch): break
+    """
+
+    def __init__(self, patience=20, min_delta=1e-4, mode=MODE_MIN, plateau_patience=None, plateau_factor=0.5, max_reductions=None):
+        """
+        Keyword arguments:
+        patience -- epochs without improvement before training stops. None: never stop
+        min_delta -- minimal change of the monitored value that counts as improvement
+        mode -- min (loss) or max (accuracy)
+        plateau_patience -- epochs without improvement before the learning rate is reduced. None: no reduction
+        plateau_factor -- factor of a learning rate reduction
+        max_reductions -- maximal number of learning rate reductions. None: unlimited
+        """
+        if mode not in (MODE_MIN, MODE_MAX):
+            raise AttributeError('Unknown mode {0}. Use {1} or {2}.'.format(mode, MODE_MIN, MODE_MAX))
+        if not 0 < plateau_factor < 1:
+            raise AttributeError('plateau_factor has to be in (0, 1). Got {0}.'.format(plateau_factor))
+        self.patience = patience
+        self.min_delta = abs(min_delta)
+        self.mode = mode
+        self.plateau_patience = plateau_patience
+        self.plateau_factor = plateau_factor
+        self.max_reductions = max_reductions
+        self.reset()
+
+    def reset(self):
+        self.best_value = np.inf if self.mode == MODE_MIN else -np.inf
+        self.best_epoch = -1
+        # epoch of the last improvement or learning rate reduction (start of the current plateau)
+        self.plateau_start = -1
+        self.num_reductions = 0
+
+    def is_improvement(self, value):
+        if self.mode == MODE_MIN:
+            return value < self.best_value - self.min_delta
+        return value > self.best_value + self.min_delta
+
+    def update(self, epoch, value):
+        """ Adds the monitored value of an epoch. Returns True if it improved. """
+        if not self.is_improvement(value):
+            return False
+        self.best_value = value
+        self.best_epoch = epoch
+        self.plateau_start = epoch
+        return True
+
+    def epochs_without_improvement(self, epoch):
+        return epoch - self.best_epoch
+
+    def reduce_learning_rate(self, epoch):
+        """ True if the learning rate should be reduced now (starts a new plateau). """
+        if self.plateau_patience is None or (self.max_reductions is not None and self.num_reductions >= self.max_reductions):
+            return False
+        if epoch - self.plateau_start < self.plateau_patience:
+            return False
+        self.plateau_start = epoch
+        self.num_reductions += 1
+        logger.info('No improvement for {0} epochs. Reducing the learning rate (reduction {1}).'.format(self.epochs_without_improvement(epoch), self.num_reductions))
+        return True
+
+    def should_stop(self, epoch):
+        return self.patience is not None and self.best_epoch >= 0 and self.epochs_without_improvement(epoch) > self.patience
+
+    def get_state(self):
+        return {
+            'best_value': float(self.best_value),
+            'best_epoch': self.best_epoch,
+            'plateau_start': self.plateau_start,
+            'num_reductions': self.num_reductions
+            }
+
+    def set_state(self, state):
+        self.best_value = state['best_value']
+        self.best_epoch = state['best_epoch']
+        self.plateau_start = state['plateau_start']
+        self.num_reductions = state['num_reductions']
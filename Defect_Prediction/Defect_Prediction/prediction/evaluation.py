@@ -0,0 +1,125 @@
+import logging
+import numpy as np
+from collections import OrderedDict
+
+
+logger = logging.getLogger('prediction')
+
+DEFAULT_NUM_THRESHOLDS = 200
+# share of the effort (e.g. lines of code) for the cost effectiveness metric (recall at 20% effort)
+DEFAULT_EFFORT_RATIO = 0.2
+
+
+def safe_divide(numerator, denominator):
+    return numerator / denominator if denominator > 0 else 0.0
+
+
+class StreamingEvaluator(object):
+    """
+    Evaluates predictions batch by batch with constant memory.
+
+    A confusion matrix and, for the positive class, score histograms of the positive and negative examples
+    (num_thresholds bins on [0, 1]) are accumulated. The histograms are used for the binned ROC AUC and for the
+    cost effectiveness (share of the defective classes found when inspecting the highest scored classes
+    until effort_ratio of the total effort is spent).
+
+    Usage:
+        evaluator = StreamingEvaluator()
+        for X, y in data_set.iterate_batches(batch_size):
+            evaluator.update(y, probabilities_of(X))
+        metrics = evaluator.result()
+    """
+
+    def __init__(self, num_classes=2, positive_class=1, num_thresholds=DEFAULT_NUM_THRESHOLDS, effort_ratio=DEFAULT_EFFORT_RATIO):
+        if positive_class >= num_classes:
+            raise AttributeError('Positive class {0} does not exist ({1} classes).'.format(positive_class, num_classes))
+        self.num_classes = num_classes
+        self.positive_class = positive_class
+        self.num_thresholds = num_thresholds
+        self.effort_ratio = effort_ratio
+        self.reset()
+
+    def reset(self):
+        self.confusion_matrix = np.zeros((self.num_classes, self.num_classes), dtype=np.int64)
+        self.positive_histogram = np.zeros(self.num_thresholds, dtype=np.int64)
+        self.negative_histogram = np.zeros(self.num_thresholds, dtype=np.int64)
+        self.effort_histogram = np.zeros(self.num_thresholds, dtype=np.float64)
+
+    @property
+    def num_examples(self):
+        return int(self.confusion_matrix.sum())
+
+    def update(self, y_true, probabilities, effort=None):
+        """
+        Adds a batch.
+
+        Keyword arguments:
+        y_true -- labels [batch_size] or one hot targets [batch_size, num_classes]
+        probabilities -- predicted class probabilities [batch_size, num_classes]
+        effort -- effort to inspect each example (e.g. lines of code). Default: 1 per example
+        """
+        y_true = np.asarray(y_true)
+        if y_true.ndim == 2:
+            y_true = np.argmax(y_true, axis=1)
+        probabilities = np.asarray(probabilities)
+        y_predicted = np.argmax(probabilities, axis=1)
+
+        self.confusion_matrix += np.bincount(y_true * self.num_classes + y_predicted, minlength=self.num_classes ** 2).reshape(self.num_classes, self.num_classes)
+
+        # score bins of the positive class
+        scores = probabilities[:, self.positive_class]
+        bins = np.clip((scores * self.num_thresholds).astype(np.int64), 0, self.num_thresholds - 1)
+        is_positive = y_true == self.positive_class
+        self.positive_histogram += np.bincount(bins[is_positive], minlength=self.num_thresholds)
+        self.negative_histogram += np.bincount(bins[~is_positive], minlength=self.num_thresholds)
+        self.effort_histogram += np.bincount(bins, weights=np.ones(len(bins)) if effort is None else np.asarray(effort, dtype=np.float64), minlength=self.num_thresholds)
+
+    def auc(self):
+        """ Area under the ROC curve (trapezoids over the score bins, highest scores first). """
+        num_positives = self.positive_histogram.sum()
+        num_negatives = self.negative_histogram.sum()
+        if num_positives == 0 or num_negatives == 0:
+            return None
+        tpr = np.concatenate(([0.0], np.cumsum(self.positive_histogram[::-1]) / num_positives))
+        fpr = np.concatenate(([0.0], np.cumsum(self.negative_histogram[::-1]) / num_negatives))
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    def cost_effectiveness(self, effort_ratio=None):
+        """ Recall of the positive class after inspecting the highest scored examples that need effort_ratio of the total effort. """
+        effort_ratio = self.effort_ratio if effort_ratio is None else effort_ratio
+        num_positives = self.positive_histogram.sum()
+        total_effort = self.effort_histogram.sum()
+        if num_positives == 0 or total_effort == 0:
+            return None
+        # examples inside a bin are assumed to be spread evenly -> linear interpolation
+        cumulative_effort = np.concatenate(([0.0], np.cumsum(self.effort_histogram[::-1]) / total_effort))
+        cumulative_recall = np.concatenate(([0.0], np.cumsum(self.positive_histogram[::-1]) / num_positives))
+        return float(np.interp(effort_ratio, cumulative_effort, cumulative_recall))
+
+    def result(self):
+        """ Returns accuracy, precision, recall, f1 (positive class), auc, cost effectiveness and the confusion matrix. """
+        tp = self.confusion_matrix[self.positive_class, self.positive_class]
+        fp = self.confusion_matrix[:, self.positive_class].sum() - tp
+        fn = self.confusion_matrix[self.positive_class, :].sum() - tp
+        precision = safe_divide(tp, tp + fp)
+        recall = safe_divide(tp, tp + fn)
+
+        return OrderedDict([
+            ('num_examples', self.num_examples),
+            ('accuracy', safe_divide(np.trace(self.confusion_matrix), self.num_examples)),
+            ('precision', float(precision)),
+            ('recall', float(recall)),
+            ('f1', float(safe_divide(2 * precision * recall, precision + recall))),
+            ('auc', self.auc()),
+            ('cost_effectiveness', self.cost_effectiveness()),
+            ('confusion_matrix', self.confusion_matrix.tolist())
+            ])
+
+    def log_result(self, name=''):
+        result = self.result()
+        logger.info('Evaluation {0}: {1} examples'.format(name, result['num_examples']))
+        for metric in ['accuracy', 'precision', 'recall', 'f1', 'auc', 'cost_effectiveness']:
+            value = result[metric]
+            logger.info('\t{0:<20} {1}'.format(metric, '{0:.5f}'.format(value) if value is not None else '-'))
+        logger.info('\tconfusion matrix     {0}'.format(result['confusion_matrix']))
+        return result
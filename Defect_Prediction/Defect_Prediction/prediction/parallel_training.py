@@ -0,0 +1,305 @@
+# python imports
+import os
+import time
+import logging
+import multiprocessing
+from collections import OrderedDict
+
+# lib imports
+import tensorflow as tf
+import numpy as np
+
+#project imports
+from data_io.test_data import DataSet, SAMPLING_NONE
+from prediction.tf_model import get_placeholders, inference, loss, architecture_from_config, get_epoch_size, to_dense_feed, TF_RANDOM_SEED, TF_CHECKPOINT_NAME
+
+
+logger = logging.getLogger('prediction')
+
+# keep probability of the dropout layers during training (same as TensorFlowNet.run_training)
+TRAIN_KEEP_PROB = 0.6
+
+
+def build_model_graph(config):
+    """
+    Builds the placeholders, the model and the loss of a net config (see TensorFlowNet.get_config) inside the default graph.
+    The graph is built the same way as in TensorFlowNet.run_training, so the variable names match between processes and checkpoints.
+
+    Returns:
+    (global_step_tensor, features_pl, targets_pl, keep_prob_pl, targets_tensor, logit_tensor, loss_tensor)
+    """
+    # created before the layers (same as in run_training)
+    global_step_tensor = tf.Variable(0, trainable=False, name='global_step')
+
+    features_pl, targets_pl, keep_prob_pl = get_placeholders(config['input_shape'], config['batch_size'], config['num_classes'])
+    targets_tensor = targets_pl
+    if config['one_hot']:
+        targets_tensor = tf.one_hot(tf.cast(targets_pl, tf.int32, name='targets_pl_cast'), config['num_classes'], on_value=1, off_value=0, name='targets_pl_one_hot_conv')
+
+    logit_tensor = inference(config['input_shape'], config['num_classes'], architecture_from_config(config['architecture_shape']), features_pl, keep_prob_pl)
+    loss_tensor = loss(logit_tensor, targets_tensor)
+    return global_step_tensor, features_pl, targets_pl, keep_prob_pl, targets_tensor, logit_tensor, loss_tensor
+
+def get_targets_feed_tensor(targets, targets_pl, targets_tensor):
+    # one hot targets are fed into the converted tensor (same as TensorFlowNet.run_training), labels into the placeholder
+    return targets_tensor if np.ndim(targets) == 2 else targets_pl
+
+def worker_main(worker_index, config, features, targets, connection, num_threads=1):
+    """
+    Gradient worker process. Receives the current weights, computes the gradients of one batch of its shard and sends them back.
+
+    Messages (parent -> worker):
+    ('step', weights, batch_size) -> (gradients, loss, batch_size)
+    ('stop',)
+    """
+    data_set = DataSet(features, targets, 'Shard{0}'.format(worker_index), one_hot=False, sampling=config.get('sampling', SAMPLING_NONE))
+
+    with tf.Graph().as_default():
+        tf.set_random_seed(TF_RANDOM_SEED + worker_index)
+        _, features_pl, targets_pl, keep_prob_pl, targets_tensor, _, loss_tensor = build_model_graph(config)
+        targets_feed_tensor = get_targets_feed_tensor(targets, targets_pl, targets_tensor)
+
+        variables = tf.trainable_variables()
+        gradient_tensors = tf.gradients(loss_tensor, variables)
+
+        # weights of the parent are assigned through placeholders before every step
+        weight_pls = [tf.placeholder(variable.dtype.base_dtype, shape=variable.get_shape()) for variable in variables]
+        assign_op = tf.group(*[variable.assign(weight_pl) for variable, weight_pl in zip(variables, weight_pls)])
+
+        # every worker uses only a few threads. The parallelism comes from the number of workers.
+        session_config = tf.ConfigProto(intra_op_parallelism_threads=num_threads, inter_op_parallelism_threads=num_threads)
+        sess = tf.Session(config=session_config)
+        sess.run(tf.global_variables_initializer())
+
+        while True:
+            message = connection.recv()
+            if message[0] == 'stop':
+                break
+
+            _, weights, batch_size = message
+            sess.run(assign_op, feed_dict=dict(zip(weight_pls, weights)))
+
+            X, y = data_set.next_batch(batch_size)
+            feed_dict = {
+                features_pl: to_dense_feed(X, config['reshape_input_to'], config['input_is_image']),
+                targets_feed_tensor: y,
+                keep_prob_pl: TRAIN_KEEP_PROB
+                }
+            gradients, loss_value = sess.run([gradient_tensors, loss_tensor], feed_dict=feed_dict)
+            connection.send((gradients, loss_value, len(y)))
+
+        sess.close()
+    connection.close()
+
+
+class DataParallelTrainer(object):
+    """
+    Synchronous data parallel training of a TensorFlowNet on a single machine.
+
+    The train set is split into num_workers shards. Each worker process computes the gradients of a batch of its shard
+    (batch_size / num_workers examples). The parent process acts as parameter server: it averages the gradients
+    (weighted by the batch sizes), applies them with the same optimizer and learning rate decay as
+    TensorFlowNet.get_train_op and sends the new weights with the next step.
+
+    Early stopping and model selection use the net's early stopper: the monitored loss is the validation loss
+    (the test loss if the net has no validation set). After training the model with the lowest monitored loss
+    is restored into the net, so net.predict can be used.
+    """
+
+    def __init__(self, net, num_workers=None, threads_per_worker=1):
+        """
+        Keyword arguments:
+        net -- TensorFlowNet with train and test data set (the net is not trained by itself)
+        num_workers -- number of worker processes. Default: number of cpus
+        threads_per_worker -- tensorflow intra / inter op threads of each worker
+        """
+        self.net = net
+        self.num_workers = num_workers if num_workers is not None else multiprocessing.cpu_count()
+        self.threads_per_worker = threads_per_worker
+
+        self.worker_batch_size = net.batch_size // self.num_workers
+        if self.worker_batch_size == 0:
+            raise AttributeError('Batch size {0} is smaller than the number of workers ({1}).'.format(net.batch_size, self.num_workers))
+        if net.train.num_examples // self.num_workers < self.worker_batch_size:
+            raise AttributeError('Shards of {0} examples are smaller than the worker batch size ({1}).'.format(net.train.num_examples // self.num_workers, self.worker_batch_size))
+
+        # one entry per epoch: epoch, train_loss, test_loss, test_accuracy, duration, examples_per_second
+        self.history = []
+        self.num_trained_examples = 0
+        self.training_time = 0.0
+
+    def __start_workers(self, config):
+        # spawn: tensorflow sessions are not fork safe
+        context = multiprocessing.get_context('spawn')
+        shards = np.array_split(np.arange(self.net.train.num_examples), self.num_workers)
+        features, targets = self.net.train.features, self.net.train.targets
+
+        workers = []
+        for worker_index, shard in enumerate(shards):
+            parent_connection, worker_connection = context.Pipe()
+            process = context.Process(target=worker_main, args=(worker_index, config, features[shard], targets[shard], worker_connection, self.threads_per_worker), daemon=True)
+            process.start()
+            workers.append((process, parent_connection))
+        logger.info('Started {0} training workers (shard size: {1} - batch size per worker: {2}).'.format(self.num_workers, len(shards[0]), self.worker_batch_size))
+        return workers
+
+    def __stop_workers(self, workers):
+        for process, connection in workers:
+            try:
+                connection.send(('stop',))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process, connection in workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+
+    def run_training(self):
+        net = self.net
+        # the shards are sampled like the train data set
+        config = dict(net.get_config(), one_hot=net.one_hot, sampling=getattr(net.train, 'sampling', SAMPLING_NONE))
+        steps_per_epoch = get_epoch_size(net.train) // net.batch_size
+
+        graph = tf.Graph()
+        with graph.as_default():
+            tf.set_random_seed(TF_RANDOM_SEED)
+            global_step_tensor, features_pl, targets_pl, keep_prob_pl, targets_tensor, logit_tensor, loss_tensor = build_model_graph(config)
+            probabilities_tensor = tf.nn.softmax(logit_tensor, name='probabilities')
+
+            # same learning rate decay and optimizer as TensorFlowNet.get_train_op. The gradients come from the workers.
+            variables = tf.trainable_variables()
+            gradient_pls = [tf.placeholder(variable.dtype.base_dtype, shape=variable.get_shape()) for variable in variables]
+            learning_rate = tf.train.exponential_decay(net.initial_learning_rate,
+                                                       global_step_tensor,
+                                                       int(steps_per_epoch * net.num_epochs_per_decay),
+                                                       net.learning_rate_decay_factor,
+                                                       staircase=True,
+                                                       name='learning_rate_decay')
+            net.learning_rate_scale = tf.Variable(1.0, trainable=False, name='learning_rate_scale')
+            learning_rate = tf.multiply(learning_rate, net.learning_rate_scale, name='learning_rate')
+            apply_op = tf.train.AdamOptimizer(learning_rate).apply_gradients(zip(gradient_pls, variables), global_step=global_step_tensor)
+
+            saver = tf.train.Saver(write_version=tf.train.SaverDef.V2)
+            sess = tf.Session(graph=graph)
+            sess.run(tf.global_variables_initializer())
+        # the learning rate is reduced on plateaus through the net (see TensorFlowNet.reduce_learning_rate)
+        net.sess = sess
+
+        # the test and validation sets are evaluated batch wise through the net (see TensorFlowNet.stream_evaluation)
+        net.probabilities = probabilities_tensor
+        net.features_pl = features_pl
+        net.keep_prob_pl = keep_prob_pl
+
+        net.save_config()
+        checkpoint_file = os.path.join(net.log_dir, TF_CHECKPOINT_NAME)
+
+        workers = self.__start_workers(config)
+        try:
+            for epoch in range(net.max_epochs):
+                epoch_start_time = time.perf_counter()
+                epoch_loss = 0.0
+                for step in range(steps_per_epoch):
+                    weights = sess.run(variables)
+                    for _, connection in workers:
+                        connection.send(('step', weights, self.worker_batch_size))
+
+                    # synchronous averaging (weighted by the number of examples of each worker)
+                    results = [connection.recv() for _, connection in workers]
+                    num_examples = sum(batch_size for _, _, batch_size in results)
+                    averaged_gradients = [sum(gradients[i] * batch_size for gradients, _, batch_size in results) / num_examples for i in range(len(variables))]
+                    sess.run(apply_op, feed_dict=dict(zip(gradient_pls, averaged_gradients)))
+
+                    step_loss = sum(loss_value * batch_size for _, loss_value, batch_size in results) / num_examples
+                    assert not np.isnan(step_loss), 'Model diverged with loss = NaN'
+                    epoch_loss += step_loss
+                    self.num_trained_examples += num_examples
+                    net.global_step += 1
+
+                duration = time.perf_counter() - epoch_start_time
+                self.training_time += duration
+                test_result, test_loss_value = net.stream_evaluation(net.test, loss_tensor=loss_tensor, targets_pl=get_targets_feed_tensor(net.test.targets, targets_pl, targets_tensor))
+                test_accuracy_value = test_result['accuracy']
+                train_loss_value = epoch_loss / max(steps_per_epoch, 1)
+                self.history.append(OrderedDict([
+                    ('epoch', epoch),
+                    ('train_loss', float(train_loss_value)),
+                    ('test_loss', float(test_loss_value)),
+                    ('test_accuracy', float(test_accuracy_value)),
+                    ('duration', duration),
+                    ('examples_per_second', steps_per_epoch * self.worker_batch_size * self.num_workers / duration if duration > 0 else None)
+                    ]))
+                logger.info('Epoch {0}\tTrain Loss: {1:.5f}\tTest Loss: {2:.5f}\tTest accuracy: {3:.5f}\t{4:.2f}s'.format(epoch, train_loss_value, test_loss_value, test_accuracy_value, duration))
+
+                # only save checkpoint if the monitored loss (validation set, test set if there is none) improved
+                monitored_loss_value = test_loss_value
+                if net.validation is not None:
+                    _, monitored_loss_value = net.stream_evaluation(net.validation, loss_tensor=loss_tensor, targets_pl=get_targets_feed_tensor(net.validation.targets, targets_pl, targets_tensor))
+                if net.early_stopper.update(epoch, monitored_loss_value):
+                    saver.save(sess, checkpoint_file)
+                if net.early_stopper.reduce_learning_rate(epoch):
+                    net.reduce_learning_rate()
+                early_stopping = net.early_stopper.should_stop(epoch)
+                net.best_train_loss = min(net.best_train_loss, train_loss_value)
+                net.best_test_loss = min(net.best_test_loss, test_loss_value)
+                net.best_test_precission = max(net.best_test_precission, test_accuracy_value)
+                if early_stopping:
+                    logger.info('Early stopping after {0} epochs.'.format(epoch))
+                    break
+        finally:
+            self.__stop_workers(workers)
+
+        # restore the best model and hand the session to the net (net.predict)
+        if os.path.exists(checkpoint_file + '.index'):
+            saver.restore(sess, checkpoint_file)
+        else:
+            logger.error('Could not restore model. No model found.')
+        net.sess = sess
+        net.saver = saver
+        net.model = logit_tensor
+        logger.info('Data parallel training complete. {0} workers - {1:.1f} examples/sec - best test loss: {2:.5f} - best test accuracy: {3:.5f}'.format(self.num_workers, self.examples_per_second, net.best_test_loss, net.best_test_precission))
+        return self.history
+
+    @property
+    def examples_per_second(self):
+        return self.num_trained_examples / self.training_time if self.training_time > 0 else 0.0
+
+
+def compare_with_single_process(create_net, worker_counts=(2, 4), threads_per_worker=1):
+    """
+    Trains the same net with TensorFlowNet.run_training and with DataParallelTrainer for every worker count.
+    Logs and returns the throughput scaling (train step examples/sec) and convergence (best test loss / accuracy).
+
+    Keyword arguments:
+    create_net -- function that returns a new (untrained) TensorFlowNet. Every run needs its own net.
+    worker_counts -- numbers of worker processes to compare
+    """
+    results = OrderedDict()
+
+    net = create_net()
+    net.run_training()
+    train_step = net.profiler.report()['stages']['train_step']
+    results['single_process'] = OrderedDict([
+        ('workers', 1),
+        ('examples_per_second', train_step['items'] / train_step['wall_time'] if train_step['wall_time'] > 0 else 0.0),
+        ('best_test_loss', float(net.best_test_loss)),
+        ('best_test_accuracy', float(net.best_test_precission))
+        ])
+
+    for num_workers in worker_counts:
+        trainer = DataParallelTrainer(create_net(), num_workers, threads_per_worker)
+        trainer.run_training()
+        results['workers_{0}'.format(num_workers)] = OrderedDict([
+            ('workers', num_workers),
+            ('examples_per_second', trainer.examples_per_second),
+            ('best_test_loss', float(trainer.net.best_test_loss)),
+            ('best_test_accuracy', float(trainer.net.best_test_precission))
+            ])
+
+    baseline = results['single_process']['examples_per_second']
+    logger.info('Data parallel training (compared with single process run_training):')
+    for name, result in results.items():
+        speedup = result['examples_per_second'] / baseline if baseline > 0 else 0.0
+        result['speedup'] = speedup
+        logger.info('\t{0:<16} {1:10.1f} examples/sec ({2:5.2f}x)  best test loss: {3:.5f}  best test accuracy: {4:.5f}'.format(name, result['examples_per_second'], speedup, result['best_test_loss'], result['best_test_accuracy']))
+    return results
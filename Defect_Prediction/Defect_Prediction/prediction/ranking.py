@@ -0,0 +1,115 @@
+import csv
+import logging
+import numpy as np
+from collections import OrderedDict
+
+from prediction.evaluation import DEFAULT_EFFORT_RATIO
+
+
+logger = logging.getLogger('prediction')
+
+DEFAULT_TOP_K = (10, 20, 50)
+RANKING_CSV_HEADER = ['rank', 'class', 'score', 'loc', 'risk_density', 'cumulative_loc_ratio']
+
+
+def risk_density(scores, loc):
+    """ Defect risk per line of code. Classes without lines of code count as one line. """
+    return np.asarray(scores, dtype=np.float64) / np.maximum(np.asarray(loc, dtype=np.float64), 1.0)
+
+def rank_by_risk(scores, loc):
+    """
+    Orders the classes for review: highest risk density first.
+    Ties are broken by the higher score, then by the original order (stable).
+
+    Returns:
+    indices of the classes in review order
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    # lexsort sorts by the last key first
+    return np.lexsort((-scores, -risk_density(scores, loc)))
+
+def effort_curve_area(defects, loc, order):
+    """ Area under the curve of the found defects (share) over the spent effort (share of the lines of code) when inspecting the classes in order. """
+    defects = np.asarray(defects, dtype=np.float64)[order]
+    loc = np.maximum(np.asarray(loc, dtype=np.float64), 1.0)[order]
+    effort = np.concatenate(([0.0], np.cumsum(loc) / loc.sum()))
+    found = np.concatenate(([0.0], np.cumsum(defects) / defects.sum()))
+    return float(np.sum(np.diff(effort) * (found[1:] + found[:-1]) / 2))
+
+def popt(defects, loc, order):
+    """
+    Normalized Popt of a review order: 1 - (area(optimal) - area(order)) / (area(optimal) - area(worst)).
+    The optimal order inspects the classes by descending defect density, the worst order by ascending defect density.
+    Returns None if there are no defects.
+    """
+    defects = np.asarray(defects, dtype=np.float64)
+    if len(defects) == 0 or defects.sum() == 0:
+        return None
+    defect_density = risk_density(defects, loc)
+    optimal_area = effort_curve_area(defects, loc, np.lexsort((defects, -defect_density)))
+    worst_area = effort_curve_area(defects, loc, np.lexsort((-defects, defect_density)))
+    if optimal_area == worst_area:
+        return 1.0
+    return 1.0 - (optimal_area - effort_curve_area(defects, loc, order)) / (optimal_area - worst_area)
+
+def top_k(defects, order, k_values=DEFAULT_TOP_K):
+    """ Precision and recall of the defective classes among the first k classes of the order. Returns an OrderedDict: k -> (precision, recall). """
+    is_defective = (np.asarray(defects)[order] > 0).astype(np.int64)
+    found = np.cumsum(is_defective)
+    num_defective = found[-1] if len(found) > 0 else 0
+
+    result = OrderedDict()
+    for k in k_values:
+        k = min(k, len(found))
+        if k == 0:
+            continue
+        result[k] = (found[k - 1] / k, found[k - 1] / num_defective if num_defective > 0 else 0.0)
+    return result
+
+def recall_at_effort(defects, loc, order, effort_ratio=DEFAULT_EFFORT_RATIO):
+    """ Share of the defective classes found after inspecting effort_ratio of the lines of code in order. """
+    is_defective = np.asarray(defects)[order] > 0
+    if is_defective.sum() == 0:
+        return None
+    loc = np.maximum(np.asarray(loc, dtype=np.float64), 1.0)[order]
+    effort = np.cumsum(loc) / loc.sum()
+    # a class counts as inspected if it fits completely into the effort budget
+    return float(is_defective[effort <= effort_ratio + 1e-12].sum() / is_defective.sum())
+
+def ranking_metrics(defects, loc, order, k_values=DEFAULT_TOP_K, effort_ratio=DEFAULT_EFFORT_RATIO):
+    """ Top-k precision / recall, recall at effort_ratio of the lines of code and Popt of a review order. """
+    metrics = OrderedDict()
+    for k, (precision, recall) in top_k(defects, order, k_values).items():
+        metrics['precision@{0}'.format(k)] = float(precision)
+        metrics['recall@{0}'.format(k)] = float(recall)
+    metrics['recall@{0:.0%}loc'.format(effort_ratio)] = recall_at_effort(defects, loc, order, effort_ratio)
+    metrics['popt'] = popt(defects, loc, order)
+    return metrics
+
+def log_ranking_metrics(metrics, name=''):
+    logger.info('Ranking {0}:'.format(name))
+    for metric, value in metrics.items():
+        logger.info('\t{0:<20} {1}'.format(metric, '{0:.5f}'.format(value) if value is not None else '-'))
+
+def write_ranking_csv(file_name, class_names, scores, loc, order, defects=None):
+    """
+    Writes the classes in review order.
+    Columns: rank, class, score, loc, risk_density, cumulative_loc_ratio (and bugs if defects are given).
+    """
+    scores = np.asarray(scores, dtype=np.float64)[order]
+    loc = np.asarray(loc)[order]
+    densities = risk_density(scores, loc)
+    cumulative_loc = np.cumsum(np.maximum(loc, 1)) / max(np.maximum(loc, 1).sum(), 1)
+    ordered_names = [class_names[i] for i in order]
+
+    header = RANKING_CSV_HEADER + (['bugs'] if defects is not None else [])
+    columns = [range(1, len(order) + 1), ordered_names, ['{0:.6f}'.format(score) for score in scores], loc.tolist(),
+               ['{0:.8f}'.format(density) for density in densities], ['{0:.4f}'.format(ratio) for ratio in cumulative_loc]]
+    if defects is not None:
+        columns.append(np.asarray(defects)[order].tolist())
+
+    with open(file_name, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter=',')
+        writer.writerow(header)
+        writer.writerows(zip(*columns))
+    logger.debug('Wrote ranking of {0} classes to {1}.'.format(len(order), file_name))
@@ -8,14 +8,22 @@ import sys
 import logging
 from enum import Enum
 import errno
+import json
+import pickle
 
 # lib imports
 import tensorflow as tf
 import numpy as np
+from scipy.sparse import issparse
 import colorama
 
 #project imports
 from helper import colored_shell_seq, create_dir_if_necessary, TF_LAYER, get_unique_layer_name, tensor_shape_to_list, check_if_dir_exists
+from misc.profiling import StageProfiler
+from prediction.checkpoint_writer import AsyncCheckpointWriter, snapshot_variables, restore_variables, load_snapshot
+from prediction.evaluation import StreamingEvaluator
+from prediction.early_stopping import EarlyStopping
+from data_io.code_image import expand_code_images
 
 
 logger = logging.getLogger('prediction')
@@ -28,6 +36,20 @@ TF_LOG_CREATE_SUB_DIR = True
 TF_LOG_DIR = os.path.join(os.getcwd(), 'log', 'tensorflow')
 SUMMARY_EVERY_X_EPOCHS = 1
 
+# machine readable per epoch timings (json lines) inside the model log dir
+TF_TIMING_LOG_FILE = 'timing.jsonl'
+TRAINING_PHASES = ['feed', 'train_step', 'summaries', 'eval', 'save']
+
+# architecture and input shapes of a model (json) inside the model log dir. Used to rebuild the graph for scoring.
+TF_MODEL_CONFIG_FILE = 'model_config.json'
+TF_CHECKPOINT_NAME = 'model'
+
+# periodic checkpoints to resume training (all variables incl. optimizer state). TF_CHECKPOINT_NAME is the best model.
+TF_LATEST_CHECKPOINT_NAME = 'latest'
+TF_LATEST_CHECKPOINT_STATE_FILE = 'checkpoint_latest'
+# epoch, best values and data set positions of the latest checkpoint
+TF_TRAINING_STATE_FILE = 'training_state.pickle'
+
 TF_CONV2D_PADDING_DEFAULT = 'SAME'
 TF_MAXPOOLING_PADDING_DEFAULT = 'SAME'
 TF_NORM_DR_DEFAULT = 5
@@ -54,25 +76,40 @@ def get_placeholders(X_feature_vector_length, batch_size, num_classes):
     return input_features_placeholders, targets_placeholder, keep_prob_placeholder
 
 
-def fill_feed_dict(data_set, features_placeholders, targets_placeholders, keep_prob_placeholder, keep_prob, batch_size, shuffle=True, reshape_into=None):
+def get_epoch_size(data_set):
+    # examples per epoch. Over- and undersampling data sets (see data_io.test_data.SAMPLING_MODES) differ from num_examples
+    return getattr(data_set, 'epoch_size', data_set.num_examples)
+
+def to_dense_feed(X, reshape_into=None, code_image=False):
+    # sparse features (e.g. bag of tokens) are only densified batch wise
+    if issparse(X):
+        X = X.toarray()
+    # same for the compact uint8 / uint16 code images (set explicitly: token matrices can be unsigned as well)
+    elif code_image:
+        X = expand_code_images(X)
+    if reshape_into is not None:
+        X = X.reshape(reshape_into)
+    return X
+
+def fill_feed_dict(data_set, features_placeholders, targets_placeholders, keep_prob_placeholder, keep_prob, batch_size, shuffle=True, reshape_into=None, code_image=False):
     try:
-        features_feed, targets_feed = data_set.next_batch(batch_size, shuffle=shuffle)
-    except:
+        features_feed, targets_feed = data_set.next_batch(batch_size, shuffle_data=shuffle)
+    except TypeError:
         # in case this is a tf dataset
         features_feed, targets_feed = data_set.next_batch(batch_size)
 
-    # reshape if necessary
-    if reshape_into is not None:
-        features_feed = features_feed.reshape(reshape_into)
-
     feed_dict = {
-        features_placeholders: features_feed,
+        features_placeholders: to_dense_feed(features_feed, reshape_into, code_image),
         targets_placeholders: targets_feed,
         keep_prob_placeholder: keep_prob
     }
     return feed_dict
 
 
+def scalar_summary(values):
+    """ Summary protobuf of (tag, value) pairs computed outside of the graph (e.g. streamed test metrics). None values are skipped. """
+    return tf.Summary(value=[tf.Summary.Value(tag=tag, simple_value=float(value)) for tag, value in values if value is not None])
+
 def get_dense_layer(input_tensor, input_dimension, output_dimension, name=None, create_summary=True):
     if name is None:
         name = get_unique_layer_name(TF_LAYER.Dense)
@@ -139,7 +176,7 @@ def get_convolutional_layer(input_tensor, kernel_shape, strides, padding, use_gp
                             use_gpu,
                             name=name + '_conv')
         biases = get_bias_variable(kernel_shape[-1]) # this would be out_channels
-        convolutional_tensor = tf.nn.relu(conv, name=scope.name)
+        convolutional_tensor = tf.nn.relu(tf.nn.bias_add(conv, biases), name=scope.name)
         
         if create_summary:
             # convert the kernels to a grid form to save space in Tensorboard
@@ -210,10 +247,10 @@ def inference(input_shape, output_shape, architecture, features_pl, keep_prob_pl
             if type == TF_LAYER.Dense:
                 logger.info('\t\tDense-Layer {0}:'.format(name))
                 logger.info('\t\t\t--> Input: {0}'.format(predecessor_shape))
-                # Do we need to change the input dimension?
+                # Do we need to change the input dimension? (flatten the output of convolutional / pooling layers)
                 if len(predecessor_shape) > 2:
-                    predecessor_shape = predecessor_shape[1] * predecessor_shape[2] * predecessor_shape[3]
-                    predecessor_tensor = tf.reshape(predecessor_tensor, [-1, predecessor_shape])
+                    predecessor_shape = [-1, int(np.prod(predecessor_shape[1:]))]
+                    predecessor_tensor = tf.reshape(predecessor_tensor, predecessor_shape)
                     logger.info('\t\t\t--> Input (reshaped): {0}'.format(tensor_shape_to_list(predecessor_tensor.get_shape())))
 
                 layer_tensor = get_dense_layer(predecessor_tensor, predecessor_shape, parameters, name)
@@ -284,6 +321,9 @@ def inference(input_shape, output_shape, architecture, features_pl, keep_prob_pl
         with tf.variable_scope('softmax_linear') as scope:
             logger.info('\t\tOutput-Layer softmax_linear:')
             logger.info('\t\t\t--> Input: {0}'.format(predecessor_shape))
+            if len(predecessor_shape) > 2:
+                predecessor_shape = [-1, int(np.prod(predecessor_shape[1:]))]
+                predecessor_tensor = tf.reshape(predecessor_tensor, predecessor_shape)
             
             weights = get_weights_variable(predecessor_shape[1], output_shape)
             biases = get_bias_variable(output_shape)
@@ -341,7 +381,7 @@ def f1_score(logits, targets_pl, one_hot=False):
     if one_hot:
         y_true = tf.arg_max(targets, 1)
     else:
-        y_true = logits
+        y_true = targets
 
     # get true positives (by multiplying the predicted and actual labels we will only get a 1 if both labels are 1)
     tp = tf.count_nonzero(y_predicted * y_true)
@@ -448,11 +488,63 @@ def validate_architecture(architecture):
 
         else:
             raise AttributeError('Architecture contains an invalid layer type.')
+
+
+def architecture_to_config(architecture):
+    """ Replaces the TF_LAYER values by their names (json serializable and picklable). """
+    return [(type.name, name, parameters) for type, name, parameters in architecture]
+
+def architecture_from_config(architecture):
+    return [(TF_LAYER[type], name, parameters) for type, name, parameters in architecture]
+
+def load_model_config(model_dir):
+    """ Loads the model config saved by TensorFlowNet.save_config. Layer types are converted back to TF_LAYER values. """
+    config_path = os.path.join(model_dir, TF_MODEL_CONFIG_FILE)
+    if not os.path.exists(config_path):
+        raise AttributeError('No model config found in {0}.'.format(model_dir))
+    with open(config_path) as f:
+        config = json.load(f)
+    config['architecture_shape'] = architecture_from_config(config['architecture_shape'])
+    return config
                    
 
         
          
 
+def get_epoch_timing(profiler, previous_wall_times, epoch_duration, num_examples):
+    """
+    Computes the time spent in each training phase since the last call.
+
+    Keyword arguments:
+    profiler -- StageProfiler with the training phases
+    previous_wall_times -- dict: phase -> accumulated wall time at the start of the epoch. Will be updated.
+    epoch_duration -- wall time of the epoch
+    num_examples -- number of training examples that were processed in the epoch
+
+    Returns:
+    dict with the phase times, examples per second and stall percentages
+    """
+    phase_times = {}
+    for phase in TRAINING_PHASES:
+        wall_time = profiler.stages[phase]['wall_time'] if phase in profiler.stages else 0.0
+        phase_times[phase] = wall_time - previous_wall_times.get(phase, 0.0)
+        previous_wall_times[phase] = wall_time
+
+    def percent(value):
+        return 100.0 * value / epoch_duration if epoch_duration > 0 else 0.0
+
+    return {
+        'duration': epoch_duration,
+        'phases': phase_times,
+        'examples_per_second': num_examples / phase_times['train_step'] if phase_times['train_step'] > 0 else None,
+        'examples_per_second_overall': num_examples / epoch_duration if epoch_duration > 0 else None,
+        # time the train step waits for the input pipeline
+        'input_stall_percent': percent(phase_times['feed']),
+        # summaries, evaluation and checkpointing
+        'overhead_percent': percent(phase_times['summaries'] + phase_times['eval'] + phase_times['save'])
+        }
+
+
 class TensorFlowNet(object):
     """description of class"""
 
@@ -472,8 +564,26 @@ class TensorFlowNet(object):
                 num_epochs_per_decay=150,
                 learning_rate_decay_factor=0.1,
                 model_name=str(int(time.time())),
-                early_stopping_epochs = 100,
-                calculate_f1_score=False):
+                early_stopping_epochs = 20,
+                calculate_f1_score=False,
+                trace_steps=(),
+                reuse_log_dir=False,
+                checkpoint_every_epochs=10,
+                max_latest_checkpoints=2,
+                checkpoint_min_interval=30.0,
+                keep_best_checkpoints=3,
+                validation_data_set=None,
+                validation_ratio=0.0,
+                early_stopping_min_delta=1e-4,
+                learning_rate_plateau_epochs=None,
+                learning_rate_plateau_factor=0.5,
+                min_learning_rate_scale=1e-3):
+        # early stopping and model selection use a held-out validation set (passed or split off the train set).
+        # Without validation data the test set is monitored.
+        if validation_data_set is None and validation_ratio > 0 and train_data_set is not None:
+            train_data_set, validation_data_set = train_data_set.split(validation_ratio)
+        self.validation = validation_data_set
+
         self.sess = None
         self.saver = None
         self.input_shape = input_shape
@@ -500,7 +610,8 @@ class TensorFlowNet(object):
         self.model_architecture = architecture_shape
 
         self.max_epochs = max_epochs
-        self.steps_per_epoch = train_data_set.num_examples // self.batch_size
+        # nets that are only restored for scoring have no train data set
+        self.steps_per_epoch = get_epoch_size(train_data_set) // self.batch_size if train_data_set is not None else 0
         self.global_step = 0
 
         self.input_is_image = input_is_image
@@ -517,6 +628,9 @@ class TensorFlowNet(object):
         # the last layer of the net used after training for prediction
         self.model = None 
 
+        # softmax of the model (built once with the model, used by predict / predict_proba)
+        self.probabilities = None
+
         # Inputs placeholder
         self.features_pl = None
 
@@ -530,11 +644,40 @@ class TensorFlowNet(object):
         self.last_test_loss_improvement = 0
         self.early_stopping_epochs = early_stopping_epochs
 
+        # patience / min delta on the monitored loss and learning rate reduction on plateaus (see prediction.early_stopping).
+        # The learning rate is scaled down by learning_rate_plateau_factor after learning_rate_plateau_epochs epochs without improvement.
+        self.early_stopper = EarlyStopping(
+            patience=early_stopping_epochs,
+            min_delta=early_stopping_min_delta,
+            plateau_patience=learning_rate_plateau_epochs,
+            plateau_factor=learning_rate_plateau_factor,
+            max_reductions=int(np.floor(np.log(min_learning_rate_scale) / np.log(learning_rate_plateau_factor))) if 0 < learning_rate_plateau_factor < 1 else None)
+        self.learning_rate_scale = None
+
+        # metrics of the best model on the complete test set (see evaluate_data_set)
+        self.test_evaluation = None
+
+        # timings of the training phases (see TRAINING_PHASES). Per epoch values are written to TF_TIMING_LOG_FILE.
+        self.profiler = StageProfiler()
+
+        # global steps for which a full RunMetadata trace is recorded (tensorboard + chrome trace)
+        self.trace_steps = set(trace_steps)
+
+        # latest checkpoint + training state are saved every x epochs (see run_training(resume=True))
+        self.checkpoint_every_epochs = checkpoint_every_epochs
+        self.max_latest_checkpoints = max_latest_checkpoints
+        self.latest_saver = None
+
+        # snapshots of the best model are written in the background (at most one write every checkpoint_min_interval seconds).
+        # The best model is saved as TF_CHECKPOINT_NAME at the end of the training.
+        self.checkpoint_min_interval = checkpoint_min_interval
+        self.keep_best_checkpoints = keep_best_checkpoints
+
         # check if model_name dir already exists
 
         self.model_name = model_name
         self.log_dir = os.path.join(log_dir, model_name)
-        if check_if_dir_exists(self.log_dir):
+        if check_if_dir_exists(self.log_dir) and not reuse_log_dir:
             self.model_name += str(int(time.time()))
             logger.warning('Tensorflow model dir with name {0} already exits. Renaming model to {1}'.format(model_name, self.model_name))
             self.log_dir = os.path.join(log_dir, self.model_name)
@@ -547,10 +690,72 @@ class TensorFlowNet(object):
         
 
     
+    @classmethod
+    def restore(cls, model_dir, checkpoint_name=TF_CHECKPOINT_NAME):
+        """
+        Rebuilds a trained net from its model dir (model config + checkpoint) for scoring.
+        Only the inference graph is built. No data sets are necessary.
+
+        Keyword arguments:
+        model_dir -- log dir of the trained model (contains TF_MODEL_CONFIG_FILE)
+        checkpoint_name -- name of the checkpoint inside model_dir
+        """
+        config = load_model_config(model_dir)
+        net = cls(
+            train_data_set=None,
+            test_data_set=None,
+            num_classes=config['num_classes'],
+            input_shape=config['input_shape'],
+            targets_shape=config['targets_shape'],
+            input_is_image=config['input_is_image'],
+            batch_size=config['batch_size'],
+            reshape_input_to=config['reshape_input_to'],
+            architecture_shape=config['architecture_shape'],
+            log_dir=os.path.dirname(os.path.normpath(model_dir)),
+            model_name=os.path.basename(os.path.normpath(model_dir)),
+            reuse_log_dir=True)
+        net.restore_model(os.path.join(model_dir, checkpoint_name))
+        return net
+
+    def get_config(self):
+        """ Architecture and input shapes (json serializable). Layer types are stored by name. """
+        return {
+            'model_name': self.model_name,
+            'num_classes': int(self.num_classes),
+            'input_shape': [int(dimension) for dimension in self.input_shape],
+            'targets_shape': [int(dimension) for dimension in self.targets_shape],
+            'input_is_image': self.input_is_image,
+            'batch_size': self.batch_size,
+            'reshape_input_to': self.reshape_input_to,
+            'architecture_shape': architecture_to_config(self.model_architecture)
+            }
+
+    def save_config(self):
+        """ Saves the architecture and the input shapes as json (see load_model_config). """
+        with open(os.path.join(self.log_dir, TF_MODEL_CONFIG_FILE), 'w') as f:
+            json.dump(self.get_config(), f, indent=2)
+        logger.debug('Saved model config to {0}.'.format(self.log_dir))
+
+    def restore_model(self, checkpoint_file):
+        """ Builds the inference graph and restores the trained variables from checkpoint_file. """
+        graph = tf.Graph()
+        with graph.as_default():
+            # created before the layers (same as in run_training)
+            tf.Variable(0, trainable=False, name='global_step')
+            self.features_pl, _, self.keep_prob_pl = get_placeholders(self.input_shape, self.batch_size, self.num_classes)
+            self.model = inference(self.input_shape, self.num_classes, self.model_architecture, self.features_pl, self.keep_prob_pl)
+            self.probabilities = tf.nn.softmax(self.model, name='probabilities')
+
+            # only the variables of the inference graph are restored (optimizer slots etc. are ignored)
+            self.saver = tf.train.Saver(write_version=tf.train.SaverDef.V2)
+            self.sess = tf.Session(graph=graph)
+            self.saver.restore(self.sess, checkpoint_file)
+        logger.info('Restored model {0} from {1}.'.format(self.model_name, checkpoint_file))
+
     def get_train_op(self, loss_tensor, global_step):
 
         # decay learning rate based on the number of steps (global_step)
-        num_batches_per_epoch = self.train.num_examples / self.batch_size
+        num_batches_per_epoch = get_epoch_size(self.train) / self.batch_size
         decay_steps = int(num_batches_per_epoch * self.num_epochs_per_decay)
         learning_rate = tf.train.exponential_decay(self.initial_learning_rate,
                                                    global_step,
@@ -558,6 +763,10 @@ class TensorFlowNet(object):
                                                    self.learning_rate_decay_factor,
                                                    staircase=True,
                                                    name='learning_rate_decay')
+
+        # additional factor that is reduced on plateaus of the monitored loss (saved with the checkpoints)
+        self.learning_rate_scale = tf.Variable(1.0, trainable=False, name='learning_rate_scale')
+        learning_rate = tf.multiply(learning_rate, self.learning_rate_scale, name='learning_rate')
         tf.summary.scalar('learning_rate', learning_rate)
 
         optimizer = tf.train.AdamOptimizer(learning_rate)
@@ -573,7 +782,7 @@ class TensorFlowNet(object):
         return train_op
 
     def get_train_op_logistic_regression(self, loss_tensor, global_step):
-        num_batches_per_epoch = self.train.num_examples / self.batch_size
+        num_batches_per_epoch = get_epoch_size(self.train) / self.batch_size
         decay_steps = int(num_batches_per_epoch * self.num_epochs_per_decay)
         learning_rate = tf.train.exponential_decay(self.initial_learning_rate,
                                                    global_step,
@@ -589,21 +798,31 @@ class TensorFlowNet(object):
 
     def do_eval(self, eval_correct_tensor, features_pl, targets_pl, keep_prob_pl, data_set):
 
-        # number of correct predictions
+        # number of correct predictions (all examples, the last batch contains the remainder)
         true_count = 0
-        steps_per_epoch = data_set.num_examples // self.batch_size
-        num_examples = steps_per_epoch * self.batch_size
-        for step in range(steps_per_epoch):
-            feed_dict = fill_feed_dict(data_set, features_pl, targets_pl, keep_prob_pl, 1.0, self.batch_size)
+        num_examples = data_set.num_examples
+        for X, y in data_set.iterate_batches(self.batch_size):
+            feed_dict = {features_pl: to_dense_feed(X, self.reshape_input_to, self.input_is_image), targets_pl: y, keep_prob_pl: 1.0}
             true_count += self.sess.run(eval_correct_tensor, feed_dict=feed_dict)
         precision = true_count / num_examples
         return num_examples, true_count, precision
        
 
-    def run_training(self):
+    def run_training(self, resume=False, warm_start_from=None):
+        """
+        Trains the net and restores the best model (test accuracy) afterwards.
+
+        Keyword arguments:
+        resume -- continue from the latest checkpoint in the log dir (variables, optimizer state, global step, best values and data set positions).
+                  Create the net with the same model_name and reuse_log_dir=True.
+        warm_start_from -- model dir or checkpoint file to initialize the weights with (e.g. the model of the last release).
+                  Only variables with the same name and shape are restored. Optimizer state and global step start from scratch.
+        """
         logger.info('Building NN model. Attributes:')
         logger.info('\tTrain Samples: {0}'.format(self.train.num_examples))
         logger.info('\tTest Samples: {0}'.format(self.test.num_examples))
+        logger.info('\tValidation Samples: {0}'.format(self.validation.num_examples if self.validation is not None else '- (early stopping monitors the test set)'))
+        logger.info('\tEarly stopping: patience {0} - min delta {1} - learning rate plateau {2}'.format(self.early_stopper.patience, self.early_stopper.min_delta, self.early_stopper.plateau_patience))
         logger.info('\tReshape input to {0}'.format(self.reshape_input_to))
         logger.info('\tTargets Shape {0}'.format(self.targets_shape))
         logger.info('\tOne-Hot Targets {0}'.format(self.one_hot))
@@ -655,6 +874,8 @@ class TensorFlowNet(object):
                 raise e
             logger.info('Model was successfully built. Initializing tensorboard logging and training operations.')
             self.model = logit_tensor
+            self.probabilities = tf.nn.softmax(logit_tensor, name='probabilities')
+            self.save_config()
 
             # add loss tensor to graph
             loss_tensor = loss(logit_tensor, targets_pl)
@@ -676,8 +897,9 @@ class TensorFlowNet(object):
             # add variables initializer
             init = tf.global_variables_initializer()
 
-            # initialize model saver
+            # initialize model saver (best model) and the saver of the periodic checkpoints
             self.saver = tf.train.Saver(write_version=tf.train.SaverDef.V2)
+            self.latest_saver = tf.train.Saver(max_to_keep=self.max_latest_checkpoints, write_version=tf.train.SaverDef.V2)
 
             self.sess = tf.Session()
 
@@ -688,6 +910,12 @@ class TensorFlowNet(object):
             # initialize variables
             self.sess.run(init)
 
+            start_epoch = 0
+            if resume:
+                start_epoch = self.restore_training_state()
+            elif warm_start_from is not None:
+                self.warm_start(warm_start_from)
+
             logger.info('Neural Net is initialized and ready to train.')
             print('\n')
             logger.debug('Step (/100)\tLoss\tDuration') 
@@ -702,152 +930,344 @@ class TensorFlowNet(object):
             start_time = time.time()
             average_train_loss = 0  
             early_stopping = False      
-            test_feed_dict = fill_feed_dict(
-                self.test, 
-                features_pl, 
-                targets_pl, 
-                keep_prob_pl, 
-                keep_prob=1.0, 
-                batch_size=self.test.num_examples, 
-                shuffle=False, 
-                reshape_into=self.reshape_input_to)
-
-            for epoch in range(self.max_epochs):                
-
-                for step in range(self.steps_per_epoch):
-                    # fill feed dict with batch
-                    train_feed_dict = fill_feed_dict(
-                        self.train, 
-                        features_pl, 
-                        targets_pl, 
-                        keep_prob_pl, 
-                        keep_prob=0.6, 
-                        batch_size=self.batch_size, 
-                        reshape_into=self.reshape_input_to
-                        )
-
-                    # run the model
-                    # _: result of train_op (is None)
-                    # loss_value: result of loss operation (the actual loss)
-                    train_loss_value = -1
-                    try:                    
-                        _, train_loss_value = self.sess.run(
-                            [train_op, loss_tensor],
-                            feed_dict=train_feed_dict)
-                    except:
-                        logger.exception('Could not run train epoch {0} step {1}. Loss Value: {2}'.format(epoch, self.global_step, train_loss_value))
-
-                    assert not np.isnan(train_loss_value), 'Model diverged with loss = NaN'
-                    average_train_loss += train_loss_value
-                    self.global_step += 1
-
-                    summary_str_train = self.sess.run(summary_tensor, feed_dict=train_feed_dict)
-                    summary_str_test = self.sess.run(summary_tensor, feed_dict=test_feed_dict)
-
-                    summary_writer_train.add_summary(summary_str_train, self.global_step)
-                    summary_writer_train.flush()
-                    summary_writer_test.add_summary(summary_str_test, self.global_step)
-                    summary_writer_test.flush()
-
-                # Write summaries SUMMARY_EVERY_X_EPOCHS.
-                if epoch % SUMMARY_EVERY_X_EPOCHS == 0:
-                    duration = time.time() - start_time
-                    start_time = time.time()    
-
-
-                    # compute detailed stats                    
-                    train_feed_dict = fill_feed_dict(
-                        self.train, 
-                        features_pl, 
-                        targets_pl, 
-                        keep_prob_pl, 
-                        keep_prob=1.0, 
-                        batch_size=self.batch_size, 
-                        shuffle=False, 
-                        reshape_into=self.reshape_input_to)
-
-                    # don't take the average in the first step
-                    if epoch > 0:
-                        average_train_loss /= (self.steps_per_epoch * SUMMARY_EVERY_X_EPOCHS)
-
-                    try:
-                        train_f1_score = test_f1_score = -1
-                        if self.calculate_f1_score:
-                            train_accuracy_value, train_f1_score = self.sess.run([accuracy_tensor, f1_score_tensor], feed_dict=train_feed_dict)
-                            test_accuracy_value, test_loss_value, test_f1_score = self.sess.run([accuracy_tensor, loss_tensor, f1_score_tensor], feed_dict=test_feed_dict)
-                        else:
-                            train_accuracy_value = self.sess.run([accuracy_tensor], feed_dict=train_feed_dict)[0]
-                            test_accuracy_value, test_loss_value = self.sess.run([accuracy_tensor, loss_tensor], feed_dict=test_feed_dict)
-                    except:
-                        logger.exception('Could not compute train- and test accuracy values in epoch {0}, step {1}.'.format(epoch, self.global_step))
-                        train_accuracy_value = test_accuracy_value = -1
-                        train_num_examples, train_true_count, train_precision = self.do_eval(eval_correct, features_pl, targets_pl, keep_prob_pl, self.train)
-                        test_num_examples, test_true_count, test_precision = self.do_eval(eval_correct, features_pl, targets_pl, keep_prob_pl, self.test)
-
-                        logger.debug('Train: Num examples: {0}\tNum correct: {1}\tPrecision: {2:.4f}'.format(train_num_examples, train_true_count, train_precision))
-                        logger.debug('Test: Num examples: {0}\tNum correct: {1}\tPrecision: {2:.4f}'.format(test_num_examples, test_true_count, test_precision))
-                    logger.debug('{0}\t\t{1:.4f}\t{2:.5f}'.format(epoch, train_loss_value, duration))                  
-                                        
-                    # if early stopping is True abort training and write a last summary
-                    early_stopping = self.early_stopping(epoch, test_loss_value)
+            self.profiler.reset()
+            previous_phase_times = {}
+            model_variables = tf.trainable_variables()
+            checkpoint_writer = AsyncCheckpointWriter(self.log_dir, min_interval=self.checkpoint_min_interval, keep_last=self.keep_best_checkpoints)
 
+            timing_log = open(os.path.join(self.log_dir, TF_TIMING_LOG_FILE), 'a')
+            try:
+                for epoch in range(start_epoch, self.max_epochs):                
+                    epoch_start_time = time.perf_counter()
+
+                    for step in range(self.steps_per_epoch):
+                        # fill feed dict with batch
+                        with self.profiler.stage('feed', items=self.batch_size):
+                            train_feed_dict = fill_feed_dict(
+                                self.train, 
+                                features_pl, 
+                                targets_pl, 
+                                keep_prob_pl, 
+                                keep_prob=0.6, 
+                                batch_size=self.batch_size, 
+                                reshape_into=self.reshape_input_to,
+                                code_image=self.input_is_image
+                                )
+
+                        # run the model
+                        # _: result of train_op (is None)
+                        # loss_value: result of loss operation (the actual loss)
+                        train_loss_value = -1
+                        with self.profiler.stage('train_step', items=self.batch_size):
+                            try:                    
+                                if self.global_step in self.trace_steps:
+                                    train_loss_value = self.run_traced_train_step(train_op, loss_tensor, train_feed_dict, summary_writer_train)
+                                else:
+                                    _, train_loss_value = self.sess.run(
+                                        [train_op, loss_tensor],
+                                        feed_dict=train_feed_dict)
+                            except:
+                                logger.exception('Could not run train epoch {0} step {1}. Loss Value: {2}'.format(epoch, self.global_step, train_loss_value))
+
+                        assert not np.isnan(train_loss_value), 'Model diverged with loss = NaN'
+                        average_train_loss += train_loss_value
+                        self.global_step += 1
+
+                        with self.profiler.stage('summaries'):
+                            summary_str_train = self.sess.run(summary_tensor, feed_dict=train_feed_dict)
+                            summary_writer_train.add_summary(summary_str_train, self.global_step)
+                            summary_writer_train.flush()
+
+                    # Write summaries SUMMARY_EVERY_X_EPOCHS.
+                    if epoch % SUMMARY_EVERY_X_EPOCHS == 0:
+                        duration = time.time() - start_time
+                        start_time = time.time()    
+
+
+                        with self.profiler.stage('eval'):
+                            # compute detailed stats                    
+                            train_feed_dict = fill_feed_dict(
+                                self.train, 
+                                features_pl, 
+                                targets_pl, 
+                                keep_prob_pl, 
+                                keep_prob=1.0, 
+                                batch_size=self.batch_size, 
+                                shuffle=False, 
+                                reshape_into=self.reshape_input_to,
+                                code_image=self.input_is_image)
+
+                            # don't take the average in the first step
+                            if epoch > 0:
+                                average_train_loss /= (self.steps_per_epoch * SUMMARY_EVERY_X_EPOCHS)
+
+                            try:
+                                train_f1_score = test_f1_score = -1
+                                if self.calculate_f1_score:
+                                    train_accuracy_value, train_f1_score = self.sess.run([accuracy_tensor, f1_score_tensor], feed_dict=train_feed_dict)
+                                else:
+                                    train_accuracy_value = self.sess.run([accuracy_tensor], feed_dict=train_feed_dict)[0]
+                                # the test set is streamed in batches (constant memory, see prediction.evaluation.StreamingEvaluator)
+                                test_result, test_loss_value = self.stream_evaluation(self.test, loss_tensor=loss_tensor, targets_pl=targets_pl)
+                                test_accuracy_value = test_result['accuracy']
+                                if self.calculate_f1_score:
+                                    test_f1_score = test_result['f1']
+                                summary_writer_test.add_summary(scalar_summary([('loss', test_loss_value), ('accuracy', test_accuracy_value), ('f1', test_result['f1'])]), self.global_step)
+                                summary_writer_test.flush()
+                            except:
+                                logger.exception('Could not compute train- and test accuracy values in epoch {0}, step {1}.'.format(epoch, self.global_step))
+                                train_accuracy_value = test_accuracy_value = -1
+                                train_num_examples, train_true_count, train_precision = self.do_eval(eval_correct, features_pl, targets_pl, keep_prob_pl, self.train)
+                                test_num_examples, test_true_count, test_precision = self.do_eval(eval_correct, features_pl, targets_pl, keep_prob_pl, self.test)
+
+                                logger.debug('Train: Num examples: {0}\tNum correct: {1}\tPrecision: {2:.4f}'.format(train_num_examples, train_true_count, train_precision))
+                                logger.debug('Test: Num examples: {0}\tNum correct: {1}\tPrecision: {2:.4f}'.format(test_num_examples, test_true_count, test_precision))
+                            logger.debug('{0}\t\t{1:.4f}\t{2:.5f}'.format(epoch, train_loss_value, duration))                  
+                                        
+                        # monitored loss: validation set (test set if there is no validation set)
+                        monitored_loss_value = test_loss_value
+                        if self.validation is not None:
+                            with self.profiler.stage('eval'):
+                                _, monitored_loss_value = self.stream_evaluation(self.validation, loss_tensor=loss_tensor, targets_pl=targets_pl)
+
+                        # only save checkpoint if the monitored loss improved. The snapshot is taken in memory and written in the background.
+                        if self.early_stopper.update(epoch, monitored_loss_value):
+                            with self.profiler.stage('save'):
+                                try:
+                                    checkpoint_writer.submit(self.global_step, snapshot_variables(self.sess, model_variables), {'epoch': epoch, 'monitored_loss': float(monitored_loss_value), 'test_accuracy': float(test_accuracy_value), 'test_loss': float(test_loss_value)})
+                                except:
+                                    logger.exception('Could not save model.')
+                        if self.early_stopper.reduce_learning_rate(epoch):
+                            self.reduce_learning_rate()
+
+                        # if early stopping is True abort training and write a last summary
+                        early_stopping = self.early_stopper.should_stop(epoch)
+
+                        self.print_step_summary_and_update_best_values(epoch, average_train_loss, train_accuracy_value, test_loss_value, test_accuracy_value, duration, train_f1_score, test_f1_score, colored=True)
                     
-                    # only save checkpoint if the test loss improved
-                    if test_accuracy_value > self.best_test_precission:
-                        checkpoint_file = os.path.join(self.log_dir, 'model')                    
-                        try:
-                            self.save_model(checkpoint_file, step)
-                        except:
-                            logger.exception('Could not save model.')
-
-                    self.print_step_summary_and_update_best_values(epoch, average_train_loss, train_accuracy_value, test_loss_value, test_accuracy_value, duration, train_f1_score, test_f1_score, colored=True)
-                    
-                    average_train_loss = 0
+                        average_train_loss = 0
+
+                    # machine readable timings of this epoch
+                    epoch_timing = get_epoch_timing(self.profiler, previous_phase_times, time.perf_counter() - epoch_start_time, self.steps_per_epoch * self.batch_size)
+                    epoch_timing['epoch'] = epoch
+                    epoch_timing['global_step'] = self.global_step
+                    timing_log.write(json.dumps(epoch_timing) + '\n')
+                    timing_log.flush()
+
+                    if (epoch + 1) % self.checkpoint_every_epochs == 0 or early_stopping or epoch == self.max_epochs - 1:
+                        with self.profiler.stage('save'):
+                            self.save_training_state(epoch)
 
                     if early_stopping:
                         print('-----\n\n')
                         logger.info('Early stopping after {0} steps.'.format(epoch))                    
                         break
+            finally:
+                # also closed if the training aborts (e.g. diverged loss or interrupt).
+                # Closing the writer writes the pending (rate limited) best snapshot.
+                timing_log.close()
+                best_snapshot, best_metadata = checkpoint_writer.close()
 
+            self.log_training_timing()
             logger.info('Training complete.')
             logger.info('Restoring best model.') 
             
 
-            # Restore best model
-            ckpt = tf.train.get_checkpoint_state(os.path.join(self.log_dir, 'model'))
-            self.saver.restore(self.sess, os.path.join(self.log_dir, 'model'))
-            #if ckpt and ckpt.model_checkpoint_path:
-            #    print('..')
-            #else:
-            #    logger.error('Could not restore model. No model found.')
+            # Restore best model (in memory snapshot) and save it as checkpoint for scoring
+            if best_snapshot is not None:
+                restore_variables(self.sess, model_variables, best_snapshot)
+                logger.info('Restored best model of epoch {0} (global step {1}).'.format(best_metadata['epoch'], best_metadata['step']))
+            elif resume and self.restore_best_snapshot(model_variables):
+                # no improvement after resuming: the best snapshot of the previous run is still valid (the model checkpoint is only written at the end of a run)
+                pass
+            elif resume and os.path.exists(os.path.join(self.log_dir, TF_CHECKPOINT_NAME + '.index')):
+                self.saver.restore(self.sess, os.path.join(self.log_dir, TF_CHECKPOINT_NAME))
+            else:
+                logger.error('Could not restore model. No model found.')
+            self.save_model(os.path.join(self.log_dir, TF_CHECKPOINT_NAME), self.global_step)
+
+            self.test_evaluation = self.evaluate_data_set(self.test)
 
             logger.info('Best Losses: Train {0:.5f} - Test: {1:.5f}'.format(self.best_train_loss, self.best_test_loss)) 
             logger.info('Best Precisions: Train {0:.5f} - Test: {1:.5f}'.format(self.best_train_precission, self.best_test_precission)) 
 
 
-    def model_improved(self, test_loss_value):
-        return test_loss_value < self.best_test_loss
-
-    def early_stopping(self, epoch, test_loss):
-        if not self.model_improved(test_loss):
-            # when did the model last improve?
-            improvement = epoch - self.last_test_loss_improvement
-            if improvement > self.early_stopping_epochs:
-                return True
-        return False
+    def save_training_state(self, epoch):
+        """ Saves a checkpoint with all variables (incl. optimizer state) and the training state sidecar to resume from. """
+        checkpoint_file = self.latest_saver.save(self.sess, os.path.join(self.log_dir, TF_LATEST_CHECKPOINT_NAME), global_step=self.global_step, latest_filename=TF_LATEST_CHECKPOINT_STATE_FILE)
+        state = {
+            'checkpoint': os.path.basename(checkpoint_file),
+            'epoch': epoch,
+            'global_step': self.global_step,
+            'best_train_loss': self.best_train_loss,
+            'best_train_precission': self.best_train_precission,
+            'best_test_loss': self.best_test_loss,
+            'best_test_precission': self.best_test_precission,
+            'best_train_f1': self.best_train_f1,
+            'best_test_f1': self.best_test_f1,
+            'last_test_loss_improvement': self.last_test_loss_improvement,
+            'early_stopping': self.early_stopper.get_state(),
+            'train_data_set': self.train.get_state() if hasattr(self.train, 'get_state') else None
+            }
+
+        # written to a temporary file first. A crash while saving keeps the previous state.
+        state_file = os.path.join(self.log_dir, TF_TRAINING_STATE_FILE)
+        with open(state_file + '.tmp', 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(state_file + '.tmp', state_file)
+        logger.debug('Saved training state of epoch {0} (global step {1}) to {2}.'.format(epoch, self.global_step, checkpoint_file))
+
+    def restore_training_state(self):
+        """ Restores the latest checkpoint and the training state. Returns the epoch to continue with. """
+        state_file = os.path.join(self.log_dir, TF_TRAINING_STATE_FILE)
+        if not os.path.exists(state_file):
+            logger.warning('No training state found in {0}. Training starts from scratch.'.format(self.log_dir))
+            return 0
+        with open(state_file, 'rb') as f:
+            state = pickle.load(f)
+
+        # the sidecar belongs to a specific checkpoint (the checkpoint state file may already point to a newer one if saving was interrupted)
+        checkpoint_file = os.path.join(self.log_dir, state['checkpoint'])
+        self.latest_saver.restore(self.sess, checkpoint_file)
+
+        self.global_step = state['global_step']
+        self.best_train_loss = state['best_train_loss']
+        self.best_train_precission = state['best_train_precission']
+        self.best_test_loss = state['best_test_loss']
+        self.best_test_precission = state['best_test_precission']
+        self.best_train_f1 = state['best_train_f1']
+        self.best_test_f1 = state['best_test_f1']
+        self.last_test_loss_improvement = state['last_test_loss_improvement']
+        if 'early_stopping' in state:
+            self.early_stopper.set_state(state['early_stopping'])
+        if state['train_data_set'] is not None and hasattr(self.train, 'set_state'):
+            self.train.set_state(state['train_data_set'])
+
+        logger.info('Resumed training from {0} (epoch {1}, global step {2}).'.format(checkpoint_file, state['epoch'], self.global_step))
+        return state['epoch'] + 1
+
+    def restore_best_snapshot(self, variables):
+        """ Restores the newest best model snapshot in the log dir (see AsyncCheckpointWriter). Returns False if there is none. """
+        snapshot_files = AsyncCheckpointWriter.list_snapshots(self.log_dir)
+        if len(snapshot_files) == 0:
+            return False
+        snapshot, metadata = load_snapshot(snapshot_files[-1])
+        restore_variables(self.sess, variables, snapshot)
+        logger.info('Restored best model of epoch {0} (global step {1}) from {2}.'.format(metadata.get('epoch'), metadata.get('step'), snapshot_files[-1]))
+        return True
+
+    def warm_start(self, path):
+        """ Initializes the trainable variables with the weights of another model (variables with the same name and shape). """
+        checkpoint_file = os.path.join(path, TF_CHECKPOINT_NAME) if os.path.isdir(path) else path
+        reader = tf.train.NewCheckpointReader(checkpoint_file)
+        checkpoint_shapes = reader.get_variable_to_shape_map()
+
+        variables = [variable for variable in tf.trainable_variables() if checkpoint_shapes.get(variable.op.name) == variable.get_shape().as_list()]
+        skipped = [variable.op.name for variable in tf.trainable_variables() if variable not in variables]
+        if len(variables) == 0:
+            raise AttributeError('Checkpoint {0} does not contain any variable of the model.'.format(checkpoint_file))
+
+        tf.train.Saver(var_list=variables).restore(self.sess, checkpoint_file)
+        logger.info('Warm start from {0}: restored {1} variables. Initialized from scratch: {2}'.format(checkpoint_file, len(variables), skipped))
+
+    def run_traced_train_step(self, train_op, loss_tensor, feed_dict, summary_writer):
+        """ Runs a train step with a full trace. The trace is added to tensorboard and saved as chrome trace (chrome://tracing). """
+        from tensorflow.python.client import timeline
+
+        run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+        run_metadata = tf.RunMetadata()
+        _, loss_value = self.sess.run([train_op, loss_tensor], feed_dict=feed_dict, options=run_options, run_metadata=run_metadata)
+
+        tag = 'step{0}'.format(self.global_step)
+        summary_writer.add_run_metadata(run_metadata, tag)
+        trace = timeline.Timeline(run_metadata.step_stats)
+        with open(os.path.join(self.log_dir, 'timeline_{0}.json'.format(tag)), 'w') as f:
+            f.write(trace.generate_chrome_trace_format())
+        logger.debug('Saved trace of global step {0}.'.format(self.global_step))
+        return loss_value
+
+    def log_training_timing(self):
+        """ Logs the accumulated time of each training phase. """
+        stages = self.profiler.report()['stages']
+        total_time = sum(record['wall_time'] for record in stages.values())
+        logger.info('Training time per phase:')
+        for phase, record in stages.items():
+            logger.info('\t{0:<12} {1:9.3f}s ({2:5.1f}%)'.format(phase, record['wall_time'], 100.0 * record['wall_time'] / total_time if total_time > 0 else 0.0))
+        if 'train_step' in stages and stages['train_step']['wall_time'] > 0:
+            logger.info('\tExamples/sec (train step): {0:.1f}'.format(stages['train_step']['items'] / stages['train_step']['wall_time']))
+
+    def model_improved(self, loss_value):
+        return self.early_stopper.is_improvement(loss_value)
+
+    def early_stopping(self, epoch, loss_value):
+        """ Adds the monitored loss of an epoch. Returns True if the training should stop (see prediction.early_stopping). """
+        self.early_stopper.update(epoch, loss_value)
+        return self.early_stopper.should_stop(epoch)
+
+    def reduce_learning_rate(self):
+        scale = self.sess.run(self.learning_rate_scale) * self.early_stopper.plateau_factor
+        self.learning_rate_scale.load(scale, self.sess)
+        logger.info('Learning rate scale: {0:.5f}'.format(scale))
 
 
     def predict(self, X):
-        X = X.reshape((1,X.shape[0]))
+        # a single example: add the batch dimension (works for feature vectors and code images)
+        X = X if issparse(X) else X[np.newaxis]
+        X = to_dense_feed(X, self.reshape_input_to, self.input_is_image)
+        if self.reshape_input_to is None:
+            X = X.reshape((1, -1))
         feed_dict = {self.features_pl: X, self.keep_prob_pl: 1.0}
-        softmax = tf.nn.softmax(self.model)
-        activations = softmax.eval(session=self.sess, feed_dict=feed_dict)
-        y = activations / sum(activations[0])
+        y = self.sess.run(self.probabilities, feed_dict=feed_dict)
 
         # get predicted label
         label = np.argmax(y)
         return label, y[0][label]
 
+    def predict_proba(self, data_set, batch_size=None):
+        """ Class probabilities of all examples of a data set [num_examples, num_classes]. The examples are streamed in batches. """
+        batch_size = self.batch_size if batch_size is None else batch_size
+        probabilities = []
+        for X, _ in data_set.iterate_batches(batch_size):
+            probabilities.append(self.sess.run(self.probabilities, feed_dict={self.features_pl: to_dense_feed(X, self.reshape_input_to, self.input_is_image), self.keep_prob_pl: 1.0}))
+        return np.concatenate(probabilities, axis=0) if len(probabilities) > 0 else np.zeros((0, self.num_classes), dtype=np.float32)
+
+    def evaluate_data_set(self, data_set, batch_size=None, effort=None, name=None):
+        """
+        Evaluates the model on all examples of a data set with constant memory (see prediction.evaluation.StreamingEvaluator).
+
+        Keyword arguments:
+        data_set -- DataSet (labels or one hot targets)
+        batch_size -- examples per batch. Default: self.batch_size
+        effort -- effort per example in data set order (e.g. lines of code) for the cost effectiveness. Default: 1 per example
+        """
+        evaluator = StreamingEvaluator(num_classes=self.num_classes)
+        self.stream_evaluation(data_set, batch_size, effort, evaluator=evaluator)
+        return evaluator.log_result(name if name is not None else getattr(data_set, 'name', ''))
+
+    def stream_evaluation(self, data_set, batch_size=None, effort=None, loss_tensor=None, targets_pl=None, evaluator=None):
+        """
+        Runs the model batch wise over a data set.
+
+        Returns:
+        (result of the StreamingEvaluator, mean loss of the examples if loss_tensor and targets_pl are given - None otherwise)
+        """
+        batch_size = self.batch_size if batch_size is None else batch_size
+        evaluator = StreamingEvaluator(num_classes=self.num_classes) if evaluator is None else evaluator
+        total_loss = 0.0
+        start = 0
+        for X, y in data_set.iterate_batches(batch_size):
+            feed_dict = {self.features_pl: to_dense_feed(X, self.reshape_input_to, self.input_is_image), self.keep_prob_pl: 1.0}
+            if loss_tensor is not None:
+                feed_dict[targets_pl] = y
+                probabilities, loss_value = self.sess.run([self.probabilities, loss_tensor], feed_dict=feed_dict)
+                # the loss is the mean of the batch
+                total_loss += loss_value * len(y)
+            else:
+                probabilities = self.sess.run(self.probabilities, feed_dict=feed_dict)
+            evaluator.update(y, probabilities, None if effort is None else effort[start:start + len(y)])
+            start += len(y)
+        return evaluator.result(), (total_loss / max(start, 1) if loss_tensor is not None else None)
+
     
     def calculate_manual_accuracy(self):
         num_prediction_tests = self.test.num_examples
@@ -930,8 +1350,10 @@ class TensorFlowNet(object):
 
         
     def load_model(self, file_name):
+        # outside of training only the inference graph is built (see restore_model)
         if self.saver is None:
-            raise Exception('Could not load model because saver is not initialized. Model dump: ' + str(self))
+            self.restore_model(file_name)
+            return
         self.saver.restore(self.sess, file_name)
         logger.info('Model was restored.')
 
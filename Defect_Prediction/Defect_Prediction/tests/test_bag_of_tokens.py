@@ -0,0 +1,30 @@
+import unittest
+import numpy as np
+
+from data_io.bag_of_tokens import to_bag_of_tokens
+
+
+class BagOfTokensTest(unittest.TestCase):
+
+    def test_counts(self):
+        counts = to_bag_of_tokens([[1, 2, 2], [], [3, 1]])
+        self.assertEqual(counts.shape, (3, 4))
+        np.testing.assert_array_equal(counts.toarray(), [[0, 1, 2, 0], [0, 0, 0, 0], [0, 1, 0, 1]])
+        self.assertEqual(counts.dtype, np.float32)
+
+    def test_number_of_columns(self):
+        self.assertEqual(to_bag_of_tokens([[1]], num_tokens=10).shape, (1, 10))
+        self.assertEqual(to_bag_of_tokens([[]]).shape, (1, 1))
+        with self.assertRaises(AttributeError):
+            to_bag_of_tokens([[1, 5]], num_tokens=5)
+
+    def test_tf_idf(self):
+        weights = to_bag_of_tokens([[1, 2], [1, 3]], tf_idf=True).toarray()
+        # rows are l2 normalized and the token of both rows gets a lower weight
+        np.testing.assert_allclose(np.linalg.norm(weights, axis=1), 1.0, rtol=1e-6)
+        self.assertLess(weights[0, 1], weights[0, 2])
+        self.assertEqual(weights[0, 3], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from scipy import sparse
+
+from data_io.test_data import DataSet, SAMPLING_BALANCED
+from prediction.baseline_models import BaselineModel, create_estimator, create_baseline_model, BASELINE_MODELS, MODEL_LOGISTIC_REGRESSION, MODEL_NAIVE_BAYES, MODEL_GRADIENT_BOOSTING
+
+
+def get_data(num_examples=200, seed=0, labels=None):
+    """ Token counts with a class dependent token (token 0 for defective classes). """
+    random_state = np.random.RandomState(seed)
+    labels = random_state.randint(0, 2, num_examples) if labels is None else np.asarray(labels)
+    X = random_state.poisson(1.0, size=(len(labels), 8)).astype(np.float32)
+    X[:, 0] += 3 * labels
+    return X, labels
+
+
+def get_data_sets(make_sparse=False, one_hot=True, sampling='none'):
+    X_train, y_train = get_data(seed=0)
+    X_test, y_test = get_data(seed=1)
+    if make_sparse:
+        X_train, X_test = sparse.csr_matrix(X_train), sparse.csr_matrix(X_test)
+    return DataSet(X_train, y_train, 'Train', one_hot=one_hot, seed=1, sampling=sampling), DataSet(X_test, y_test, 'Test', one_hot=one_hot)
+
+
+class CreateEstimatorTest(unittest.TestCase):
+
+    def test_estimators(self):
+        self.assertEqual(type(create_estimator(MODEL_LOGISTIC_REGRESSION, True)).__name__, 'LogisticRegression')
+        self.assertEqual(create_estimator(MODEL_LOGISTIC_REGRESSION, True).solver, 'liblinear')
+        self.assertEqual(create_estimator(MODEL_LOGISTIC_REGRESSION, False, C=0.5).C, 0.5)
+        self.assertEqual(type(create_estimator(MODEL_NAIVE_BAYES, True)).__name__, 'MultinomialNB')
+        self.assertEqual(type(create_estimator(MODEL_NAIVE_BAYES, False)).__name__, 'GaussianNB')
+        self.assertEqual(type(create_estimator(MODEL_GRADIENT_BOOSTING, True)).__name__, 'GradientBoostingClassifier')
+        with self.assertRaises(AttributeError):
+            create_estimator('unknown', False)
+        with self.assertRaises(AttributeError):
+            BaselineModel(None, None, 'unknown')
+
+
+class BaselineModelTest(unittest.TestCase):
+
+    def test_dense_and_sparse_features(self):
+        for make_sparse in [False, True]:
+            for model_type in BASELINE_MODELS:
+                train, test = get_data_sets(make_sparse)
+                model = BaselineModel(train, test, model_type)
+                result = model.run_training()
+                self.assertIs(result, model.test_evaluation)
+                self.assertEqual(result['num_examples'], 200)
+                self.assertGreater(result['accuracy'], 0.8, '{0} (sparse: {1})'.format(model_type, make_sparse))
+
+    def test_predictions(self):
+        train, test = get_data_sets()
+        model = BaselineModel(train, None, MODEL_LOGISTIC_REGRESSION, batch_size=64)
+        self.assertIsNone(model.run_training())
+
+        probabilities = model.predict_proba(test)
+        self.assertEqual(probabilities.shape, (200, 2))
+        np.testing.assert_allclose(probabilities.sum(axis=1), 1.0, rtol=1e-5)
+        self.assertEqual(model.predict_proba(test, batch_size=7).shape, (200, 2))
+
+        label, probability = model.predict(test.features[0])
+        self.assertEqual(label, np.argmax(probabilities[0]))
+        self.assertAlmostEqual(probability, probabilities[0, label], places=5)
+
+        sparse_train, sparse_test = get_data_sets(make_sparse=True)
+        sparse_model = BaselineModel(sparse_train, None, MODEL_NAIVE_BAYES)
+        sparse_model.run_training()
+        label, _ = sparse_model.predict(sparse_test.features[0])
+        self.assertIn(label, [0, 1])
+
+    def test_class_missing_in_the_train_set(self):
+        # labels 0 and 2: class 1 gets probability 0
+        X, y = get_data(labels=[0, 2] * 50)
+        model = BaselineModel(DataSet(X, y, 'Train', one_hot=False), None, MODEL_LOGISTIC_REGRESSION)
+        model.run_training()
+        self.assertEqual(model.num_classes, 3)
+        probabilities = model.predict_proba(DataSet(X, y, 'Test', one_hot=False))
+        self.assertEqual(probabilities.shape, (100, 3))
+        np.testing.assert_array_equal(probabilities[:, 1], 0.0)
+        np.testing.assert_allclose(probabilities.sum(axis=1), 1.0, rtol=1e-5)
+
+    def test_sampled_epoch(self):
+        train, test = get_data_sets(sampling=SAMPLING_BALANCED)
+        model = BaselineModel(train, test, MODEL_LOGISTIC_REGRESSION)
+        self.assertGreater(model.run_training()['accuracy'], 0.8)
+        # the estimator was trained on one sampled epoch
+        self.assertEqual(train.get_state()['index_in_epoch'], train.epoch_size)
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            train, test = get_data_sets()
+            model = create_baseline_model(train, None, 'fold0', MODEL_LOGISTIC_REGRESSION, C=0.5)
+            model.run_training()
+            file_name = os.path.join(directory, 'model.pickle')
+            model.save(file_name)
+            restored = BaselineModel.load(file_name)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(restored.model_name, 'logistic_regression_fold0')
+        self.assertEqual(restored.model_parameters, {'C': 0.5})
+        self.assertEqual(restored.num_classes, 2)
+        np.testing.assert_array_equal(restored.predict_proba(test), model.predict_proba(test))
+        self.assertEqual(restored.evaluate_data_set(test), model.evaluate_data_set(test))
+        with self.assertRaises(AttributeError):
+            restored.run_training()
+
+
+if __name__ == '__main__':
+    unittest.main()
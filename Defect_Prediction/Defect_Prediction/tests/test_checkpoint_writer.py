@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from prediction.checkpoint_writer import AsyncCheckpointWriter, load_snapshot
+
+
+def get_snapshot(value):
+    return {'layer/weights': np.full((2, 3), value, dtype=np.float32), 'layer/biases': np.full(3, value, dtype=np.float32)}
+
+
+class AsyncCheckpointWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_snapshot_round_trip(self):
+        writer = AsyncCheckpointWriter(self.directory, min_interval=0.0)
+        writer.submit(7, get_snapshot(1.5), {'loss': 0.25})
+        best_snapshot, best_metadata = writer.close()
+        self.assertEqual(best_metadata, {'loss': 0.25, 'step': 7})
+
+        values, metadata = load_snapshot(writer.latest_file)
+        self.assertEqual(metadata, best_metadata)
+        self.assertEqual(sorted(values.keys()), sorted(best_snapshot.keys()))
+        np.testing.assert_array_equal(values['layer/weights'], best_snapshot['layer/weights'])
+
+    def test_keep_last(self):
+        writer = AsyncCheckpointWriter(self.directory, min_interval=0.0, keep_last=2)
+        for step in range(5):
+            writer.submit(step, get_snapshot(step))
+            writer.flush()
+        writer.close()
+        self.assertEqual([os.path.basename(file_name) for file_name in AsyncCheckpointWriter.list_snapshots(self.directory)], ['best-00000003.npz', 'best-00000004.npz'])
+
+        # snapshots of earlier runs count towards the retention
+        writer = AsyncCheckpointWriter(self.directory, min_interval=0.0, keep_last=2)
+        writer.submit(10, get_snapshot(10))
+        writer.close()
+        self.assertEqual([os.path.basename(file_name) for file_name in AsyncCheckpointWriter.list_snapshots(self.directory)], ['best-00000004.npz', 'best-00000010.npz'])
+
+    def test_rate_limited_snapshot_is_written_on_close(self):
+        writer = AsyncCheckpointWriter(self.directory, min_interval=3600.0)
+        writer.submit(1, get_snapshot(1))
+        writer.submit(2, get_snapshot(2))
+        writer.submit(3, get_snapshot(3))
+        writer.close()
+        self.assertEqual(writer.num_submitted, 3)
+        self.assertEqual(writer.num_written, 2)
+        values, metadata = load_snapshot(writer.latest_file)
+        self.assertEqual(metadata['step'], 3)
+        np.testing.assert_array_equal(values['layer/biases'], 3)
+
+    def test_invalid_keep_last(self):
+        with self.assertRaises(AttributeError):
+            AsyncCheckpointWriter(self.directory, keep_last=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from data_io.class_index import ClassFileIndex, match_statistics, MATCH_EXACT, MATCH_INNER_CLASS, MATCH_SUFFIX
+from data_io.test_data import map_bug_data
+
+
+SOURCE_FILES = {
+    'org.apache.tools.ant.Main': '/src/org/apache/tools/ant/Main.java',
+    'org.apache.tools.ant.taskdefs.Copy': '/src/org/apache/tools/ant/taskdefs/Copy.java',
+    'tools.ant.taskdefs.Echo': '/main/tools/ant/taskdefs/Echo.java',
+    'a.util.Helper': '/a/util/Helper.java',
+    'b.util.Helper': '/b/util/Helper.java'
+    }
+
+
+class ClassFileIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ClassFileIndex(SOURCE_FILES)
+
+    def test_exact_match(self):
+        self.assertEqual(self.index.lookup('org.apache.tools.ant.Main'), ('org.apache.tools.ant.Main', SOURCE_FILES['org.apache.tools.ant.Main'], MATCH_EXACT))
+
+    def test_inner_class_resolves_to_the_outer_class(self):
+        self.assertEqual(self.index.lookup('org.apache.tools.ant.Main$Inner$Nested'), ('org.apache.tools.ant.Main', SOURCE_FILES['org.apache.tools.ant.Main'], MATCH_INNER_CLASS))
+
+    def test_suffix_matches(self):
+        # the indexed name ends with the class name
+        self.assertEqual(self.index.lookup('taskdefs.Copy'), ('org.apache.tools.ant.taskdefs.Copy', SOURCE_FILES['org.apache.tools.ant.taskdefs.Copy'], MATCH_SUFFIX))
+        # the class name has additional leading packages
+        self.assertEqual(self.index.lookup('org.apache.tools.ant.taskdefs.Echo'), ('tools.ant.taskdefs.Echo', SOURCE_FILES['tools.ant.taskdefs.Echo'], MATCH_SUFFIX))
+
+    def test_ambiguous_and_unknown_classes(self):
+        self.assertEqual(self.index.lookup('util.Helper'), (None, None, None))
+        self.assertEqual(self.index.lookup('org.example.Missing'), (None, None, None))
+        # a single class name is shorter than the minimal suffix length
+        self.assertEqual(self.index.lookup('Copy'), (None, None, None))
+
+    def test_match_statistics(self):
+        statistics = match_statistics(4, [MATCH_EXACT, MATCH_INNER_CLASS, None, MATCH_EXACT])
+        self.assertEqual(statistics[MATCH_EXACT], 2)
+        self.assertEqual(statistics['unmatched'], 1)
+        self.assertEqual(statistics['matched'], 3)
+        self.assertEqual(statistics['match_rate'], 0.75)
+        self.assertEqual(match_statistics(0, [])['match_rate'], 0.0)
+
+
+class MapBugDataTest(unittest.TestCase):
+
+    def test_inner_classes_are_merged_into_their_source_file(self):
+        bug_data = {
+            'org.apache.tools.ant.Main$Inner': 2,
+            'org.apache.tools.ant.Main': 1,
+            'org.apache.tools.ant.taskdefs.Copy': 0,
+            'org.example.Missing': 1
+            }
+        test_data, statistics = map_bug_data(SOURCE_FILES, bug_data, binary_class_labels=False)
+        self.assertEqual(test_data, [('org.apache.tools.ant.Main', SOURCE_FILES['org.apache.tools.ant.Main'], 3),
+                                     ('org.apache.tools.ant.taskdefs.Copy', SOURCE_FILES['org.apache.tools.ant.taskdefs.Copy'], 0)])
+        self.assertEqual(statistics['matched'], 3)
+        self.assertEqual(statistics['merged'], 1)
+
+    def test_binary_labels_are_not_summed(self):
+        test_data, _ = map_bug_data(SOURCE_FILES, {'org.apache.tools.ant.Main': 1, 'org.apache.tools.ant.Main$Inner': 1})
+        self.assertEqual(test_data, [('org.apache.tools.ant.Main', SOURCE_FILES['org.apache.tools.ant.Main'], 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
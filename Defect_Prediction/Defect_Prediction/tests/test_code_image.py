@@ -0,0 +1,91 @@
+import unittest
+import numpy as np
+
+from data_io import code_image
+from data_io.vocabulary import HashedVocabulary
+from data_io.code_image import to_token_grids, to_cooccurrence_matrices, to_code_images, get_image_dtype, expand_code_images, CODE_IMAGE_GRID, CODE_IMAGE_COOCCURRENCE
+
+
+class CodeImageTest(unittest.TestCase):
+
+    def test_image_dtype(self):
+        self.assertEqual(get_image_dtype(256), np.uint8)
+        self.assertEqual(get_image_dtype(257), np.uint16)
+        with self.assertRaises(AttributeError):
+            get_image_dtype(2 ** 16 + 1)
+
+    def test_token_grids(self):
+        grids = to_token_grids([[1, 2, 3, 1, 2], [3], []], num_tokens=4, height=2, width=2)
+        self.assertEqual(grids.shape, (3, 2, 2))
+        self.assertEqual(grids.dtype, np.uint8)
+        # token ids are spread over [0, 255], the sequences are truncated to height * width tokens
+        np.testing.assert_array_equal(grids[0], [[85, 170], [255, 85]])
+        np.testing.assert_array_equal(grids[1], [[255, 0], [0, 0]])
+        np.testing.assert_array_equal(grids[2], 0)
+
+        self.assertEqual(to_token_grids([[300]], num_tokens=301, height=1, width=1).dtype, np.uint16)
+        with self.assertRaises(AttributeError):
+            to_token_grids([[4]], num_tokens=4)
+
+    def test_cooccurrence_matrices(self):
+        matrices = to_cooccurrence_matrices([[1, 2, 1, 2, 3], [5]], num_tokens=6, size=6)
+        self.assertEqual(matrices.shape, (2, 6, 6))
+        counts = np.zeros((6, 6))
+        counts[1, 2] = 2
+        counts[2, 1] = 1
+        counts[2, 3] = 1
+        # log scaled, the most frequent pair has the maximal value
+        np.testing.assert_array_equal(matrices[0], np.round(np.log1p(counts) * 255 / np.log1p(2)))
+        # no pairs
+        np.testing.assert_array_equal(matrices[1], 0)
+
+        # one row per token id: more token ids are only hashed into buckets on request
+        with self.assertRaises(AttributeError):
+            to_cooccurrence_matrices([[1, 6]], num_tokens=7, size=5)
+        hashed = to_cooccurrence_matrices([[1, 6]], num_tokens=7, size=5, hash_tokens=True)
+        bucket = HashedVocabulary(5, first_token_id=0).token_id
+        self.assertEqual(hashed[0, bucket('1'), bucket('6')], 255)
+        self.assertEqual(hashed.sum(), 255)
+        # hashing is not used if the token ids fit
+        np.testing.assert_array_equal(to_cooccurrence_matrices([[1, 2]], num_tokens=3, size=3, hash_tokens=True), to_cooccurrence_matrices([[1, 2]], num_tokens=3, size=3))
+
+    def test_cooccurrence_chunks_and_window(self):
+        sequences = [np.random.RandomState(i).randint(1, 20, size=i % 7).tolist() for i in range(25)]
+        expected = to_cooccurrence_matrices(sequences, 20, size=20, window=2)
+        expected_hashed = to_cooccurrence_matrices(sequences, 20, size=8, window=2, hash_tokens=True)
+        chunk_size = code_image.COOCCURRENCE_CHUNK_SIZE
+        code_image.COOCCURRENCE_CHUNK_SIZE = 4
+        try:
+            np.testing.assert_array_equal(to_cooccurrence_matrices(sequences, 20, size=20, window=2), expected)
+            np.testing.assert_array_equal(to_cooccurrence_matrices(sequences, 20, size=8, window=2, hash_tokens=True), expected_hashed)
+        finally:
+            code_image.COOCCURRENCE_CHUNK_SIZE = chunk_size
+
+        # pairs of different sequences are not counted
+        matrices = to_cooccurrence_matrices([[1], [2]], num_tokens=3, size=3)
+        np.testing.assert_array_equal(matrices, 0)
+        with self.assertRaises(AttributeError):
+            to_cooccurrence_matrices([[1]], num_tokens=2, window=0)
+        with self.assertRaises(AttributeError):
+            to_cooccurrence_matrices([[1]], num_tokens=2, dtype=np.float32)
+
+    def test_code_images(self):
+        sequences = [[1, 2, 3], [2, 2]]
+        np.testing.assert_array_equal(to_code_images(sequences, 4, CODE_IMAGE_GRID, 3), to_token_grids(sequences, 4, 3, 3))
+        np.testing.assert_array_equal(to_code_images(sequences, 4, CODE_IMAGE_COOCCURRENCE, 4), to_cooccurrence_matrices(sequences, 4, 4))
+        np.testing.assert_array_equal(to_code_images(sequences, 4, CODE_IMAGE_COOCCURRENCE, 3, hash_tokens=True), to_cooccurrence_matrices(sequences, 4, 3, hash_tokens=True))
+        with self.assertRaises(AttributeError):
+            to_code_images(sequences, 4, 'unknown')
+
+    def test_expand_code_images(self):
+        images = to_token_grids([[1, 3]], num_tokens=4, height=1, width=2)
+        expanded = expand_code_images(images)
+        self.assertEqual(expanded.dtype, np.float32)
+        np.testing.assert_allclose(expanded, [[[1 / 3.0, 1.0]]], rtol=1e-6)
+        np.testing.assert_allclose(expand_code_images(np.array([[0, 65535]], dtype=np.uint16)), [[0.0, 1.0]])
+        with self.assertRaises(AttributeError):
+            expand_code_images(expanded)
+
+
+if __name__ == '__main__':
+    unittest.main()
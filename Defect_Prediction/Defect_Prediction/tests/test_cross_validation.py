@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from scipy import stats
+
+from data_io.feature_store import FeatureStore
+from prediction.cross_validation import CrossValidation, stratified_fold_assignments, confidence_interval, run_fold, AGGREGATED_METRICS
+from prediction.evaluation import StreamingEvaluator
+
+
+class MajorityClassModel(object):
+    """ Predicts the most frequent class of the train data. """
+
+    def __init__(self, train, test, name):
+        self.train = train
+
+    def run_training(self):
+        self.probabilities = np.bincount(self.train.labels, minlength=2) / float(self.train.num_examples)
+
+    def evaluate_data_set(self, data_set):
+        evaluator = StreamingEvaluator()
+        evaluator.update(data_set.targets, np.tile(self.probabilities, (data_set.num_examples, 1)))
+        return evaluator.result()
+
+
+class StratifiedFoldsTest(unittest.TestCase):
+
+    def test_classes_are_spread_evenly(self):
+        labels = np.array([0] * 53 + [1] * 17 + [2] * 5)
+        folds = stratified_fold_assignments(labels, num_folds=5, num_repeats=3, seed=1)
+        self.assertEqual(folds.shape, (3, 75))
+        for repeat in range(3):
+            for label in range(3):
+                counts = np.bincount(folds[repeat, labels == label], minlength=5)
+                self.assertLessEqual(counts.max() - counts.min(), 1)
+        self.assertFalse(np.array_equal(folds[0], folds[1]))
+
+    def test_seed(self):
+        labels = np.arange(40) % 3
+        np.testing.assert_array_equal(stratified_fold_assignments(labels, 4, 2, seed=7), stratified_fold_assignments(labels, 4, 2, seed=7))
+        with self.assertRaises(AttributeError):
+            stratified_fold_assignments(labels, num_folds=1)
+
+
+class ConfidenceIntervalTest(unittest.TestCase):
+
+    def test_student_t_interval(self):
+        values = [0.61, 0.65, 0.7, 0.58, 0.66]
+        mean, std, lower, upper = confidence_interval(values + [None], confidence=0.9)
+        expected_lower, expected_upper = stats.t.interval(0.9, len(values) - 1, loc=np.mean(values), scale=stats.sem(values))
+        self.assertAlmostEqual(mean, np.mean(values))
+        self.assertAlmostEqual(std, np.std(values, ddof=1))
+        self.assertAlmostEqual(lower, expected_lower)
+        self.assertAlmostEqual(upper, expected_upper)
+
+    def test_corrected_variance(self):
+        values = [0.61, 0.65, 0.7, 0.58, 0.66]
+        _, _, lower, upper = confidence_interval(values)
+        _, _, corrected_lower, corrected_upper = confidence_interval(values, test_train_ratio=1.0 / 9)
+        self.assertLess(corrected_lower, lower)
+        self.assertGreater(corrected_upper, upper)
+        self.assertAlmostEqual((corrected_upper - corrected_lower) / (upper - lower), np.sqrt((1.0 / 5 + 1.0 / 9) * 5))
+
+    def test_degenerate_values(self):
+        self.assertEqual(confidence_interval([]), (None, None, None, None))
+        self.assertEqual(confidence_interval([None]), (None, None, None, None))
+        self.assertEqual(confidence_interval([0.5]), (0.5, 0.0, 0.5, 0.5))
+
+
+class CrossValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        random_state = np.random.RandomState(0)
+        store = FeatureStore(os.path.join(self.directory, 'store'))
+        store.save_vocabulary({'a': 12, 'b': 13}, 14)
+        for project, num_classes in [('p1', 30), ('p2', 20)]:
+            token_sequences = [random_state.randint(1, 14, size=random_state.randint(1, 6)).tolist() for _ in range(num_classes)]
+            store.append_project(project, token_sequences, np.arange(num_classes) % 4, ['C{0}'.format(i) for i in range(num_classes)])
+        self.cross_validation = CrossValidation(os.path.join(self.directory, 'store'), num_folds=5, num_repeats=2, work_dir=os.path.join(self.directory, 'work'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_folds(self):
+        self.cross_validation.prepare()
+        self.assertEqual(self.cross_validation.num_token_ids, 14)
+        for bag_of_tokens in [False, True]:
+            self.cross_validation.results = [run_fold(self.cross_validation.work_dir, repeat, fold, MajorityClassModel, bag_of_tokens=bag_of_tokens, num_token_ids=14)
+                                             for repeat in range(2) for fold in range(5)]
+            self.assertEqual(sum(result['num_test'] for result in self.cross_validation.results), 2 * 50)
+            self.assertTrue(all(result['num_train'] + result['num_test'] == 50 for result in self.cross_validation.results))
+
+            aggregated = self.cross_validation.aggregate()
+            self.assertEqual(list(aggregated.keys())[3:], AGGREGATED_METRICS)
+            # bug numbers > 0 are defective (37 of 50 classes). The majority class model always predicts a defect.
+            self.assertAlmostEqual(aggregated['accuracy']['mean'], 37 / 50.0, delta=0.01)
+            self.assertAlmostEqual(aggregated['recall']['mean'], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
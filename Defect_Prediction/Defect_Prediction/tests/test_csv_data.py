@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from data_io.csv_data import get_column_index, read_csv_columns
+from data_io.test_data import load_bug_data
+
+
+# PROMISE bug sheet layout: 'name' is the project and again the class name
+BUG_SHEET = '''name,version,name,wmc,bug
+ant,1.7,org.apache.tools.ant.Main,10,0
+ant,1.7,org.apache.tools.ant.Task,4,3
+
+ant,1.7,org.apache.tools.ant.Project,25,1
+'''
+
+
+class CsvDataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, content, name='bugs.csv'):
+        file_name = os.path.join(self.directory, name)
+        with open(file_name, 'w') as f:
+            f.write(content)
+        return file_name
+
+    def test_get_column_index(self):
+        header = ['name', ' version ', 'name', 'bug']
+        # the last occurrence of a duplicated header wins
+        self.assertEqual(get_column_index(header, 'name'), 2)
+        self.assertEqual(get_column_index(header, 'version'), 1)
+        self.assertEqual(get_column_index(header, 0), 0)
+        self.assertEqual(get_column_index(header, '3'), 3)
+        with self.assertRaises(AttributeError):
+            get_column_index(header, 4)
+        with self.assertRaises(AttributeError):
+            get_column_index(header, '4')
+        with self.assertRaises(AttributeError):
+            get_column_index(header, 'loc')
+
+    def test_read_columns(self):
+        file_name = self.write(BUG_SHEET)
+        class_names, bugs = read_csv_columns(file_name, ['name', 'bug'])
+        self.assertEqual(class_names, ('org.apache.tools.ant.Main', 'org.apache.tools.ant.Task', 'org.apache.tools.ant.Project'))
+        self.assertEqual(bugs, ('0', '3', '1'))
+        self.assertEqual(read_csv_columns(file_name, ['0', 4]), [('ant', 'ant', 'ant'), ('0', '3', '1')])
+
+    def test_single_column(self):
+        self.assertEqual(read_csv_columns(self.write(BUG_SHEET), ['bug']), [('0', '3', '1')])
+
+    def test_delimiter(self):
+        self.assertEqual(read_csv_columns(self.write('name;bug\nA;1\n'), ['name', 'bug'], delimiter=';'), [('A',), ('1',)])
+
+    def test_empty_files(self):
+        self.assertEqual(read_csv_columns(self.write('name,bug\n'), ['name', 'bug']), [(), ()])
+        with self.assertRaises(AttributeError):
+            read_csv_columns(self.write(''), ['name'])
+        with self.assertRaises(AttributeError):
+            read_csv_columns(self.write(''), [0])
+
+    def test_load_bug_data(self):
+        file_name = self.write(BUG_SHEET)
+        self.assertEqual(load_bug_data(file_name, 'name', 'bug', binary_class_labels=True),
+                         {'org.apache.tools.ant.Main': 0, 'org.apache.tools.ant.Task': 1, 'org.apache.tools.ant.Project': 1})
+        self.assertEqual(load_bug_data(file_name, '2', '4', binary_class_labels=False),
+                         {'org.apache.tools.ant.Main': 0, 'org.apache.tools.ant.Task': 3, 'org.apache.tools.ant.Project': 1})
+        self.assertEqual(load_bug_data(self.write('name,bug\n'), 'name', 'bug', binary_class_labels=True), {})
+        with self.assertRaises(AttributeError):
+            load_bug_data(self.write(BUG_SHEET, 'bugs.txt'), 'name', 'bug', binary_class_labels=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
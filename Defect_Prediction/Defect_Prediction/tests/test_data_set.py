@@ -0,0 +1,114 @@
+import unittest
+import numpy as np
+from scipy import sparse
+
+from data_io.test_data import DataSet, SAMPLING_NONE, SAMPLING_OVERSAMPLE, SAMPLING_UNDERSAMPLE, SAMPLING_BALANCED, SAMPLING_WEIGHTED
+
+
+def get_data_set(sampling=SAMPLING_NONE, one_hot=False, num_positives=10, num_negatives=40):
+    # the feature of every example is its index
+    labels = np.array([1] * num_positives + [0] * num_negatives, dtype=np.int32)
+    features = np.arange(len(labels), dtype=np.float32).reshape((-1, 1))
+    return DataSet(features, labels, 'Train', one_hot=one_hot, seed=3, sampling=sampling)
+
+
+def get_epoch(data_set):
+    """ Indices of the examples of one epoch (next_batch with the epoch size). """
+    X, y = data_set.next_batch(data_set.epoch_size)
+    return X[:, 0].astype(np.int64), y
+
+
+class DataSetTest(unittest.TestCase):
+
+    def test_no_sampling(self):
+        data_set = get_data_set()
+        self.assertEqual(data_set.epoch_size, 50)
+        indices, y = get_epoch(data_set)
+        self.assertEqual(sorted(indices.tolist()), list(range(50)))
+        np.testing.assert_array_equal(y, data_set.targets[indices])
+
+    def test_oversample(self):
+        data_set = get_data_set(SAMPLING_OVERSAMPLE)
+        self.assertEqual(data_set.epoch_size, 80)
+        indices, y = get_epoch(data_set)
+        self.assertEqual(np.bincount(y).tolist(), [40, 40])
+        # every example is part of the epoch
+        self.assertEqual(len(np.unique(indices)), 50)
+
+    def test_undersample(self):
+        data_set = get_data_set(SAMPLING_UNDERSAMPLE)
+        self.assertEqual(data_set.epoch_size, 20)
+        indices, y = get_epoch(data_set)
+        self.assertEqual(np.bincount(y).tolist(), [10, 10])
+        self.assertEqual(len(np.unique(indices)), 20)
+
+    def test_balanced(self):
+        data_set = get_data_set(SAMPLING_BALANCED)
+        self.assertEqual(data_set.epoch_size, 50)
+        # the classes take turns: every round of two examples contains both classes
+        for _ in range(3):
+            _, y = data_set.next_batch(10)
+            self.assertEqual(y.reshape((-1, 2)).sum(axis=1).tolist(), [1] * 5)
+
+    def test_weighted(self):
+        data_set = get_data_set(SAMPLING_WEIGHTED)
+        labels = np.concatenate([data_set.next_batch(50)[1] for _ in range(40)])
+        # inverse class frequency weights: both classes are drawn about equally often
+        self.assertAlmostEqual(labels.mean(), 0.5, delta=0.05)
+
+        data_set = DataSet(np.zeros((4, 1)), np.array([0, 0, 1, 1]), 'Train', one_hot=False, seed=3, sampling=SAMPLING_WEIGHTED, class_weights=[0.0, 1.0])
+        self.assertEqual(data_set.next_batch(4)[1].tolist(), [1, 1, 1, 1])
+        with self.assertRaises(AttributeError):
+            DataSet(np.zeros((4, 1)), np.array([0, 0, 1, 1]), 'Train', one_hot=False, sampling=SAMPLING_WEIGHTED, class_weights=[1.0])
+        with self.assertRaises(AttributeError):
+            get_data_set('unknown')
+
+    def test_one_hot_and_sparse_features(self):
+        labels = np.array([1, 0, 0, 1, 0, 0])
+        data_set = DataSet(sparse.csr_matrix(np.eye(6, dtype=np.float32)), labels, 'Train', one_hot=True, seed=3, sampling=SAMPLING_OVERSAMPLE)
+        self.assertTrue(data_set.is_sparse)
+        self.assertEqual(data_set.targets.shape, (6, 2))
+        np.testing.assert_array_equal(data_set.labels, labels)
+        X, y = data_set.next_batch(data_set.epoch_size)
+        self.assertTrue(sparse.issparse(X))
+        np.testing.assert_array_equal(np.argmax(y, axis=1), labels[X.indices])
+
+    def test_state_round_trip(self):
+        data_set = get_data_set(SAMPLING_OVERSAMPLE)
+        data_set.next_batch(30)
+        state = data_set.get_state()
+        expected = [data_set.next_batch(30)[0] for _ in range(5)]
+
+        resumed = get_data_set(SAMPLING_OVERSAMPLE)
+        resumed.set_state(state)
+        for X in expected:
+            np.testing.assert_array_equal(resumed.next_batch(30)[0], X)
+        self.assertEqual(resumed.epochs_completed, data_set.epochs_completed)
+
+        with self.assertRaises(AttributeError):
+            get_data_set(SAMPLING_NONE).set_state(state)
+        with self.assertRaises(AttributeError):
+            get_data_set(SAMPLING_OVERSAMPLE, num_negatives=41).set_state(state)
+
+    def test_split(self):
+        train, validation = get_data_set(SAMPLING_UNDERSAMPLE, one_hot=True).split(0.2)
+        self.assertEqual(train.num_examples, 40)
+        self.assertEqual(np.bincount(validation.labels).tolist(), [8, 2])
+        self.assertEqual(train.sampling, SAMPLING_UNDERSAMPLE)
+        self.assertEqual(validation.sampling, SAMPLING_NONE)
+        self.assertEqual(len(set(train.features[:, 0]) | set(validation.features[:, 0])), 50)
+        with self.assertRaises(AttributeError):
+            get_data_set().split(1.0)
+
+    def test_iterate_batches(self):
+        data_set = get_data_set()
+        data_set.next_batch(7)
+        state = data_set.get_state()
+        batches = list(data_set.iterate_batches(16))
+        self.assertEqual([len(y) for _, y in batches], [16, 16, 16, 2])
+        np.testing.assert_array_equal(np.concatenate([X for X, _ in batches])[:, 0], np.arange(50))
+        self.assertEqual(data_set.get_state()['index_in_epoch'], state['index_in_epoch'])
+
+
+if __name__ == '__main__':
+    unittest.main()
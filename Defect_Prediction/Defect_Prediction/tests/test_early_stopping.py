@@ -0,0 +1,62 @@
+import unittest
+
+from prediction.early_stopping import EarlyStopping, MODE_MAX
+
+
+class EarlyStoppingTest(unittest.TestCase):
+
+    def test_patience(self):
+        early_stopping = EarlyStopping(patience=2, min_delta=0.01)
+        self.assertFalse(early_stopping.should_stop(0))
+        self.assertTrue(early_stopping.update(0, 1.0))
+        self.assertTrue(early_stopping.update(1, 0.9))
+        # smaller than min_delta
+        self.assertFalse(early_stopping.update(2, 0.895))
+        self.assertFalse(early_stopping.update(3, 0.95))
+        self.assertFalse(early_stopping.should_stop(3))
+        self.assertTrue(early_stopping.should_stop(4))
+        self.assertEqual((early_stopping.best_epoch, early_stopping.best_value), (1, 0.9))
+
+    def test_max_mode(self):
+        early_stopping = EarlyStopping(patience=None, mode=MODE_MAX)
+        self.assertTrue(early_stopping.update(0, 0.5))
+        self.assertFalse(early_stopping.update(1, 0.4))
+        self.assertTrue(early_stopping.update(2, 0.6))
+        # patience None: never stop
+        self.assertFalse(early_stopping.should_stop(1000))
+
+    def test_learning_rate_reduction(self):
+        early_stopping = EarlyStopping(patience=10, plateau_patience=2, max_reductions=2)
+        early_stopping.update(0, 1.0)
+        reductions = [epoch for epoch in range(1, 10) if early_stopping.reduce_learning_rate(epoch)]
+        # every plateau_patience epochs, at most max_reductions times
+        self.assertEqual(reductions, [2, 4])
+        self.assertEqual(early_stopping.num_reductions, 2)
+
+        # an improvement starts a new plateau
+        early_stopping = EarlyStopping(plateau_patience=2)
+        early_stopping.update(0, 1.0)
+        early_stopping.update(1, 0.5)
+        self.assertFalse(early_stopping.reduce_learning_rate(2))
+        self.assertTrue(early_stopping.reduce_learning_rate(3))
+        self.assertFalse(EarlyStopping().reduce_learning_rate(100))
+
+    def test_state_round_trip(self):
+        early_stopping = EarlyStopping(patience=3, plateau_patience=1)
+        early_stopping.update(0, 1.0)
+        early_stopping.reduce_learning_rate(1)
+        restored = EarlyStopping(patience=3, plateau_patience=1)
+        restored.set_state(early_stopping.get_state())
+        self.assertEqual(restored.get_state(), early_stopping.get_state())
+        self.assertFalse(restored.update(2, 1.0))
+        self.assertTrue(restored.should_stop(4))
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(AttributeError):
+            EarlyStopping(mode='unknown')
+        with self.assertRaises(AttributeError):
+            EarlyStopping(plateau_factor=1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support, roc_auc_score, confusion_matrix
+
+from prediction.evaluation import StreamingEvaluator
+
+
+class StreamingEvaluatorTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(1)
+        self.y = random.randint(0, 2, 500)
+        # scores at the bin centers: the binned auc is exact
+        scores = (np.clip(self.y * 0.3 + random.rand(500) * 0.7, 0, 0.999) * 200).astype(np.int64) / 200.0 + 0.0025
+        self.probabilities = np.stack([1 - scores, scores], axis=1)
+
+    def evaluate(self, batch_size, effort=None):
+        evaluator = StreamingEvaluator()
+        for start in range(0, len(self.y), batch_size):
+            evaluator.update(self.y[start:start + batch_size], self.probabilities[start:start + batch_size], effort[start:start + batch_size] if effort is not None else None)
+        return evaluator.result()
+
+    def test_metrics(self):
+        result = self.evaluate(500)
+        y_predicted = np.argmax(self.probabilities, axis=1)
+        precision, recall, f1, _ = precision_recall_fscore_support(self.y, y_predicted, average='binary')
+        self.assertEqual(result['num_examples'], 500)
+        self.assertAlmostEqual(result['accuracy'], accuracy_score(self.y, y_predicted))
+        self.assertAlmostEqual(result['precision'], precision)
+        self.assertAlmostEqual(result['recall'], recall)
+        self.assertAlmostEqual(result['f1'], f1)
+        self.assertAlmostEqual(result['auc'], roc_auc_score(self.y, self.probabilities[:, 1]))
+        self.assertEqual(result['confusion_matrix'], confusion_matrix(self.y, y_predicted).tolist())
+
+    def test_batches_equal_a_single_batch(self):
+        self.assertEqual(self.evaluate(33), self.evaluate(500))
+        effort = np.arange(500) % 17 + 1
+        self.assertEqual(self.evaluate(33, effort)['cost_effectiveness'], self.evaluate(500, effort)['cost_effectiveness'])
+
+    def test_one_hot_targets(self):
+        evaluator = StreamingEvaluator()
+        evaluator.update(np.eye(2)[self.y], self.probabilities)
+        self.assertEqual(evaluator.result(), self.evaluate(500))
+
+    def test_cost_effectiveness(self):
+        evaluator = StreamingEvaluator(num_thresholds=10)
+        # the highest scored example is defective and needs 20% of the effort
+        evaluator.update([1, 0, 1, 0], [[0.05, 0.95], [0.35, 0.65], [0.75, 0.25], [0.85, 0.15]], effort=[20, 30, 25, 25])
+        self.assertAlmostEqual(evaluator.cost_effectiveness(0.2), 0.5)
+        self.assertAlmostEqual(evaluator.cost_effectiveness(1.0), 1.0)
+        self.assertAlmostEqual(evaluator.auc(), 0.75)
+
+    def test_undefined_metrics(self):
+        evaluator = StreamingEvaluator()
+        evaluator.update([0, 0], [[0.9, 0.1], [0.8, 0.2]])
+        result = evaluator.result()
+        self.assertIsNone(result['auc'])
+        self.assertIsNone(result['cost_effectiveness'])
+        self.assertEqual(result['f1'], 0.0)
+        with self.assertRaises(AttributeError):
+            StreamingEvaluator(num_classes=2, positive_class=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from data_io.test_data import DefectDataSetLoader, FEATURE_FILE_VERSION
+from data_io.normalization import Normalizer
+
+
+class FeatureFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.X = np.array([[1, 12, 0], [2, 13, 12], [3, 0, 0]], dtype=np.float32)
+        self.Y = np.array([[1, 0], [0, 1], [0, 1]])
+        self.normalizer = Normalizer()
+        self.normalizer.fit(self.X)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create_loader(self, **kwargs):
+        return DefectDataSetLoader(['src'], ['bugs.csv'], **kwargs)
+
+    def write_pickle(self, content):
+        with open(os.path.join(self.directory, 'features.pickle'), 'wb') as f:
+            pickle.dump(content, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self):
+        loader = self.create_loader()
+        loader.load_features(self.directory, name='features.pickle')
+        return loader
+
+    def test_round_trip(self):
+        loader = self.create_loader(feature_hashing=True, num_hash_buckets=64)
+        loader.test_data_X = self.X
+        loader.test_data_Y = self.Y
+        loader.class_vector = [0, 1]
+        loader.test_data_project_indices = [(0, 2), (2, 3)]
+        loader.test_data_tokens = [[1, 12], [2, 13, 12], [3]]
+        loader.test_data_class_names = ['A', 'B', 'C']
+        loader.test_data_loc = [10, 20, 30]
+        loader.filtered_tokens = {40, 14}
+        loader.normalizer = self.normalizer
+        loader.save_features(self.directory, name='features.pickle')
+
+        with open(os.path.join(self.directory, 'features.pickle'), 'rb') as f:
+            self.assertEqual(pickle.load(f)['format_version'], FEATURE_FILE_VERSION)
+
+        loaded = self.load()
+        np.testing.assert_array_equal(loaded.test_data_X, self.X)
+        np.testing.assert_array_equal(loaded.test_data_Y, self.Y)
+        self.assertEqual(loaded.token_mapping_names, {'main': 12})
+        self.assertEqual(loaded.class_vector, [0, 1])
+        self.assertTrue(loaded.one_hot)
+        self.assertEqual(loaded.test_data_project_indices, [(0, 2), (2, 3)])
+        self.assertEqual(loaded.name_hasher.num_buckets, 64)
+        self.assertEqual(loaded.test_data_tokens, [[1, 12], [2, 13, 12], [3]])
+        self.assertEqual(loaded.normalizer.get_state(), self.normalizer.get_state())
+        self.assertEqual(loaded.test_data_class_names, ['A', 'B', 'C'])
+        self.assertEqual(loaded.test_data_loc, [10, 20, 30])
+        self.assertEqual(loaded.filtered_tokens, {14, 40})
+        self.assertEqual(loaded.num_classes, 2)
+
+    def test_tuple_layout(self):
+        # positional tuple of the feature files written before the format version
+        self.write_pickle((self.X, self.Y, {'a': 12}, [0, 1], True, [(0, 3)], 32, [[1], [2], [3]], self.normalizer.get_state(), ['A', 'B', 'C'], [1, 2, 3], [13]))
+        loaded = self.load()
+        np.testing.assert_array_equal(loaded.test_data_X, self.X)
+        self.assertEqual(loaded.token_mapping_names, {'a': 12})
+        self.assertEqual(loaded.test_data_project_indices, [(0, 3)])
+        self.assertEqual(loaded.name_hasher.num_buckets, 32)
+        self.assertEqual(loaded.test_data_tokens, [[1], [2], [3]])
+        self.assertEqual(loaded.normalizer.get_state(), self.normalizer.get_state())
+        self.assertEqual(loaded.test_data_class_names, ['A', 'B', 'C'])
+        self.assertEqual(loaded.test_data_loc, [1, 2, 3])
+        self.assertEqual(loaded.filtered_tokens, {13})
+
+    def test_short_tuple_layout(self):
+        # oldest feature files: no hashing, tokens, normalizer, class names, loc or filtered tokens
+        self.write_pickle((self.X, self.Y, {'a': 12}, [0, 1], True, [(0, 3)]))
+        loaded = self.load()
+        np.testing.assert_array_equal(loaded.test_data_Y, self.Y)
+        self.assertIsNone(loaded.name_hasher)
+        self.assertEqual(loaded.test_data_tokens, [])
+        self.assertEqual(loaded.normalizer.get_state(), Normalizer().get_state())
+        self.assertEqual(loaded.test_data_class_names, [])
+        self.assertEqual(loaded.test_data_loc, [])
+        self.assertEqual(loaded.filtered_tokens, set())
+
+    def test_newer_version(self):
+        self.write_pickle({'format_version': FEATURE_FILE_VERSION + 1, 'X': self.X, 'Y': self.Y})
+        with self.assertRaises(AttributeError):
+            self.load()
+
+
+if __name__ == '__main__':
+    unittest.main()
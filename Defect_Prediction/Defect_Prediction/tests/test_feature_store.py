@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from data_io.feature_store import FeatureStore, get_codecs, get_smallest_uint_dtype, pad_token_sequences, register_codec, CODECS, CODEC_NONE, MANIFEST_FILE_NAME
+
+
+TOKEN_SEQUENCES = [[1, 2, 300], [4], [], [5, 6]]
+LABELS = [0, 2, 1, 0]
+CLASS_NAMES = ['a.A', 'a.B', 'a.C', 'a.D']
+
+
+class FeatureStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_codec_round_trip(self):
+        for codec in get_codecs():
+            store = FeatureStore(os.path.join(self.path, codec), codec)
+            store.append_project('p', TOKEN_SEQUENCES, LABELS, CLASS_NAMES)
+
+            X, y, class_names = FeatureStore(os.path.join(self.path, codec)).read_chunk('p')
+            np.testing.assert_array_equal(X, pad_token_sequences(TOKEN_SEQUENCES))
+            self.assertEqual(X.dtype, np.uint16)
+            np.testing.assert_array_equal(y, LABELS)
+            self.assertEqual(class_names, CLASS_NAMES)
+
+    def test_registered_codec(self):
+        register_codec('reverse', lambda data, level: data[::-1], lambda data: data[::-1])
+        try:
+            store = FeatureStore(self.path, 'reverse')
+            store.append_project('p', TOKEN_SEQUENCES, LABELS, CLASS_NAMES)
+            np.testing.assert_array_equal(store.read_chunk('p')[0], pad_token_sequences(TOKEN_SEQUENCES))
+        finally:
+            del CODECS['reverse']
+        with self.assertRaises(AttributeError):
+            FeatureStore(self.path).read_chunk('p')
+        with self.assertRaises(AttributeError):
+            register_codec(CODEC_NONE, None, None)
+
+    def test_read_projects(self):
+        store = FeatureStore(self.path, 'zlib')
+        store.append_project('p1', TOKEN_SEQUENCES, LABELS, CLASS_NAMES)
+        store.append_project('p2', [[7]], [1], ['b.A'])
+        with self.assertRaises(AttributeError):
+            store.append_project('p1', [[7]], [1], ['b.A'])
+
+        X, y, class_names, project_indices = FeatureStore(self.path).read()
+        self.assertEqual(X.shape, (5, 3))
+        np.testing.assert_array_equal(X[4], [7, 0, 0])
+        np.testing.assert_array_equal(y, LABELS + [1])
+        self.assertEqual(class_names, CLASS_NAMES + ['b.A'])
+        self.assertEqual(project_indices, [(0, 3), (4, 4)])
+
+        X, _, _, project_indices = store.read(['p2'], width=4)
+        self.assertEqual(X.shape, (1, 4))
+        self.assertEqual(project_indices, [(0, 0)])
+        self.assertEqual(store.get_normalizer().count, 4 * 3 + 1)
+
+    def test_vocabulary_versions(self):
+        store = FeatureStore(self.path)
+        self.assertIsNone(store.load_vocabulary())
+        self.assertEqual(store.save_vocabulary({'a': 12}, 13, filtered_tokens=[3, 4]), 1)
+        # unchanged vocabulary
+        self.assertEqual(store.save_vocabulary({'a': 12}, 13, filtered_tokens=[3, 4]), 1)
+        # the manifest on disk has the new version
+        with open(os.path.join(self.path, MANIFEST_FILE_NAME)) as f:
+            self.assertEqual(json.load(f)['vocabulary_version'], 1)
+
+        store = FeatureStore(self.path)
+        self.assertEqual(store.save_vocabulary({'a': 12, 'b': 13}, 14, filtered_tokens=[4, 5]), 2)
+        vocabulary = FeatureStore(self.path).load_vocabulary()
+        self.assertEqual(vocabulary['version'], 2)
+        self.assertEqual(vocabulary['token_mapping_names'], {'a': 12, 'b': 13})
+        # only tokens that are missing in every chunk stay filtered
+        self.assertEqual(vocabulary['filtered_tokens'], [4])
+        self.assertEqual(FeatureStore(self.path).vocabulary_version, 2)
+
+    def test_vocabulary_has_to_be_an_extension(self):
+        store = FeatureStore(self.path)
+        store.save_vocabulary({'a': 12}, 13)
+        with self.assertRaises(AttributeError):
+            store.save_vocabulary({'a': 13}, 14)
+        with self.assertRaises(AttributeError):
+            store.save_vocabulary({'a': 12}, 13, num_hash_buckets=16)
+
+    def test_helpers(self):
+        self.assertEqual(get_smallest_uint_dtype(255), np.uint8)
+        self.assertEqual(get_smallest_uint_dtype(256), np.uint16)
+        self.assertEqual(get_smallest_uint_dtype(2 ** 40), np.uint64)
+        np.testing.assert_array_equal(pad_token_sequences([[1], [2, 3]], width=3), [[1, 0, 0], [2, 3, 0]])
+        with self.assertRaises(AttributeError):
+            pad_token_sequences([[1, 2]], width=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from data_io.git_source import run_git, get_changed_files, read_blobs, read_changed_sources
+
+
+GIT_USER = ['-c', 'user.name=test', '-c', 'user.email=test@example.com', '-c', 'commit.gpgsign=false']
+
+
+@unittest.skipIf(shutil.which('git') is None, 'git is not installed.')
+class GitSourceTest(unittest.TestCase):
+    """
+    History of the test repository:
+        initial:  src/a/A.java, src/a/Old.java, README.txt
+        change:   modifies A.java, renames Old.java to New.java, adds C.java and notes.txt
+        delete:   removes C.java
+        feature:  (branch) adds B.java
+        main:     adds D.java
+        merge:    merges feature into main
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.repository = tempfile.mkdtemp()
+        cls.git('init', '-q')
+        cls.git('checkout', '-q', '-b', 'main')
+        cls.write('src/a/A.java', 'class A {}\n')
+        cls.write('src/a/Old.java', 'class Old { void run() { System.out.println("unchanged content"); } }\n')
+        cls.write('README.txt', 'readme\n')
+        cls.commit('initial')
+
+        cls.write('src/a/A.java', 'class A { void run() {} }\n')
+        cls.git('mv', 'src/a/Old.java', 'src/a/New.java')
+        cls.write('src/a/C.java', 'class C {}\n')
+        cls.write('notes.txt', 'notes\n')
+        cls.commit('change')
+
+        cls.git('rm', '-q', 'src/a/C.java')
+        cls.commit('delete')
+
+        cls.git('checkout', '-q', '-b', 'feature')
+        cls.write('src/a/B.java', 'class B {}\n')
+        cls.commit('feature')
+        cls.git('checkout', '-q', 'main')
+        cls.write('src/a/D.java', 'class D {}\n')
+        cls.commit('main')
+        cls.git(*(GIT_USER + ['merge', '-q', '--no-ff', 'feature', '-m', 'merge']))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.repository)
+
+    @classmethod
+    def git(cls, *arguments):
+        return run_git(cls.repository, list(arguments))
+
+    @classmethod
+    def write(cls, path, content):
+        file_name = os.path.join(cls.repository, path)
+        if not os.path.isdir(os.path.dirname(file_name)):
+            os.makedirs(os.path.dirname(file_name))
+        with open(file_name, 'w') as f:
+            f.write(content)
+
+    @classmethod
+    def commit(cls, message):
+        cls.git('add', '-A')
+        cls.git(*(GIT_USER + ['commit', '-q', '-m', message]))
+
+    def test_added_modified_and_renamed_files(self):
+        expected = ['src/a/A.java', 'src/a/C.java', 'src/a/New.java']
+        self.assertEqual(get_changed_files(self.repository, 'main~3'), ('main~3', expected))
+        self.assertEqual(get_changed_files(self.repository, 'main~4..main~3'), ('main~3', expected))
+        self.assertEqual(get_changed_files(self.repository, 'main~4..main~3', file_extension='.txt'), ('main~3', ['notes.txt']))
+
+    def test_deleted_files_are_skipped(self):
+        self.assertEqual(get_changed_files(self.repository, 'main~2'), ('main~2', []))
+
+    def test_root_commit(self):
+        self.assertEqual(get_changed_files(self.repository, 'main~4'), ('main~4', ['src/a/A.java', 'src/a/Old.java']))
+
+    def test_merge_commit(self):
+        # compared against the first parent (main)
+        self.assertEqual(get_changed_files(self.repository, 'HEAD'), ('HEAD', ['src/a/B.java']))
+        self.assertEqual(get_changed_files(self.repository, 'HEAD~1..HEAD'), ('HEAD', ['src/a/B.java']))
+
+    def test_revision_range_parsing(self):
+        # 'a...b': changes of b since the merge base of a and b
+        self.assertEqual(get_changed_files(self.repository, 'main~1...feature'), ('feature', ['src/a/B.java']))
+        # 'a..': target is HEAD
+        self.assertEqual(get_changed_files(self.repository, 'main~1..'), ('HEAD', ['src/a/B.java']))
+
+    def test_read_blobs(self):
+        blobs = read_blobs(self.repository, 'HEAD', ['src/a/A.java', 'src/a/Missing.java', 'src/a', 'src/a/B.java'])
+        self.assertEqual(blobs, [b'class A { void run() {} }\n', None, None, b'class B {}\n'])
+        self.assertEqual(read_blobs(self.repository, 'HEAD', []), [])
+
+    def test_read_changed_sources(self):
+        target, sources = read_changed_sources(self.repository, 'main~4..main~3')
+        self.assertEqual(target, 'main~3')
+        self.assertEqual([path for path, _ in sources], ['src/a/A.java', 'src/a/C.java', 'src/a/New.java'])
+        self.assertEqual(dict(sources)['src/a/C.java'], b'class C {}\n')
+
+    def test_git_errors(self):
+        with self.assertRaises(AttributeError):
+            get_changed_files(self.repository, 'unknown-revision')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+
+from data_io.normalization import Normalizer, NORMALIZATION_MIN_MAX, NORMALIZATION_STANDARD
+
+
+class NormalizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.X = np.random.RandomState(0).randint(0, 50, size=(103, 7)).astype(np.float32)
+
+    def test_chunked_fit_equals_full_statistics(self):
+        normalizer = Normalizer(NORMALIZATION_STANDARD).fit(self.X, chunk_size=10)
+        self.assertEqual(normalizer.count, self.X.size)
+        self.assertAlmostEqual(normalizer.mean, self.X.mean(dtype=np.float64))
+        self.assertAlmostEqual(normalizer.std, self.X.std(dtype=np.float64))
+        self.assertEqual(normalizer.min, self.X.min())
+        self.assertEqual(normalizer.max, self.X.max())
+
+    def test_merge_equals_fit_on_concatenation(self):
+        for per_feature in [False, True]:
+            merged = Normalizer(NORMALIZATION_STANDARD, per_feature).fit(self.X[:40])
+            merged.merge(Normalizer(NORMALIZATION_STANDARD, per_feature).fit(self.X[40:]))
+            full = Normalizer(NORMALIZATION_STANDARD, per_feature).fit(self.X)
+            self.assertEqual(merged.count, full.count)
+            np.testing.assert_allclose(merged.mean, full.mean)
+            np.testing.assert_allclose(merged.std, full.std)
+            np.testing.assert_array_equal(merged.min, full.min)
+            np.testing.assert_array_equal(merged.max, full.max)
+
+    def test_merge_into_unfitted_and_with_different_settings(self):
+        fitted = Normalizer().fit(self.X)
+        merged = Normalizer().merge(fitted)
+        self.assertEqual(merged.get_state(), fitted.get_state())
+        with self.assertRaises(AttributeError):
+            Normalizer(NORMALIZATION_STANDARD).merge(fitted)
+
+    def test_min_max_transform(self):
+        X = self.X.copy()
+        transformed = Normalizer(NORMALIZATION_MIN_MAX).fit_transform(X, chunk_size=16)
+        # float matrices are transformed in place
+        self.assertIs(transformed, X)
+        self.assertAlmostEqual(float(X.min()), 0.0)
+        self.assertAlmostEqual(float(X.max()), 1.0)
+
+    def test_transform_copy_and_integer_input(self):
+        normalizer = Normalizer(NORMALIZATION_STANDARD, per_feature=True).fit(self.X)
+        X = self.X.copy()
+        transformed = normalizer.transform(X, copy=True)
+        np.testing.assert_array_equal(X, self.X)
+        np.testing.assert_allclose(transformed.mean(axis=0), 0.0, atol=1e-5)
+        np.testing.assert_allclose(transformed.std(axis=0), 1.0, rtol=1e-5)
+
+        transformed = normalizer.transform(self.X.astype(np.int64))
+        self.assertEqual(transformed.dtype, np.float32)
+
+    def test_constant_feature(self):
+        X = np.full((5, 3), 4.0, dtype=np.float32)
+        np.testing.assert_array_equal(Normalizer().fit_transform(X), 0.0)
+
+    def test_not_fitted(self):
+        normalizer = Normalizer()
+        self.assertFalse(normalizer.is_fitted)
+        with self.assertRaises(AttributeError):
+            normalizer.transform(self.X)
+        with self.assertRaises(AttributeError):
+            Normalizer('unknown')
+
+    def test_state_round_trip(self):
+        for per_feature in [False, True]:
+            normalizer = Normalizer(NORMALIZATION_STANDARD, per_feature).fit(self.X)
+            restored = Normalizer.from_state(normalizer.get_state())
+            np.testing.assert_allclose(restored.transform(self.X, copy=True), normalizer.transform(self.X, copy=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
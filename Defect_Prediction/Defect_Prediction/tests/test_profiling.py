@@ -0,0 +1,114 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from misc import profiling
+from misc.profiling import StageProfiler
+
+
+class FakeClock(object):
+    """ perf_counter replacement that advances by a fixed step on every call. """
+
+    def __init__(self, step=0.5):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+class StageProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = StageProfiler()
+        patcher = mock.patch.object(profiling.time, 'perf_counter', FakeClock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_accumulation(self):
+        for _ in range(3):
+            with self.profiler.stage('parse', items=2, num_bytes=100) as record:
+                self.assertIs(record, self.profiler.stages['parse'])
+        record = self.profiler.stages['parse']
+        self.assertEqual(record['calls'], 3)
+        self.assertEqual(record['items'], 6)
+        self.assertEqual(record['bytes'], 300)
+        self.assertAlmostEqual(record['wall_time'], 1.5)
+
+    def test_nesting(self):
+        with self.profiler.stage('epoch'):
+            with self.profiler.stage('train_step', items=32):
+                pass
+            with self.profiler.stage('train_step', items=32):
+                pass
+        # the outer stage includes the time of the inner stages
+        self.assertEqual(list(self.profiler.stages.keys()), ['epoch', 'train_step'])
+        self.assertAlmostEqual(self.profiler.stages['train_step']['wall_time'], 1.0)
+        self.assertAlmostEqual(self.profiler.stages['epoch']['wall_time'], 2.5)
+        self.assertEqual(self.profiler.stages['epoch']['calls'], 1)
+        self.assertEqual(self.profiler.stages['train_step']['calls'], 2)
+
+    def test_stage_is_recorded_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.profiler.stage('parse', items=1):
+                raise ValueError()
+        self.assertEqual(self.profiler.stages['parse']['calls'], 1)
+        self.assertEqual(self.profiler.stages['parse']['items'], 1)
+
+    def test_report(self):
+        with self.profiler.stage('read', num_bytes=1000):
+            pass
+        self.profiler.add('read', items=10)
+        self.profiler.add('write', items=5)
+
+        report = self.profiler.report()
+        self.assertEqual(list(report.keys()), ['created', 'peak_rss', 'stages'])
+        self.assertEqual(list(report['stages'].keys()), ['read', 'write'])
+        read = report['stages']['read']
+        for key in ['calls', 'wall_time', 'cpu_time', 'items', 'bytes', 'peak_rss', 'items_per_second', 'bytes_per_second']:
+            self.assertIn(key, read)
+        self.assertEqual(read['items'], 10)
+        self.assertAlmostEqual(read['wall_time'], 0.5)
+        self.assertAlmostEqual(read['items_per_second'], 20.0)
+        self.assertAlmostEqual(read['bytes_per_second'], 2000.0)
+        # no time recorded: no throughput
+        self.assertIsNone(report['stages']['write']['items_per_second'])
+        self.assertIsNone(report['stages']['write']['bytes_per_second'])
+        # the report does not change the recorded values
+        self.assertNotIn('items_per_second', self.profiler.stages['read'])
+
+    def test_reset(self):
+        with self.profiler.stage('parse', items=1):
+            pass
+        self.profiler.reset()
+        self.assertEqual(self.profiler.report()['stages'], {})
+        with self.profiler.stage('parse', items=1):
+            pass
+        self.assertEqual(self.profiler.stages['parse']['calls'], 1)
+
+    def test_save_report_and_profile(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        profiler = StageProfiler(profile_stages=['parse'])
+        with profiler.stage('parse', items=3):
+            sorted(range(100))
+        with profiler.stage('tokenize'):
+            pass
+
+        report_file = os.path.join(directory, 'report.json')
+        profiler.save_report(report_file)
+        with open(report_file) as f:
+            self.assertEqual(json.load(f)['stages']['parse']['items'], 3)
+
+        profiler.dump_profile('parse', os.path.join(directory, 'parse.prof'))
+        self.assertTrue(os.path.isfile(os.path.join(directory, 'parse.prof')))
+        with self.assertRaises(AttributeError):
+            profiler.dump_profile('tokenize', os.path.join(directory, 'tokenize.prof'))
+
+
+if __name__ == '__main__':
+    unittest.main()
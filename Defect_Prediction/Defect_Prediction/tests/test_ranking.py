@@ -0,0 +1,74 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from prediction.ranking import rank_by_risk, effort_curve_area, popt, top_k, recall_at_effort, ranking_metrics, write_ranking_csv, RANKING_CSV_HEADER
+
+
+DEFECTS = [1, 0, 2, 0]
+LOC = [10, 100, 10, 50]
+
+
+class RankingTest(unittest.TestCase):
+
+    def test_rank_by_risk(self):
+        # risk densities: 0.05, 0.005, 0.05, 0.0 (0 lines of code count as one line)
+        self.assertEqual(rank_by_risk([0.5, 0.5, 0.5, 0.0], [10, 100, 10, 0]).tolist(), [0, 2, 1, 3])
+        # equal densities: higher score first
+        self.assertEqual(rank_by_risk([0.2, 0.4], [10, 20]).tolist(), [1, 0])
+
+    def test_effort_curve_area(self):
+        area = effort_curve_area(DEFECTS, LOC, [2, 0, 1, 3])
+        self.assertAlmostEqual(area, (10 / 3.0 + 10 * 5 / 6.0 + 100 + 50) / 170)
+
+    def test_popt(self):
+        self.assertAlmostEqual(popt(DEFECTS, LOC, [2, 0, 1, 3]), 1.0)
+        self.assertAlmostEqual(popt(DEFECTS, LOC, [1, 3, 0, 2]), 0.0)
+        value = popt(DEFECTS, LOC, [0, 1, 2, 3])
+        self.assertTrue(0.0 < value < 1.0)
+        self.assertIsNone(popt([0, 0], [1, 1], [0, 1]))
+        self.assertIsNone(popt([], [], []))
+
+    def test_top_k(self):
+        result = top_k(DEFECTS, [2, 1, 0, 3], k_values=(1, 2, 10))
+        self.assertEqual(list(result.keys()), [1, 2, 4])
+        self.assertEqual(result[1], (1.0, 0.5))
+        self.assertEqual(result[2], (0.5, 0.5))
+        self.assertEqual(result[4], (0.5, 1.0))
+        self.assertEqual(top_k([], [], k_values=(1,)), {})
+
+    def test_recall_at_effort(self):
+        # the first two classes need 20 of 170 lines of code
+        self.assertEqual(recall_at_effort(DEFECTS, LOC, [2, 0, 1, 3], effort_ratio=20 / 170.0), 1.0)
+        self.assertEqual(recall_at_effort(DEFECTS, LOC, [2, 0, 1, 3], effort_ratio=0.1), 0.5)
+        self.assertEqual(recall_at_effort(DEFECTS, LOC, [1, 3, 0, 2], effort_ratio=0.5), 0.0)
+        self.assertIsNone(recall_at_effort([0, 0], [1, 1], [0, 1]))
+
+    def test_ranking_metrics(self):
+        metrics = ranking_metrics(DEFECTS, LOC, [2, 0, 1, 3], k_values=(2,), effort_ratio=0.2)
+        self.assertEqual(list(metrics.keys()), ['precision@2', 'recall@2', 'recall@20%loc', 'popt'])
+        self.assertEqual(metrics['precision@2'], 1.0)
+        self.assertAlmostEqual(metrics['popt'], 1.0)
+
+    def test_write_ranking_csv(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(directory, 'ranking.csv')
+            order = rank_by_risk([0.9, 0.1, 0.8, 0.2], LOC)
+            write_ranking_csv(file_name, ['A', 'B', 'C', 'D'], [0.9, 0.1, 0.8, 0.2], LOC, order, DEFECTS)
+            with open(file_name, newline='') as f:
+                rows = list(csv.reader(f))
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(rows[0], RANKING_CSV_HEADER + ['bugs'])
+        self.assertEqual([row[1] for row in rows[1:]], ['A', 'C', 'D', 'B'])
+        self.assertEqual(rows[1][0], '1')
+        self.assertEqual(rows[-1][5], '1.0000')
+        self.assertEqual([row[6] for row in rows[1:]], ['1', '2', '0', '0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
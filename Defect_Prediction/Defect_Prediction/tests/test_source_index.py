@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from data_io.source_index import expand_source_roots, index_source_roots
+
+
+class SourceIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # repo/core/src/main/java and repo/web/src/main/java both contain org.example.Main
+        self.create('repo/core/src/main/java/org/example/Main.java')
+        self.create('repo/core/src/main/java/org/example/util/Strings.java')
+        self.create('repo/core/src/main/java/org/example/README.md')
+        self.create('repo/web/src/main/java/org/example/Main.java')
+        self.create('repo/web/src/main/java/org/example/web/Servlet.java')
+        self.create('repo/web/src/main/java/Launcher.java')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, relative_path):
+        return os.path.join(self.directory, *relative_path.split('/'))
+
+    def create(self, relative_path):
+        file_name = self.path(relative_path)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        open(file_name, 'w').close()
+
+    def test_glob_expansion(self):
+        roots = expand_source_roots(self.path('repo/*/src/main/java'))
+        self.assertEqual(roots, [self.path('repo/core/src/main/java'), self.path('repo/web/src/main/java')])
+        self.assertEqual(expand_source_roots(self.path('repo/**/example')), [self.path('repo/core/src/main/java/org/example'), self.path('repo/web/src/main/java/org/example')])
+        self.assertEqual(expand_source_roots(self.path('repo/*/test')), [])
+
+    def test_missing_roots_are_dropped(self):
+        self.assertEqual(expand_source_roots([self.path('repo/missing'), self.path('repo/web/src/main/java/Launcher.java')]), [])
+
+    def test_nested_roots_are_dropped(self):
+        roots = expand_source_roots([self.path('repo/core/src/main/java/org'), self.path('repo/core'), self.path('repo/core/src/main/java') + os.sep])
+        self.assertEqual(roots, [self.path('repo/core')])
+        # a common name prefix is not nesting
+        self.create('repo/core2/Other.java')
+        self.assertEqual(expand_source_roots([self.path('repo/core'), self.path('repo/core2')]), [self.path('repo/core'), self.path('repo/core2')])
+
+    def test_package_prefixes(self):
+        index = index_source_roots([self.path('repo/web/src/main/java')])
+        self.assertEqual(set(index.keys()), {'org.example.Main', 'org.example.web.Servlet', 'Launcher'})
+        self.assertEqual(index['org.example.web.Servlet'], self.path('repo/web/src/main/java/org/example/web/Servlet.java').replace(os.sep, '/'))
+
+        index = index_source_roots([self.path('repo/core/src/main/java/org')], max_workers=1)
+        self.assertEqual(set(index.keys()), {'example.Main', 'example.util.Strings'})
+
+    def test_first_root_wins(self):
+        index = index_source_roots([self.path('repo/web/src/main/java'), self.path('repo/core/src/main/java')])
+        self.assertEqual(set(index.keys()), {'org.example.Main', 'org.example.util.Strings', 'org.example.web.Servlet', 'Launcher'})
+        # roots are sorted, so core is the first root independent of the order of the arguments
+        self.assertEqual(index['org.example.Main'], self.path('repo/core/src/main/java/org/example/Main.java').replace(os.sep, '/'))
+
+    def test_file_extension(self):
+        self.assertEqual(index_source_roots(self.path('repo/core'), file_extension='.md'), {'src.main.java.org.example.README': self.path('repo/core/src/main/java/org/example/README.md').replace(os.sep, '/')})
+        self.assertEqual(index_source_roots(self.path('repo/missing')), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
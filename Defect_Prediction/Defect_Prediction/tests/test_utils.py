@@ -0,0 +1,103 @@
+import unittest
+import numpy as np
+
+from misc import utils
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def get_batch(n=4, h=5, w=6, c=3, seed=0):
+    return np.random.RandomState(seed).randint(0, 256, size=(n, h, w, c)).astype(np.uint8)
+
+
+class TranslateBatchTest(unittest.TestCase):
+
+    def test_translation(self):
+        images = get_batch()
+        translated = utils.translate_batch(images, [1, 0, -2, 0], [0, 2, 0, 0])
+        self.assertEqual(translated.shape, images.shape)
+        np.testing.assert_array_equal(translated[0, :, 1:], images[0, :, :-1])
+        np.testing.assert_array_equal(translated[0, :, 0], 0)
+        np.testing.assert_array_equal(translated[1, 2:], images[1, :-2])
+        np.testing.assert_array_equal(translated[1, :2], 0)
+        np.testing.assert_array_equal(translated[2, :, :-2], images[2, :, 2:])
+        np.testing.assert_array_equal(translated[3], images[3])
+        # the input is not modified
+        np.testing.assert_array_equal(images, get_batch())
+
+    def test_translation_out_of_the_image(self):
+        translated = utils.translate_batch(get_batch(n=1), [6], [0])
+        np.testing.assert_array_equal(translated, 0)
+
+
+@unittest.skipIf(cv2 is None, 'OpenCV is not installed.')
+class ChangeLightBatchTest(unittest.TestCase):
+
+    def test_batch_equals_single_images(self):
+        images = get_batch()
+        for channel in ['s', 'v']:
+            values = [0.5, 1.0, 1.5, 3.0]
+            batch = utils.change_light_batch(images, values, channel)
+            for image, value, changed in zip(images, values, batch):
+                np.testing.assert_array_equal(changed, utils.change_light(image.copy(), value, channel))
+
+    def test_no_overflow(self):
+        images = np.full((1, 2, 2, 3), 200, dtype=np.uint8)
+        images[..., 0] = 100
+        brightened = utils.change_light_batch(images, 10.0, 'v')
+        self.assertEqual(brightened.max(), 255)
+        self.assertTrue((brightened >= images).all())
+
+    def test_float_and_grayscale_images(self):
+        images = get_batch().astype(np.float32) / 255
+        changed = utils.change_light_batch(images, 0.5, 'v')
+        self.assertEqual(changed.dtype, np.float32)
+        np.testing.assert_allclose(changed.max(axis=3), images.max(axis=3) * 0.5, atol=1e-5)
+
+        grayscale = get_batch(c=1)
+        np.testing.assert_array_equal(utils.change_light_batch(grayscale, 2.0), np.clip(grayscale * 2.0, 0, 255).astype(np.uint8))
+        with self.assertRaises(AttributeError):
+            utils.change_light_batch(grayscale, 2.0, 's')
+        with self.assertRaises(AttributeError):
+            utils.change_light_batch(grayscale[0], 2.0)
+        with self.assertRaises(AttributeError):
+            utils.change_light_batch(grayscale, 2.0, 'x')
+
+
+class AugmentBatchTest(unittest.TestCase):
+
+    def test_flips(self):
+        images = get_batch(n=64)
+        flipped = utils.augment_batch(images, flip_horizontal=True, random_state=np.random.RandomState(1))
+        is_flipped = [not np.array_equal(a, b) for a, b in zip(flipped, images)]
+        self.assertTrue(0 < sum(is_flipped) < 64)
+        for image, augmented, flip in zip(images, flipped, is_flipped):
+            np.testing.assert_array_equal(augmented, image[:, ::-1] if flip else image)
+
+        flipped = utils.augment_batch(images, flip_vertical=True, random_state=np.random.RandomState(1))
+        for image, augmented in zip(images, flipped):
+            self.assertTrue(np.array_equal(augmented, image) or np.array_equal(augmented, image[::-1]))
+
+    @unittest.skipIf(cv2 is None, 'OpenCV is not installed.')
+    def test_seeded_augmentation(self):
+        images = get_batch(n=8)
+        arguments = dict(brightness=(0.8, 1.2), saturation=(0.8, 1.2), flip_horizontal=True, flip_vertical=True, max_translation=2)
+        first = utils.augment_batch(images, random_state=np.random.RandomState(5), **arguments)
+        second = utils.augment_batch(images, random_state=np.random.RandomState(5), **arguments)
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(first.shape, images.shape)
+        self.assertEqual(first.dtype, images.dtype)
+        np.testing.assert_array_equal(images, get_batch(n=8))
+
+    def test_no_augmentation(self):
+        images = get_batch()
+        augmented = utils.augment_batch(images)
+        np.testing.assert_array_equal(augmented, images)
+        self.assertIsNot(augmented, images)
+
+
+if __name__ == '__main__':
+    unittest.main()
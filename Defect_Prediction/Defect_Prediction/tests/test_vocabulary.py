@@ -0,0 +1,78 @@
+import unittest
+import javalang
+
+from data_io.vocabulary import HashedVocabulary, FrozenVocabulary, STRUCTURAL_TOKEN_MAPPING, NAME_TOKEN_OFFSET
+
+
+SOURCE_CODE = b'''
+package org.example;
+public class Example {
+    public void run(int x) {
+        if (x > 0) {
+            known();
+            new Unknown();
+        }
+        return;
+    }
+}
+'''
+
+
+class HashedVocabularyTest(unittest.TestCase):
+
+    def test_token_ids_are_stable_and_in_range(self):
+        vocabulary = HashedVocabulary(16)
+        token_ids = [vocabulary.token_id('name{0}'.format(i)) for i in range(100)]
+        self.assertEqual(token_ids, [HashedVocabulary(16)['name{0}'.format(i)] for i in range(100)])
+        self.assertTrue(all(NAME_TOKEN_OFFSET <= token_id < NAME_TOKEN_OFFSET + 16 for token_id in token_ids))
+        self.assertEqual(len(vocabulary), 16)
+
+    def test_invalid_number_of_buckets(self):
+        with self.assertRaises(AttributeError):
+            HashedVocabulary(0)
+
+    def test_collision_statistics(self):
+        statistics = HashedVocabulary(1).collision_statistics(['a', 'b', 'c'])
+        self.assertEqual(statistics['num_names'], 3)
+        self.assertEqual(statistics['used_buckets'], 1)
+        self.assertEqual(statistics['colliding_names'], 3)
+        self.assertEqual(statistics['collision_rate'], 1.0)
+        self.assertEqual(HashedVocabulary(4).collision_statistics([])['collision_rate'], 0.0)
+
+
+class FrozenVocabularyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = javalang.parse.parse(SOURCE_CODE)
+
+    def test_unknown_names_are_mapped_to_the_oov_id(self):
+        vocabulary = FrozenVocabulary({'known': 12, 'other': 13}, current_mapping_index=14)
+        self.assertEqual(vocabulary.oov_token_id, 14)
+        self.assertEqual(vocabulary.num_token_ids, 15)
+        self.assertIn('known', vocabulary)
+        self.assertNotIn('Unknown', vocabulary)
+
+        tokens = vocabulary.extract(self.tree)
+        self.assertEqual(tokens, [STRUCTURAL_TOKEN_MAPPING['ClassDeclaration'], STRUCTURAL_TOKEN_MAPPING['MethodDeclaration'],
+                                  STRUCTURAL_TOKEN_MAPPING['IfStatement'], 12, 14, STRUCTURAL_TOKEN_MAPPING['ReturnStatement']])
+
+    def test_oov_id_does_not_collide_with_known_ids(self):
+        # current_mapping_index is missing in older feature files
+        vocabulary = FrozenVocabulary({'known': 12, 'other': 20})
+        self.assertEqual(vocabulary.oov_token_id, 21)
+
+    def test_filtered_tokens_are_removed(self):
+        vocabulary = FrozenVocabulary({'known': 12}, current_mapping_index=13, filtered_tokens=[12, STRUCTURAL_TOKEN_MAPPING['IfStatement']])
+        self.assertEqual(vocabulary.extract(self.tree), [STRUCTURAL_TOKEN_MAPPING['ClassDeclaration'], STRUCTURAL_TOKEN_MAPPING['MethodDeclaration'],
+                                                         13, STRUCTURAL_TOKEN_MAPPING['ReturnStatement']])
+
+    def test_hashed_names_have_no_oov_id(self):
+        vocabulary = FrozenVocabulary({}, num_hash_buckets=8)
+        self.assertIsNone(vocabulary.oov_token_id)
+        self.assertIn('Unknown', vocabulary)
+        self.assertEqual(vocabulary.name_id('Unknown'), HashedVocabulary(8).token_id('Unknown'))
+        self.assertEqual(vocabulary.num_token_ids, NAME_TOKEN_OFFSET + 8)
+
+
+if __name__ == '__main__':
+    unittest.main()